@@ -0,0 +1,330 @@
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# Versioned read-only API mounted at /api/v1, built on the same query
+# helpers as the HTML views. Every response carries a strong ETag computed
+# by a small validator query (row counts, updated_at columns and the next
+# show to start, since that moves a show from upcoming to past) before the
+# body is built, so a request with a matching If-None-Match header gets a
+# 304 without loading or serializing the resource. All routes read from
+# the replica when one is configured.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, url_for, abort
+from sqlalchemy import func, case
+from models import db, Venue, Artist, Show
+from counters import get_show_counts
+from routing import replica_reads
+from queries import get_venue_with_shows, get_artist_with_shows, get_shows_page, decode_cursor, \
+  get_calendar, calendar_range
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _json(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+
+def make_etag(*parts):
+  return hashlib.sha1(json.dumps(parts, default=_json).encode()).hexdigest()
+
+
+def conditional(parts, build):
+  '''
+  Returns a 304 response if the request's If-None-Match matches the ETag of
+  the validator parts, otherwise the JSON response of build().
+  '''
+  etag = make_etag(request.full_path, *parts)
+  if request.if_none_match.contains(etag):
+    response = Response(status=304)
+  else:
+    body = json.dumps(build(), separators=(',', ':'), default=_json)
+    response = Response(body, mimetype='application/json')
+  response.set_etag(etag)
+  # clients may keep the response but must revalidate it
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
+
+
+def _listing_version(now, *models):
+  # count and last update of each table, plus the next show to start
+  columns = []
+  for model in models:
+    columns.append(db.session.query(func.count(model.id)).label(model.__tablename__ + '_count'))
+    columns.append(db.session.query(func.max(model.updated_at)).label(model.__tablename__ + '_updated'))
+  columns.append(db.session.query(func.min(Show.start_time)).filter(Show.start_time > now).label('next_start'))
+  return list(db.session.query(*columns).one())
+
+
+def _detail_version(model, show_column, other, id, now):
+  # the row, its shows and the venues or artists of those shows; None if
+  # the row does not exist
+  row = db.session.query(
+      model.updated_at,
+      func.count(Show.id),
+      func.max(Show.updated_at),
+      func.max(other.updated_at),
+      func.min(case([(Show.start_time > now, Show.start_time)]))
+    ) \
+    .outerjoin(Show, show_column == model.id) \
+    .outerjoin(other, other.id == (Show.artist_id if model is Venue else Show.venue_id)) \
+    .filter(model.id == id) \
+    .group_by(model.id) \
+    .first()
+  return None if row is None else list(row)
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(405)
+def api_error(error):
+  body = json.dumps({"error": error.code, "message": error.name}, separators=(',', ':'))
+  return Response(body, status=error.code, mimetype='application/json')
+
+
+def _venue_show(show):
+  return {
+    "id": show.id,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist.name,
+    "artist_image_link": show.artist.image_link,
+    "start_time": show.start_time,
+    "end_time": show.end_time
+  }
+
+
+def _artist_show(show):
+  return {
+    "id": show.id,
+    "venue_id": show.venue_id,
+    "venue_name": show.venue.name,
+    "venue_image_link": show.venue.image_link,
+    "start_time": show.start_time,
+    "end_time": show.end_time
+  }
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@replica_reads
+def venues():
+  now = datetime.now()
+  genre = request.args.get('genre')
+
+  def build():
+    query = Venue.query.order_by(Venue.name, Venue.id)
+    if genre:
+      query = query.filter(Venue.genres.any(name=genre))
+    venues = query.all()
+    counts = get_show_counts('venue', [venue.id for venue in venues], now=now)
+    return {"data": [{
+      "id": venue.id,
+      "name": venue.name,
+      "city": venue.city,
+      "state": venue.state,
+      "genres": [genre.name for genre in venue.genres],
+      "num_upcoming_shows": counts.get(venue.id, (0, 0))[1]
+    } for venue in venues]}
+
+  return conditional(_listing_version(now, Venue, Show), build)
+
+
+@api.route('/venues/<int:venue_id>')
+@replica_reads
+def venue(venue_id):
+  now = datetime.now()
+  version = _detail_version(Venue, Show.venue_id, Artist, venue_id, now)
+  if version is None:
+    abort(404)
+
+  def build():
+    venue, past_shows, upcoming_shows = get_venue_with_shows(venue_id, now=now)
+    past_shows_count, upcoming_shows_count = \
+      get_show_counts('venue', [venue_id], now=now).get(venue_id, (0, 0))
+    return {
+      "id": venue.id,
+      "name": venue.name,
+      "genres": [genre.name for genre in venue.genres],
+      "address": venue.address,
+      "city": venue.city,
+      "state": venue.state,
+      "phone": venue.phone,
+      "website": venue.website,
+      "facebook_link": venue.facebook_link,
+      "seeking_talent": venue.seeking_talent,
+      "seeking_description": venue.seeking_description,
+      "image_link": venue.image_link,
+      "past_shows": [_venue_show(show) for show in past_shows],
+      "upcoming_shows": [_venue_show(show) for show in upcoming_shows],
+      "past_shows_count": past_shows_count,
+      "upcoming_shows_count": upcoming_shows_count
+    }
+
+  return conditional(version, build)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+@replica_reads
+def artists():
+  now = datetime.now()
+  genre = request.args.get('genre')
+
+  def build():
+    query = Artist.query.order_by(Artist.name, Artist.id)
+    if genre:
+      query = query.filter(Artist.genres.any(name=genre))
+    artists = query.all()
+    counts = get_show_counts('artist', [artist.id for artist in artists], now=now)
+    return {"data": [{
+      "id": artist.id,
+      "name": artist.name,
+      "city": artist.city,
+      "state": artist.state,
+      "genres": [genre.name for genre in artist.genres],
+      "num_upcoming_shows": counts.get(artist.id, (0, 0))[1]
+    } for artist in artists]}
+
+  return conditional(_listing_version(now, Artist, Show), build)
+
+
+@api.route('/artists/<int:artist_id>')
+@replica_reads
+def artist(artist_id):
+  now = datetime.now()
+  version = _detail_version(Artist, Show.artist_id, Venue, artist_id, now)
+  if version is None:
+    abort(404)
+
+  def build():
+    artist, past_shows, upcoming_shows = get_artist_with_shows(artist_id, now=now)
+    past_shows_count, upcoming_shows_count = \
+      get_show_counts('artist', [artist_id], now=now).get(artist_id, (0, 0))
+    return {
+      "id": artist.id,
+      "name": artist.name,
+      "genres": [genre.name for genre in artist.genres],
+      "city": artist.city,
+      "state": artist.state,
+      "phone": artist.phone,
+      "website": artist.website,
+      "facebook_link": artist.facebook_link,
+      "seeking_venues": artist.seeking_venues,
+      "seeking_description": artist.seeking_description,
+      "image_link": artist.image_link,
+      "past_shows": [_artist_show(show) for show in past_shows],
+      "upcoming_shows": [_artist_show(show) for show in upcoming_shows],
+      "past_shows_count": past_shows_count,
+      "upcoming_shows_count": upcoming_shows_count
+    }
+
+  return conditional(version, build)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+@replica_reads
+def shows():
+  # one keyset page of shows, filtered like /shows
+  now = datetime.now()
+  when = request.args.get('when')
+  if when not in (None, 'upcoming', 'past'):
+    abort(400)
+  filters = {
+    "when": when,
+    "venue_id": request.args.get('venue_id', type=int),
+    "artist_id": request.args.get('artist_id', type=int)
+  }
+  cursor = request.args.get('cursor')
+  if cursor is not None:
+    try:
+      decode_cursor(cursor)
+    except ValueError:
+      abort(400)
+
+  def build():
+    shows, next_cursor = get_shows_page(cursor=cursor, now=now, **filters)
+    next_url = None
+    if next_cursor:
+      next_url = url_for('api.shows', cursor=next_cursor,
+                         **{k: v for k, v in filters.items() if v is not None})
+    return {
+      "data": [{
+        "id": show.id,
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time
+      } for show in shows],
+      "next": next_url
+    }
+
+  return conditional(_listing_version(now, Show, Venue, Artist), build)
+
+
+#  Calendar
+#  ----------------------------------------------------------------
+
+def _calendar_version(start, end, filters):
+  # the shows in the range and the last update of any venue or artist,
+  # whose names are part of the response
+  shows = db.session.query(Show).filter(Show.start_time >= start, Show.start_time < end)
+  if filters['venue_id'] is not None:
+    shows = shows.filter(Show.venue_id == filters['venue_id'])
+  if filters['artist_id'] is not None:
+    shows = shows.filter(Show.artist_id == filters['artist_id'])
+  return list(db.session.query(
+      shows.with_entities(func.count(Show.id)).label('show_count'),
+      shows.with_entities(func.max(Show.updated_at)).label('show_updated'),
+      db.session.query(func.max(Venue.updated_at)).label('venue_updated'),
+      db.session.query(func.max(Artist.updated_at)).label('artist_updated')
+    ).one())
+
+
+@api.route('/calendar')
+@replica_reads
+def calendar():
+  # the shows between ?from= and ?to= (YYYY-MM-DD, both included) by day
+  filters = {
+    "venue_id": request.args.get('venue_id', type=int),
+    "artist_id": request.args.get('artist_id', type=int)
+  }
+  try:
+    start, end = calendar_range(request.args.get('from'), request.args.get('to'),
+                                max_days=current_app.config['CALENDAR_MAX_DAYS'])
+  except ValueError:
+    abort(400)
+
+  def build():
+    return {
+      "from": start.date().isoformat(),
+      "to": (end - timedelta(days=1)).date().isoformat(),
+      "days": [{
+        "date": day.isoformat(),
+        "shows": [{
+          "id": show.id,
+          "venue_id": show.venue_id,
+          "venue_name": show.venue_name,
+          "artist_id": show.artist_id,
+          "artist_name": show.artist_name,
+          "artist_image_link": show.artist_image_link,
+          "start_time": show.start_time,
+          "end_time": show.end_time
+        } for show in shows]
+      } for day, shows in get_calendar(start, end, **filters)]
+    }
+
+  return conditional(_calendar_version(start, end, filters), build)
@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import pytest
+
+FYYUR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FYYUR_DIR)
+
+# number of shows at each scale, with one venue per 20 shows and one artist
+# per 10
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def pytest_addoption(parser):
+  parser.addoption('--scale', action='append', choices=sorted(SCALES),
+                   help='Data set size to benchmark, repeatable (default: 1k).')
+  parser.addoption('--page-cache', action='store_true',
+                   help='Keep the page cache on, by default every request renders.')
+
+
+def pytest_generate_tests(metafunc):
+  if 'scale' in metafunc.fixturenames:
+    metafunc.parametrize('scale', metafunc.config.getoption('scale') or ['1k'], scope='session')
+
+
+class Site(object):
+
+  def __init__(self, app, scale, venue_id, artist_id):
+    self.app = app
+    self.client = app.test_client()
+    self.scale = scale
+    # the venue and artist with the most shows
+    self.venue_id = venue_id
+    self.artist_id = artist_id
+
+
+@pytest.fixture(scope='session')
+def site(scale, tmp_path_factory, pytestconfig):
+  '''
+  The app on a database filled with synthetic data of the given scale: a
+  new SQLite file, or the database of FYYUR_BENCH_DATABASE_URL (which is
+  emptied first).
+  '''
+  from flask_migrate import upgrade, downgrade
+  from sqlalchemy import func
+  from app import create_app
+  from models import db, Show
+  import synthetic
+
+  uri = os.environ.get('FYYUR_BENCH_DATABASE_URL') or \
+    'sqlite:///' + str(tmp_path_factory.mktemp('fyyur') / 'fyyur-{}.db'.format(scale))
+  app = create_app(
+    cli=True,
+    SQLALCHEMY_DATABASE_URI=uri,
+    SQLALCHEMY_BINDS={},
+    PAGE_CACHE_ENABLED=pytestconfig.getoption('page_cache'),
+    QUERY_TOOLBAR=False,
+    TESTING=True,
+  )
+
+  shows = SCALES[scale]
+  with app.app_context():
+    migrations = os.path.join(FYYUR_DIR, 'migrations')
+    downgrade(directory=migrations, revision='base')
+    upgrade(directory=migrations)
+    synthetic.generate(venues=max(shows // 20, 10), artists=max(shows // 10, 10), shows=shows)
+    venue_id = db.session.query(Show.venue_id).group_by(Show.venue_id) \
+      .order_by(func.count(Show.id).desc()).limit(1).scalar()
+    artist_id = db.session.query(Show.artist_id).group_by(Show.artist_id) \
+      .order_by(func.count(Show.id).desc()).limit(1).scalar()
+    db.session.remove()
+  return Site(app, scale, venue_id, artist_id)
+
+
+@pytest.fixture
+def measure(benchmark, site):
+  '''
+  Benchmarks one request and records the number of SQL statements it ran,
+  taken from its Server-Timing header. data may be a function returning the
+  form data of each call.
+  '''
+  def measure(method, url, data=None):
+    def request():
+      response = site.client.open(url, method=method, data=data() if callable(data) else data)
+      assert response.status_code < 400, (url, response.status_code)
+      return response
+
+    response = benchmark(request)
+    match = _QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+    benchmark.extra_info['queries'] = int(match.group(1)) if match else None
+    benchmark.extra_info['scale'] = site.scale
+    return response
+  return measure
@@ -0,0 +1,172 @@
+#----------------------------------------------------------------------------#
+# Load test.
+#
+# Simulates users browsing a running Fyyur server, locust style: every user
+# is a thread that repeatedly picks a weighted task (listing, detail page,
+# search, show creation...), waits a random think time, and records the
+# latency, status and SQL statement count (from the Server-Timing header)
+# of each request. Prints per-task percentiles and throughput at the end.
+#
+#   python benchmarks/loadtest.py http://localhost:5000 --users 20 --duration 60
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+SEARCH_TERMS = ['hall', 'band', 'jazz', 'new york', 'blue', 'club', 'rock', 'tx']
+
+
+class Stats(object):
+
+  def __init__(self):
+    self.latencies = defaultdict(list)
+    self.queries = defaultdict(list)
+    self.failures = defaultdict(int)
+    self.lock = threading.Lock()
+
+  def add(self, name, seconds, ok, queries):
+    with self.lock:
+      self.latencies[name].append(seconds)
+      if queries is not None:
+        self.queries[name].append(queries)
+      if not ok:
+        self.failures[name] += 1
+
+  def report(self, elapsed):
+    print('{:<26} {:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>7} {:>8}'.format(
+      'task', 'requests', 'fails', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'req/s', 'queries'))
+    total = 0
+    for name in sorted(self.latencies):
+      latencies = sorted(self.latencies[name])
+      queries = self.queries[name]
+      total += len(latencies)
+      print('{:<26} {:>8} {:>6} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>7.1f} {:>8}'.format(
+        name, len(latencies), self.failures[name],
+        _percentile(latencies, 50) * 1000, _percentile(latencies, 95) * 1000,
+        _percentile(latencies, 99) * 1000, latencies[-1] * 1000, len(latencies) / elapsed,
+        '{:.1f}'.format(sum(queries) / len(queries)) if queries else '-'))
+    print('{} requests in {:.1f}s, {:.1f} req/s'.format(total, elapsed, total / elapsed))
+
+
+def _percentile(values, percent):
+  return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class User(object):
+  '''
+  One simulated visitor. Tasks are (weight, method) pairs; each method
+  returns (name, method, path, form data).
+  '''
+
+  def __init__(self, host, venue_ids, artist_ids, rng, wait):
+    self.host = host
+    self.venue_ids = venue_ids
+    self.artist_ids = artist_ids
+    self.rng = rng
+    self.wait = wait
+    self.tasks = [
+      (10, self.venues), (10, self.artists), (8, self.shows), (20, self.venue),
+      (20, self.artist), (6, self.search), (5, self.api), (1, self.create_show),
+    ]
+    self.weights = [weight for weight, _ in self.tasks]
+
+  def venues(self):
+    return 'GET /venues', 'GET', '/venues', None
+
+  def artists(self):
+    return 'GET /artists', 'GET', '/artists', None
+
+  def shows(self):
+    return 'GET /shows', 'GET', '/shows?when=upcoming', None
+
+  def venue(self):
+    return 'GET /venues/<id>', 'GET', '/venues/{}'.format(self.rng.choice(self.venue_ids)), None
+
+  def artist(self):
+    return 'GET /artists/<id>', 'GET', '/artists/{}'.format(self.rng.choice(self.artist_ids)), None
+
+  def search(self):
+    kind = self.rng.choice(['venues', 'artists'])
+    return 'POST /{}/search'.format(kind), 'POST', '/{}/search'.format(kind), \
+      {'search_term': self.rng.choice(SEARCH_TERMS)}
+
+  def api(self):
+    return 'GET /api/v1/venues/<id>', 'GET', \
+      '/api/v1/venues/{}'.format(self.rng.choice(self.venue_ids)), None
+
+  def create_show(self):
+    start_time = datetime.now() + timedelta(days=self.rng.randint(400, 4000), hours=self.rng.randint(0, 23))
+    return 'POST /shows/create', 'POST', '/shows/create', {
+      'venue_id': self.rng.choice(self.venue_ids),
+      'artist_id': self.rng.choice(self.artist_ids),
+      'start_time': start_time.strftime('%Y-%m-%d %H:00:00'),
+      'duration': 120,
+    }
+
+  def run(self, stats, deadline):
+    while time.time() < deadline:
+      _, task = self.rng.choices(self.tasks, weights=self.weights)[0]
+      name, method, path, data = task()
+      body = urlencode(data, doseq=True).encode() if data is not None else None
+      started = time.perf_counter()
+      ok, queries = True, None
+      try:
+        with urlopen(Request(self.host + path, data=body, method=method), timeout=30) as response:
+          response.read()
+          match = _QUERIES.search(', '.join(response.headers.get_all('Server-Timing') or []))
+          queries = int(match.group(1)) if match else None
+      except (HTTPError, URLError, OSError):
+        ok = False
+      stats.add(name, time.perf_counter() - started, ok, queries)
+      time.sleep(self.rng.uniform(0, self.wait))
+
+
+def _ids(host, path):
+  with urlopen(host + path, timeout=30) as response:
+    return [row['id'] for row in json.load(response)['data']]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Load test a running Fyyur server.')
+  parser.add_argument('host', help='for example http://localhost:5000')
+  parser.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+  parser.add_argument('--spawn-rate', type=float, default=5, help='users started per second')
+  parser.add_argument('--duration', type=float, default=30, help='seconds')
+  parser.add_argument('--wait', type=float, default=1.0, help='maximum think time in seconds')
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  host = args.host.rstrip('/')
+  venue_ids = _ids(host, '/api/v1/venues')
+  artist_ids = _ids(host, '/api/v1/artists')
+  if not venue_ids or not artist_ids:
+    parser.error('the server has no venues or artists, run "flask generate-data" first')
+
+  stats = Stats()
+  started = time.time()
+  deadline = started + args.duration
+  threads = []
+  for i in range(args.users):
+    user = User(host, venue_ids, artist_ids, random.Random(args.seed + i), args.wait)
+    thread = threading.Thread(target=user.run, args=(stats, deadline), daemon=True)
+    thread.start()
+    threads.append(thread)
+    time.sleep(1.0 / args.spawn_rate)
+  for thread in threads:
+    thread.join()
+  stats.report(time.time() - started)
+
+
+if __name__ == '__main__':
+  main()
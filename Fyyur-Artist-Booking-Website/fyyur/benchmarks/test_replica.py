@@ -0,0 +1,79 @@
+#----------------------------------------------------------------------------#
+# Replica reads.
+#
+# Two SQLite files stand in for a primary and a replica that lags behind:
+# the replica is a copy of the primary taken before a client edits a venue.
+# The writer must see its change with the page cache on, and a page read
+# from the stale replica meanwhile must not be cached for everybody:
+#
+#   pytest benchmarks/test_replica.py
+#----------------------------------------------------------------------------#
+
+import os
+import shutil
+import pytest
+from conftest import FYYUR_DIR
+
+VENUE_EDIT = {
+  'name': 'Renamed Hall',
+  'city': 'New York',
+  'state': 'NY',
+  'address': '1 Replica St',
+  'phone': '212-555-0100',
+  'genres': ['Jazz'],
+  'facebook_link': '',
+  'website': '',
+  'image_link': '',
+  'seeking_description': '',
+}
+
+
+@pytest.fixture
+def app(tmp_path):
+  from flask_migrate import upgrade
+  from app import create_app
+  from models import db
+  from cache import page_cache, REPLICA_BEHIND_KEY
+  import synthetic
+
+  primary = tmp_path / 'primary.db'
+  replica = tmp_path / 'replica.db'
+  app = create_app(
+    cli=True,
+    SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(primary),
+    SQLALCHEMY_BINDS={'replica': 'sqlite:///{}'.format(replica)},
+    PAGE_CACHE_ENABLED=True,
+    THUMBNAIL_WORKERS=0,
+    TESTING=True,
+  )
+  with app.app_context():
+    upgrade(directory=os.path.join(FYYUR_DIR, 'migrations'))
+    synthetic.generate(venues=10, artists=10, shows=50)
+    db.session.remove()
+    db.get_engine(app).dispose()
+  shutil.copyfile(str(primary), str(replica))
+  # the copy has the writes of the setup
+  page_cache.backend.set(REPLICA_BEHIND_KEY, 0)
+  return app
+
+
+def test_writer_reads_own_write_with_page_cache(app):
+  writer = app.test_client()
+  reader = app.test_client()
+  assert reader.get('/venues/1').headers['X-Cache'] == 'MISS'
+  assert reader.get('/venues/1').headers['X-Cache'] == 'HIT'
+
+  writer.post('/venues/1/edit', data=VENUE_EDIT)
+
+  # the replica has not caught up: the reader still sees the old venue, and
+  # that page is not cached
+  response = reader.get('/venues/1')
+  assert 'Renamed Hall' not in response.get_data(as_text=True)
+  assert reader.get('/venues/1').headers['X-Cache'] == 'MISS'
+
+  # the writer reads the primary, past the cache, twice to clear its
+  # flashed message
+  for _ in range(2):
+    response = writer.get('/venues/1')
+    assert 'Renamed Hall' in response.get_data(as_text=True)
+    assert 'X-Cache' not in response.headers
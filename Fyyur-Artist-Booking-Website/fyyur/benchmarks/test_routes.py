@@ -0,0 +1,151 @@
+#----------------------------------------------------------------------------#
+# Route benchmarks.
+#
+# Times every route of app.py and the JSON API against synthetic data:
+#
+#   pytest benchmarks --scale 1k --scale 10k --scale 100k \
+#     --benchmark-group-by=param:scale --benchmark-columns=min,median,max
+#
+# The number of SQL statements of each route is stored in the extra_info of
+# the results (see --benchmark-json).
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from itertools import count
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+VENUE_FORM = {
+  'name': 'Benchmark Hall',
+  'city': 'New York',
+  'state': 'NY',
+  'address': '1 Benchmark St',
+  'phone': '212-555-0100',
+  'genres': ['Jazz', 'Blues'],
+  'facebook_link': 'https://www.facebook.com/benchmark',
+  'website': 'https://www.example.com/benchmark',
+  'image_link': 'https://www.example.com/benchmark.png',
+  'seeking_talent': 'y',
+  'seeking_description': 'Looking for jazz bands',
+}
+
+ARTIST_FORM = {
+  'name': 'Benchmark Band',
+  'city': 'New York',
+  'state': 'NY',
+  'phone': '212-555-0101',
+  'genres': ['Jazz'],
+  'facebook_link': 'https://www.facebook.com/benchmarkband',
+  'website': 'https://www.example.com/benchmarkband',
+  'image_link': 'https://www.example.com/benchmarkband.png',
+  'seeking_venues': 'y',
+  'seeking_description': 'Looking for venues',
+}
+
+
+#  Listings
+#  ----------------------------------------------------------------
+
+def test_index(measure):
+  measure('GET', '/')
+
+
+def test_venues(measure):
+  measure('GET', '/venues')
+
+
+def test_venues_by_genre(measure):
+  measure('GET', '/venues?genre=Jazz')
+
+
+def test_artists(measure):
+  measure('GET', '/artists')
+
+
+def test_shows(measure):
+  measure('GET', '/shows')
+
+
+def test_past_shows_of_venue(measure, site):
+  measure('GET', '/shows?when=past&venue_id={}'.format(site.venue_id))
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+def test_search_venues(measure):
+  measure('POST', '/venues/search', data={'search_term': 'hall'})
+
+
+def test_search_artists(measure):
+  measure('POST', '/artists/search', data={'search_term': 'band'})
+
+
+#  Detail pages
+#  ----------------------------------------------------------------
+
+def test_venue(measure, site):
+  measure('GET', '/venues/{}'.format(site.venue_id))
+
+
+def test_artist(measure, site):
+  measure('GET', '/artists/{}'.format(site.artist_id))
+
+
+def test_venue_availability(measure, site):
+  measure('GET', '/venues/{}/availability'.format(site.venue_id))
+
+
+#  Create and edit
+#  ----------------------------------------------------------------
+
+def test_create_venue(measure):
+  measure('POST', '/venues/create', data=VENUE_FORM)
+
+
+def test_edit_venue(measure, site):
+  measure('POST', '/venues/{}/edit'.format(site.venue_id), data=VENUE_FORM)
+
+
+def test_create_artist(measure):
+  measure('POST', '/artists/create', data=ARTIST_FORM)
+
+
+def test_edit_artist(measure, site):
+  measure('POST', '/artists/{}/edit'.format(site.artist_id), data=ARTIST_FORM)
+
+
+def test_create_show(measure, site):
+  # every call books a new slot, after the synthetic shows
+  slots = count()
+  first = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=400)
+
+  def form():
+    start_time = first + timedelta(hours=3 * next(slots))
+    return {
+      'venue_id': site.venue_id,
+      'artist_id': site.artist_id,
+      'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+      'duration': 120,
+    }
+  measure('POST', '/shows/create', data=form)
+
+
+#  JSON API
+#  ----------------------------------------------------------------
+
+def test_api_venues(measure):
+  measure('GET', '/api/v1/venues')
+
+
+def test_api_venue(measure, site):
+  measure('GET', '/api/v1/venues/{}'.format(site.venue_id))
+
+
+def test_api_artist(measure, site):
+  measure('GET', '/api/v1/artists/{}'.format(site.artist_id))
+
+
+def test_api_shows(measure):
+  measure('GET', '/api/v1/shows?when=upcoming')
@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Cold start.
+#
+# Every web worker imports app.py and calls create_app(). This checks that
+# the web process does not load the command line modules and migrations,
+# and that a fresh interpreter builds the app within STARTUP_BUDGET:
+#
+#   pytest benchmarks/test_startup.py
+#
+# Measured at about 0.5s (0.4s of imports, 0.1s in create_app), the budget
+# leaves room for slower machines.
+#----------------------------------------------------------------------------#
+
+import json
+import statistics
+import subprocess
+import sys
+from conftest import FYYUR_DIR
+
+STARTUP_BUDGET = 1.5
+
+RUNS = 5
+
+# only needed by the flask command
+CLI_MODULES = ('flask_migrate', 'alembic', 'commands', 'importer', 'synthetic', 'suggestions', 'numpy')
+
+# imported by create_app(), not with app.py
+BLUEPRINT_MODULES = ('views', 'api', 'forms')
+
+_START = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+loaded = sorted(name for name in {modules!r} if name in sys.modules)
+app.create_app(cli=False)
+created = time.perf_counter()
+print(json.dumps({{
+  'import': imported - started,
+  'create': created - imported,
+  'loaded_by_import': loaded,
+  'modules': sorted(sys.modules),
+}}))
+'''
+
+
+def _start():
+  # a fresh interpreter each time, nothing imported yet
+  output = subprocess.check_output(
+    [sys.executable, '-c', _START.format(modules=CLI_MODULES + BLUEPRINT_MODULES)],
+    cwd=FYYUR_DIR)
+  return json.loads(output.decode().splitlines()[-1])
+
+
+def test_import_is_lazy():
+  start = _start()
+  assert start['loaded_by_import'] == []
+  assert not set(CLI_MODULES) & set(start['modules'])
+  assert set(BLUEPRINT_MODULES) <= set(start['modules'])
+
+
+def test_cold_start_budget():
+  starts = [_start() for _ in range(RUNS)]
+  total = statistics.median(start['import'] + start['create'] for start in starts)
+  assert total < STARTUP_BUDGET, 'cold start took {:.2f}s, the budget is {}s'.format(total, STARTUP_BUDGET)
@@ -0,0 +1,106 @@
+#----------------------------------------------------------------------------#
+# Bookings.
+#
+# Double booking detection. A show occupies its venue and its artist from
+# start_time to end_time. Shows never last longer than MAX_SHOW_DURATION,
+# so every show overlapping [start, end) starts inside
+# (start - MAX_SHOW_DURATION, end): conflict checks are bounded range scans
+# of the (venue_id, start_time) and (artist_id, start_time) indexes. On
+# PostgreSQL the exclusion constraints from migration 2f8d6b4c0e17 enforce
+# the same rule in the database.
+#----------------------------------------------------------------------------#
+
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from models import db, Show, MAX_SHOW_DURATION
+
+
+def find_conflicts(venue_id, artist_id, start_time, end_time):
+  '''
+  Returns the shows that overlap [start_time, end_time) at the venue or
+  with the artist.
+  '''
+  return Show.query \
+    .filter(or_(Show.venue_id == venue_id, Show.artist_id == artist_id)) \
+    .filter(Show.start_time > start_time - MAX_SHOW_DURATION) \
+    .filter(Show.start_time < end_time) \
+    .filter(Show.end_time > start_time) \
+    .order_by(Show.start_time) \
+    .all()
+
+
+class IntervalIndex(object):
+  '''
+  In-memory index of booked intervals per key (a venue or an artist), used
+  to check rows against each other during batch imports. Intervals are kept
+  sorted by start; with the longest interval length known, an overlap query
+  only looks at the intervals starting within that distance of the query.
+  '''
+
+  def __init__(self):
+    self.intervals = {}
+    self.longest = timedelta(0)
+
+  def add(self, key, start, end):
+    insort(self.intervals.setdefault(key, []), (start, end))
+    self.longest = max(self.longest, end - start)
+
+  def overlaps(self, key, start, end):
+    intervals = self.intervals.get(key)
+    if not intervals:
+      return False
+    i = bisect_left(intervals, (start - self.longest,))
+    while i < len(intervals) and intervals[i][0] < end:
+      if intervals[i][1] > start:
+        return True
+      i += 1
+    return False
+
+
+def month_range(month=None):
+  '''
+  Returns the (start, end) datetimes of a 'YYYY-MM' month, the current month
+  by default. Raises ValueError for a malformed month.
+  '''
+  if month:
+    start = datetime.strptime(month, '%Y-%m')
+  else:
+    start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+  if start.month == 12:
+    end = start.replace(year=start.year + 1, month=1)
+  else:
+    end = start.replace(month=start.month + 1)
+  return start, end
+
+
+def get_venue_availability(venue_id, start, end):
+  '''
+  Returns (busy, free) lists of (start, end) intervals for the venue
+  between start and end. Only the shows in that window are read.
+  '''
+  shows = db.session.query(Show.start_time, Show.end_time) \
+    .filter(Show.venue_id == venue_id) \
+    .filter(Show.start_time > start - MAX_SHOW_DURATION) \
+    .filter(Show.start_time < end) \
+    .filter(Show.end_time > start) \
+    .order_by(Show.start_time) \
+    .all()
+
+  busy = []
+  for show_start, show_end in shows:
+    show_start, show_end = max(show_start, start), min(show_end, end)
+    if busy and show_start <= busy[-1][1]:
+      busy[-1] = (busy[-1][0], max(busy[-1][1], show_end))
+    else:
+      busy.append((show_start, show_end))
+
+  free = []
+  cursor = start
+  for busy_start, busy_end in busy:
+    if busy_start > cursor:
+      free.append((cursor, busy_start))
+    cursor = max(cursor, busy_end)
+  if cursor < end:
+    free.append((cursor, end))
+  return busy, free
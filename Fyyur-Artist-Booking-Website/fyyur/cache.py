@@ -0,0 +1,221 @@
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Caches rendered pages keyed by route and request parameters. Every key
+# includes a generation number that is bumped when a session that inserted,
+# updated or deleted a Venue, Artist or Show row commits, so a write makes
+# all cached pages unreachable at once and they are re-rendered on the next
+# hit. Pages also expire after PAGE_CACHE_TIMEOUT seconds, since which
+# shows are upcoming depends on the time they were rendered.
+#
+# With a replica (routing.py), a page read from it right after a write may
+# not show the write yet. Clients pinned to the primary by their own write
+# skip the cache, and for REPLICA_STICKY_SECONDS after any write pages read
+# from the replica are served but not stored.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, g, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from models import Venue, Artist, Show
+from routing import RoutingSession, pinned_to_primary, reading_from_replica
+
+GENERATION_KEY = 'fyyur:pages:generation'
+# the time until which the replica may lack the last write
+REPLICA_BEHIND_KEY = 'fyyur:pages:replica-behind-until'
+
+
+class LRUBackend(object):
+  '''
+  In-process backend: a bounded, thread safe LRU mapping whose items
+  expire timeout seconds after they are set. Counters such as the
+  generation number live outside the LRU so they are never evicted.
+  '''
+
+  def __init__(self, maxsize=512, timeout=300):
+    self.maxsize = maxsize
+    self.timeout = timeout
+    self.items = OrderedDict()
+    self.counters = {}
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      if key in self.counters:
+        return self.counters[key]
+      try:
+        expires, value = self.items[key]
+      except KeyError:
+        return None
+      if expires <= time.monotonic():
+        del self.items[key]
+        return None
+      self.items.move_to_end(key)
+      return value
+
+  def set(self, key, value):
+    with self.lock:
+      self.items[key] = (time.monotonic() + self.timeout, value)
+      self.items.move_to_end(key)
+      while len(self.items) > self.maxsize:
+        self.items.popitem(last=False)
+
+  def incr(self, key):
+    with self.lock:
+      self.counters[key] = self.counters.get(key, 0) + 1
+      return self.counters[key]
+
+  def clear(self):
+    with self.lock:
+      self.items.clear()
+
+
+class SharedBackend(object):
+  '''
+  Backend shared between worker processes. Wraps any client with
+  memcached/redis style get, set and incr methods (for example a
+  redis.Redis instance), so every worker sees the same pages and the same
+  generation number.
+  '''
+
+  def __init__(self, client, timeout=300):
+    self.client = client
+    self.timeout = timeout
+
+  def get(self, key):
+    return self.client.get(key)
+
+  def set(self, key, value):
+    self.client.set(key, value, self.timeout)
+
+  def incr(self, key):
+    return self.client.incr(key)
+
+  def clear(self):
+    self.client.incr(GENERATION_KEY)
+
+
+class PageCache(object):
+
+  def __init__(self, backend=None, replica_lag=10):
+    self.backend = backend or LRUBackend()
+    self.replica_lag = replica_lag
+    self.hits = 0
+    self.misses = 0
+    self.lock = threading.Lock()
+
+  def generation(self):
+    return int(self.backend.get(GENERATION_KEY) or 0)
+
+  def key(self, endpoint, args):
+    return 'fyyur:pages:{}:{}:{}'.format(
+      self.generation(), endpoint, '&'.join('{}={}'.format(k, v) for k, v in sorted(args.items())))
+
+  def get(self, key):
+    value = self.backend.get(key)
+    with self.lock:
+      if value is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    return value
+
+  def set(self, key, value):
+    self.backend.set(key, value)
+
+  def invalidate(self):
+    self.backend.incr(GENERATION_KEY)
+    self.backend.set(REPLICA_BEHIND_KEY, time.time() + self.replica_lag)
+
+  def replica_behind(self):
+    return float(self.backend.get(REPLICA_BEHIND_KEY) or 0) > time.time()
+
+  def stats(self):
+    return {'hits': self.hits, 'misses': self.misses, 'generation': self.generation()}
+
+
+page_cache = PageCache()
+
+
+def init_page_cache(app):
+  '''
+  Picks the page cache backend from the app config: a shared redis backend
+  when PAGE_CACHE_REDIS_URL is set, otherwise an in-process LRU of
+  PAGE_CACHE_SIZE pages. Either way pages expire after PAGE_CACHE_TIMEOUT
+  seconds.
+  '''
+  redis_url = app.config.get('PAGE_CACHE_REDIS_URL')
+  if redis_url:
+    import redis
+    page_cache.backend = SharedBackend(redis.Redis.from_url(redis_url),
+                                       app.config.get('PAGE_CACHE_TIMEOUT', 300))
+  else:
+    page_cache.backend = LRUBackend(app.config.get('PAGE_CACHE_SIZE', 512),
+                                    app.config.get('PAGE_CACHE_TIMEOUT', 300))
+  page_cache.replica_lag = app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+
+def _written(mapper, connection, target):
+  # the pages are invalidated once the session commits: before that, a page
+  # rendered by another request would still show the old rows and be cached
+  # under the new generation
+  object_session(target).info['pages_written'] = True
+
+
+def _committed(session):
+  if session.info.pop('pages_written', False):
+    page_cache.invalidate()
+
+
+def _rolled_back(session, previous_transaction):
+  session.info.pop('pages_written', None)
+
+
+for _model in (Venue, Artist, Show):
+  event.listen(_model, 'after_insert', _written)
+  event.listen(_model, 'after_update', _written)
+  event.listen(_model, 'after_delete', _written)
+event.listen(RoutingSession, 'after_commit', _committed)
+event.listen(RoutingSession, 'after_soft_rollback', _rolled_back)
+
+
+def cached_page(view):
+  '''
+  Serves a GET view from the page cache. Pages are keyed by endpoint, view
+  arguments and query string, plus the request's locale and time zone
+  since those change how dates are rendered. Pages carrying flashed
+  messages, and requests of clients pinned to the primary, are neither
+  served from nor stored in the cache.
+  '''
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    if not current_app.config.get('PAGE_CACHE_ENABLED', True) or '_flashes' in session \
+        or pinned_to_primary():
+      return view(*args, **kwargs)
+
+    params = dict(kwargs)
+    params.update(request.args.items())
+    params['_locale'] = getattr(g, 'locale', None)
+    params['_timezone'] = getattr(g, 'timezone', None)
+    key = page_cache.key(request.endpoint, params)
+
+    page = page_cache.get(key)
+    if page is not None:
+      response = make_response(page)
+      response.headers['X-Cache'] = 'HIT'
+      return response
+
+    page = view(*args, **kwargs)
+    if not isinstance(page, str):
+      return page
+    # the replica may not have the last write yet
+    if not (reading_from_replica() and page_cache.replica_behind()):
+      page_cache.set(key, page)
+    response = make_response(page)
+    response.headers['X-Cache'] = 'MISS'
+    return response
+  return wrapper
@@ -0,0 +1,121 @@
+#----------------------------------------------------------------------------#
+# Commands.
+#
+# The flask command line commands of Fyyur. create_app() only adds them to
+# apps built by the flask command, so web workers never import this module
+# nor the bulk data modules below.
+#----------------------------------------------------------------------------#
+
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+import search
+import synthetic
+from importer import IMPORTS, BATCH_SIZE, import_file
+from cache import page_cache
+from counters import roll_over, rebuild as rebuild_show_counts
+from bookings import month_range
+from partitions import create_show_partitions, archive_shows
+from thumbnails import thumbnailer
+from suggestions import compute_suggestions
+
+
+@click.command('import-data')
+@with_appcontext
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows per insert and commit.')
+@click.option('--rejects', 'rejects_path', help='Where to write rejected rows, defaults to PATH.rejects.csv.')
+def import_data(kind, path, format, batch_size, rejects_path):
+  '''Bulk load venues, artists or shows from a CSV or JSON-lines file.'''
+  result = import_file(kind, path, format=format, batch_size=batch_size, rejects_path=rejects_path)
+  # bulk inserts do not fire the model events the caches listen to
+  page_cache.invalidate()
+  search.reset_search_indexes()
+
+  click.echo('Imported {} {} in {:.1f}s.'.format(result['imported'], kind, result['seconds']))
+  if result['rejected']:
+    click.echo('Rejected {} rows, see {}.'.format(result['rejected'], result['rejects_path']))
+
+
+@click.command('generate-data')
+@with_appcontext
+@click.option('--venues', default=100, show_default=True)
+@click.option('--artists', default=200, show_default=True)
+@click.option('--shows', default=2000, show_default=True)
+@click.option('--seed', default=0, show_default=True, help='Same seed, same data.')
+def generate_data(venues, artists, shows, seed):
+  '''Fill the database with synthetic venues, artists and shows.'''
+  started = time.time()
+  written = synthetic.generate(venues, artists, shows, seed=seed)
+  click.echo('Generated {} venues, {} artists and {} shows in {:.1f}s.'.format(
+    venues, artists, written, time.time() - started))
+
+
+@click.command('roll-over-show-counts')
+@with_appcontext
+@click.option('--rebuild', is_flag=True, help='Recount every show instead of rolling over.')
+def roll_over_show_counts(rebuild):
+  '''Move shows that have started from the upcoming to the past counts.'''
+  if rebuild:
+    rebuild_show_counts()
+    click.echo('Rebuilt the show counts.')
+  else:
+    click.echo('Moved {} shows from upcoming to past.'.format(roll_over()))
+
+
+@click.command('create-show-partitions')
+@with_appcontext
+@click.option('--months', type=int, help='Months ahead, defaults to SHOW_PARTITIONS_AHEAD.')
+def create_partitions(months):
+  '''Create the monthly partitions of the Show table for the coming months.'''
+  if months is None:
+    months = current_app.config['SHOW_PARTITIONS_AHEAD']
+  created = create_show_partitions(months)
+  click.echo('Created {} partitions{}'.format(len(created), ': ' + ', '.join(created) if created else '.'))
+
+
+@click.command('archive-shows')
+@with_appcontext
+@click.argument('before', metavar='YYYY-MM')
+def archive_old_shows(before):
+  '''Move the shows that started before the given month to Show_archive.'''
+  try:
+    start, _ = month_range(before)
+    archived = archive_shows(start)
+  except ValueError as error:
+    raise click.BadParameter(str(error), param_hint='BEFORE')
+  click.echo('Archived {} shows.'.format(archived))
+
+
+@click.command('refresh-thumbnails')
+@with_appcontext
+def refresh_thumbnails():
+  '''Check the image links that were never checked and make their thumbnails.'''
+  links = thumbnailer.unchecked_links()
+  statuses = [future.result() for future in thumbnailer.enqueue(links)]
+  click.echo('Checked {} image links, {} ready.'.format(len(statuses), statuses.count('ready')))
+
+
+@click.command('compute-suggestions')
+@with_appcontext
+@click.option('--count', type=int, help='Suggestions per venue and artist, defaults to SUGGESTIONS_PER_PAGE.')
+def compute_suggestions_command(count):
+  '''Match the venues seeking talent with the artists seeking venues.'''
+  started = time.time()
+  artists, venues = compute_suggestions(count)
+  click.echo('Suggested {} artists to venues and {} venues to artists in {:.1f}s.'.format(
+    artists, venues, time.time() - started))
+
+
+COMMANDS = (
+  import_data,
+  generate_data,
+  roll_over_show_counts,
+  create_partitions,
+  archive_old_shows,
+  refresh_thumbnails,
+  compute_suggestions_command,
+)
@@ -10,4 +10,84 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://monika@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://monika@localhost:5432/fyyur')
+
+# Read-only pages query this replica when it is set. After a write a client
+# reads from the primary for REPLICA_STICKY_SECONDS so it sees its changes.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Connection pool of each engine (ignored for SQLite). Pre-ping replaces
+# connections closed by the server, recycle retires them before a proxy or
+# firewall idle timeout.
+SQLALCHEMY_ENGINE_OPTIONS = {
+  'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+  'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+  'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+  'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+  'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'no'),
+}
+
+# Locale and time zone used to format dates. The locale is negotiated from
+# the Accept-Language header, the time zone can be picked with a 'tz' cookie.
+DEFAULT_LOCALE = 'en_US'
+DEFAULT_TIMEZONE = 'UTC'
+SUPPORTED_LOCALES = ['en_US', 'en_GB', 'de_DE', 'fr_FR', 'es_ES', 'pl_PL']
+
+# Outside debug mode, log records are written as JSON lines to LOG_FILE by
+# a background thread and the file is rotated at LOG_MAX_BYTES, keeping
+# LOG_BACKUP_COUNT old files. "{pid}" in LOG_FILE is replaced by the process
+# id, one file per process. Records are dropped when LOG_QUEUE_SIZE are
+# waiting to be written (see logs.py).
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(basedir, 'fyyur.log'))
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = 10000
+
+# Rendered page cache. Pages are kept in an in-process LRU unless
+# PAGE_CACHE_REDIS_URL points at a redis server shared by all workers, and
+# expire after PAGE_CACHE_TIMEOUT seconds.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_SIZE = 512
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL')
+
+# Per-request SQL statistics, sent in a Server-Timing header. A statement
+# run more than QUERY_REPEAT_THRESHOLD times by one request is logged as a
+# likely N+1 query; QUERY_TOOLBAR lists the statements on every page.
+QUERY_STATS_ENABLED = True
+QUERY_REPEAT_THRESHOLD = 10
+QUERY_TOOLBAR = DEBUG
+
+# PostgreSQL only: with SHOW_PARTITIONING=1 before "flask db upgrade", the
+# Show table is range partitioned by month (see partitions.py). Partitions
+# are kept SHOW_PARTITIONS_AHEAD months ahead by "flask create-show-partitions".
+SHOW_PARTITIONING = os.environ.get('SHOW_PARTITIONING', '0') in ('1', 'true', 'yes')
+SHOW_PARTITIONS_AHEAD = int(os.environ.get('SHOW_PARTITIONS_AHEAD', 12))
+
+# /calendar and /api/v1/calendar cover at most this many days per request
+CALENDAR_MAX_DAYS = 62
+
+# Image links are checked and downscaled to THUMBNAIL_SIZE pixel
+# thumbnails by THUMBNAIL_WORKERS background threads (0 runs them inline).
+# Downscaling needs Pillow; without it images are stored as fetched.
+# THUMBNAIL_PRIVATE_ADDRESSES allows links to hosts on private networks,
+# which are refused by default. Each process keeps the outcome of the
+# THUMBNAIL_LINKS_SIZE image links shown last.
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', os.path.join(basedir, 'thumbnails'))
+THUMBNAIL_SIZE = 300
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_MAX_BYTES = 5 * 1024 * 1024
+THUMBNAIL_TIMEOUT = 10
+THUMBNAIL_REFRESH_SECONDS = 30
+THUMBNAIL_LINKS_SIZE = 10000
+THUMBNAIL_PRIVATE_ADDRESSES = False
+
+# "flask compute-suggestions" stores the SUGGESTIONS_PER_PAGE best matches
+# of every venue seeking talent and artist seeking venues, scored with
+# these weights (see suggestions.py)
+SUGGESTIONS_PER_PAGE = 6
+SUGGESTION_WEIGHTS = {'genres': 0.6, 'location': 0.25, 'history': 0.15}
+# bytes the score matrices of one chunk of venues or artists may take
+SUGGESTION_MEMORY = 256 * 1024 * 1024
@@ -0,0 +1,269 @@
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Past and upcoming show counts per venue and artist, kept in the
+# venue_show_counts and artist_show_counts tables so that pages read two
+# numbers instead of counting shows. ORM writes of a Show adjust the counts
+# in the same flush through mapper events; bulk statements, which fire no
+# events, call update_counts themselves.
+#
+# A show is stored as past once it started at or before the rollover time
+# in show_counts_state. roll_over(), run periodically by the
+# "roll-over-show-counts" command, moves the shows that started since the
+# last run from upcoming to past. Readers subtract the shows that started
+# since the last rollover, a range scan of the start_time index, so counts
+# are exact between runs.
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, select, func, case, and_
+from sqlalchemy.orm.attributes import get_history
+from models import db, Venue, Artist, Show, venue_show_counts, artist_show_counts, \
+  show_counts_state
+
+STATE_ID = 1
+
+# owners per counter UPDATE, each taking five bound parameters, within the
+# limits of Postgres (65535) and SQLite (32766)
+APPLY_ROWS = 1000
+
+# counts table, its owner column and the matching Show column of each kind
+COUNTERS = {
+  'venue': (venue_show_counts, venue_show_counts.c.venue_id, Show.venue_id),
+  'artist': (artist_show_counts, artist_show_counts.c.artist_id, Show.artist_id),
+}
+
+
+def rolled_over_at(connection, lock=False):
+  '''
+  Returns the time up to which shows are stored as past. With lock, the
+  state row is share-locked until the end of the transaction so a
+  concurrent rollover waits for it (PostgreSQL; ignored by SQLite).
+  '''
+  query = select([show_counts_state.c.rolled_over_at]).where(show_counts_state.c.id == STATE_ID)
+  if lock:
+    query = query.with_for_update(read=True)
+  return connection.execute(query).scalar() or datetime.min
+
+
+def _set_rolled_over_at(connection, value):
+  result = connection.execute(show_counts_state.update()
+    .where(show_counts_state.c.id == STATE_ID)
+    .values(rolled_over_at=value))
+  if result.rowcount == 0:
+    connection.execute(show_counts_state.insert().values(id=STATE_ID, rolled_over_at=value))
+
+
+def _apply(connection, deltas):
+  # deltas maps (kind, owner id) to [past, upcoming] increments; each
+  # counts table takes one UPDATE for up to APPLY_ROWS owners, plus one
+  # INSERT for the owners that had no counts yet
+  by_kind = defaultdict(dict)
+  for (kind, id), (past, upcoming) in deltas.items():
+    if past or upcoming:
+      by_kind[kind][id] = (past, upcoming)
+  for kind, owners in by_kind.items():
+    ids = sorted(owners)
+    for start in range(0, len(ids), APPLY_ROWS):
+      _apply_chunk(connection, kind, {id: owners[id] for id in ids[start:start + APPLY_ROWS]})
+
+
+def _apply_chunk(connection, kind, owners):
+  table, owner, _ = COUNTERS[kind]
+  past = case({id: counts[0] for id, counts in owners.items()}, value=owner, else_=0)
+  upcoming = case({id: counts[1] for id, counts in owners.items()}, value=owner, else_=0)
+  result = connection.execute(table.update()
+    .where(owner.in_(list(owners)))
+    .values(past_shows=table.c.past_shows + past,
+            upcoming_shows=table.c.upcoming_shows + upcoming))
+  if result.rowcount == len(owners):
+    return
+  counted = {id for id, in connection.execute(select([owner]).where(owner.in_(list(owners))))}
+  connection.execute(table.insert().values([{
+    owner.name: id,
+    'past_shows': max(past, 0),
+    'upcoming_shows': max(upcoming, 0)
+  } for id, (past, upcoming) in owners.items() if id not in counted]))
+
+
+def update_counts(connection, added=(), removed=()):
+  '''
+  Adjusts the counters for shows added or removed, each given as a
+  (venue_id, artist_id, start_time) tuple.
+  '''
+  boundary = rolled_over_at(connection, lock=True)
+  deltas = defaultdict(lambda: [0, 0])
+  for shows, sign in ((added, 1), (removed, -1)):
+    for venue_id, artist_id, start_time in shows:
+      slot = 0 if start_time <= boundary else 1
+      deltas[('venue', venue_id)][slot] += sign
+      deltas[('artist', artist_id)][slot] += sign
+  _apply(connection, deltas)
+
+
+def _show_key(show):
+  return (show.venue_id, show.artist_id, show.start_time)
+
+
+def _show_inserted(mapper, connection, target):
+  update_counts(connection, added=[_show_key(target)])
+
+
+def _show_deleted(mapper, connection, target):
+  update_counts(connection, removed=[_show_key(target)])
+
+
+def _show_updated(mapper, connection, target):
+  old = []
+  changed = False
+  for name in ('venue_id', 'artist_id', 'start_time'):
+    history = get_history(target, name)
+    changed = changed or history.has_changes()
+    old.append(history.deleted[0] if history.deleted else getattr(target, name))
+  if changed:
+    update_counts(connection, added=[_show_key(target)], removed=[tuple(old)])
+
+
+def _keep_history(target, value, oldvalue, initiator):
+  pass
+
+
+def _subtract(connection, kind, criterion, boundary):
+  # takes the shows matching criterion off the counts of their venues or
+  # artists, one statement
+  table, owner, show_column = COUNTERS[kind]
+
+  def removed(*criteria):
+    return select([func.count(Show.id)]) \
+      .where(show_column == owner) \
+      .where(and_(criterion, *criteria)) \
+      .as_scalar()
+
+  connection.execute(table.update()
+    .where(owner.in_(select([show_column]).where(criterion)))
+    .values(past_shows=table.c.past_shows - removed(Show.start_time <= boundary),
+            upcoming_shows=table.c.upcoming_shows - removed(Show.start_time > boundary)))
+
+
+def shows_removed(connection, criterion):
+  '''
+  Takes the shows matching the criterion, a filter on Show, off the counts
+  of their venues and artists. Called before a bulk statement deletes or
+  moves them.
+  '''
+  boundary = rolled_over_at(connection, lock=True)
+  for kind in COUNTERS:
+    _subtract(connection, kind, criterion, boundary)
+
+
+def owners_deleted(connection, kind, ids):
+  '''
+  Takes the shows of the given venues or artists (kind 'venue' or 'artist')
+  off the counts of their artists or venues, and drops the owners' own
+  counts, in one statement each. Called before the owners are deleted;
+  their shows go with them through ON DELETE CASCADE, which fires no
+  events.
+  '''
+  table, owner, show_column = COUNTERS[kind]
+  boundary = rolled_over_at(connection, lock=True)
+  _subtract(connection, 'artist' if kind == 'venue' else 'venue', show_column.in_(ids), boundary)
+  connection.execute(table.delete().where(owner.in_(ids)))
+
+
+def _owner_deleted(mapper, connection, target):
+  # shows loaded in the session were deleted first, in the same flush, and
+  # took themselves off the counts; the others are left to the database
+  owners_deleted(connection, 'venue' if mapper.class_ is Venue else 'artist', [target.id])
+
+
+event.listen(Show, 'after_insert', _show_inserted)
+event.listen(Show, 'after_update', _show_updated)
+event.listen(Show, 'after_delete', _show_deleted)
+event.listen(Venue, 'before_delete', _owner_deleted)
+event.listen(Artist, 'before_delete', _owner_deleted)
+
+# keep the previous value of these attributes when they are set, so updates
+# can be taken off the right counters
+for _attribute in (Show.venue_id, Show.artist_id, Show.start_time):
+  event.listen(_attribute, 'set', _keep_history, active_history=True)
+
+
+def get_show_counts(kind, ids=None, now=None):
+  '''
+  Returns a dict mapping venue or artist ids (kind 'venue' or 'artist') to
+  their (past, upcoming) show counts, for the given ids or for all of them.
+  Ids without shows are missing from the dict.
+  '''
+  table, owner, show_column = COUNTERS[kind]
+  if ids is not None and not ids:
+    return {}
+  now = now or datetime.now()
+
+  query = select([owner, table.c.past_shows, table.c.upcoming_shows])
+  started = db.session.query(show_column, func.count(Show.id))
+  if ids is not None:
+    query = query.where(owner.in_(ids))
+    started = started.filter(show_column.in_(ids))
+  counts = {id: [past, upcoming] for id, past, upcoming in db.session.execute(query)}
+
+  # shows that started since the last rollover are still stored as upcoming
+  since = rolled_over_at(db.session)
+  if now > since:
+    started = started \
+      .filter(Show.start_time > since, Show.start_time <= now) \
+      .group_by(show_column)
+    for id, count in started:
+      if id in counts:
+        counts[id][0] += count
+        counts[id][1] -= count
+  return {id: tuple(count) for id, count in counts.items()}
+
+
+def roll_over(now=None):
+  '''
+  Moves the shows that started since the last rollover from the upcoming to
+  the past counts. Returns the number of shows moved.
+  '''
+  now = now or datetime.now()
+  connection = db.session.connection()
+  # the exclusive lock waits for transactions adding or removing shows
+  since = connection.execute(
+    select([show_counts_state.c.rolled_over_at])
+      .where(show_counts_state.c.id == STATE_ID)
+      .with_for_update()).scalar() or datetime.min
+  if now <= since:
+    db.session.commit()
+    return 0
+
+  moved = 0
+  for kind, (table, owner, show_column) in COUNTERS.items():
+    rows = db.session.query(show_column, func.count(Show.id)) \
+      .filter(Show.start_time > since, Show.start_time <= now) \
+      .group_by(show_column) \
+      .all()
+    _apply(connection, {(kind, id): [count, -count] for id, count in rows})
+    if kind == 'venue':
+      moved = sum(count for _, count in rows)
+  _set_rolled_over_at(connection, now)
+  db.session.commit()
+  return moved
+
+
+def rebuild(now=None):
+  '''
+  Recounts every venue's and artist's shows from scratch. Used to
+  initialize the counters and to repair them after writes that bypassed
+  update_counts.
+  '''
+  now = now or datetime.now()
+  connection = db.session.connection()
+  for table, owner, show_column in COUNTERS.values():
+    connection.execute(table.delete())
+    past = func.sum(case([(Show.start_time <= now, 1)], else_=0))
+    upcoming = func.sum(case([(Show.start_time > now, 1)], else_=0))
+    connection.execute(table.insert().from_select(
+      [owner.name, 'past_shows', 'upcoming_shows'],
+      select([show_column, past, upcoming]).group_by(show_column)))
+  _set_rolled_over_at(connection, now)
+  db.session.commit()
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# Deletion.
+#
+# Set based deletes of venues and artists. The database removes their
+# shows, genre links, show counts and suggestions through the ON DELETE
+# CASCADE foreign keys of migrations 3e9a7d1c5b28 and 5f8a2c6e9b14, so
+# deleting a venue is one statement however many shows it has. Only the
+# counts of the other side of each show (the artists of a deleted venue's
+# shows) are adjusted first, with one aggregate query.
+#
+# SQLite enforces foreign keys only when the foreign_keys pragma is on,
+# which it is not by default (batch migrations rebuild tables and would
+# cascade); there the dependent rows are deleted explicitly, still one
+# statement per table.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import event, text
+import search
+from models import db, Venue, Artist, Show, venue_genres, artist_genres, venue_show_counts, \
+  artist_show_counts, suggested_artists, suggested_venues
+from cache import page_cache
+from counters import owners_deleted
+
+# ids per statement, below SQLite's limit on bound parameters
+CHUNK_SIZE = 500
+
+# model, show column, genre link column, show counts column and suggestion
+# columns of each kind
+KINDS = {
+  'venue': (Venue, Show.venue_id, venue_genres.c.venue_id, venue_show_counts.c.venue_id,
+            (suggested_artists.c.venue_id, suggested_venues.c.venue_id)),
+  'artist': (Artist, Show.artist_id, artist_genres.c.artist_id, artist_show_counts.c.artist_id,
+             (suggested_venues.c.artist_id, suggested_artists.c.artist_id)),
+}
+
+
+def _cascades(connection):
+  if connection.dialect.name != 'sqlite':
+    return True
+  return bool(connection.execute(text('PRAGMA foreign_keys')).scalar())
+
+
+def _delete_dependents(mapper, connection, target):
+  # ORM deletes do not load the shows (passive_deletes), remove them and
+  # the suggestions here where the database would not
+  if not _cascades(connection):
+    _, show_column, _, _, suggestion_columns = KINDS['venue' if mapper.class_ is Venue else 'artist']
+    for column in (show_column,) + suggestion_columns:
+      connection.execute(column.table.delete().where(column == target.id))
+
+
+event.listen(Venue, 'before_delete', _delete_dependents)
+event.listen(Artist, 'before_delete', _delete_dependents)
+
+
+def _delete(kind, ids):
+  model, show_column, genre_column, counts_column, suggestion_columns = KINDS[kind]
+  ids = sorted(set(ids))
+  connection = db.session.connection()
+  cascades = _cascades(connection)
+  deleted = 0
+  for i in range(0, len(ids), CHUNK_SIZE):
+    chunk = ids[i:i + CHUNK_SIZE]
+    owners_deleted(connection, kind, chunk)
+    if not cascades:
+      for column in (show_column, genre_column, counts_column) + suggestion_columns:
+        connection.execute(column.table.delete().where(column.in_(chunk)))
+    deleted += connection.execute(model.__table__.delete().where(model.id.in_(chunk))).rowcount
+  db.session.commit()
+
+  # bulk statements fire no mapper events
+  page_cache.invalidate()
+  search.forget(model, ids)
+  return deleted
+
+
+def delete_venues(ids):
+  '''
+  Deletes the venues with the given ids along with their shows, and commits.
+  Returns the number of venues deleted; unknown ids are ignored.
+  '''
+  return _delete('venue', ids)
+
+
+def delete_artists(ids):
+  '''
+  Deletes the artists with the given ids along with their shows, and
+  commits. Returns the number of artists deleted; unknown ids are ignored.
+  '''
+  return _delete('artist', ids)
@@ -0,0 +1,104 @@
+#----------------------------------------------------------------------------#
+# Formatting.
+#
+# Date formatting for the templates. Babel patterns, locales and time zones
+# are parsed once and reused, and formatted strings are memoized in a
+# bounded LRU cache, so a page with many shows formats each distinct start
+# time only once.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+import babel.dates
+import dateutil.parser
+from babel import Locale
+from flask import g, has_request_context
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+DEFAULT_LOCALE = 'en_US'
+DEFAULT_TIMEZONE = 'UTC'
+FORMAT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=64)
+def _pattern(format):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=64)
+def _locale(name):
+  return Locale.parse(name)
+
+
+@lru_cache(maxsize=64)
+def _timezone(name):
+  return babel.dates.get_timezone(name)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _parse(value):
+  return dateutil.parser.parse(value)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format(value, format, locale, timezone):
+  # naive datetimes are stored in UTC, like babel.dates.format_datetime
+  # assumes
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=babel.dates.UTC)
+  tzinfo = _timezone(timezone)
+  value = tzinfo.normalize(value.astimezone(tzinfo)) if hasattr(tzinfo, 'normalize') \
+    else value.astimezone(tzinfo)
+  return _pattern(format).apply(value, _locale(locale))
+
+
+def current_locale():
+  if has_request_context():
+    return getattr(g, 'locale', DEFAULT_LOCALE)
+  return DEFAULT_LOCALE
+
+
+def current_timezone():
+  if has_request_context():
+    return getattr(g, 'timezone', DEFAULT_TIMEZONE)
+  return DEFAULT_TIMEZONE
+
+
+def format_datetime(value, format='medium', locale=None, timezone=None):
+  '''
+  Formats a datetime with a named format ('full' or 'medium') or a Babel
+  pattern. Uses the locale and time zone of the current request unless
+  they are given. Strings are still accepted and parsed once.
+  '''
+  if value is None:
+    return ''
+  if not isinstance(value, datetime):
+    value = _parse(str(value))
+  return _format(value, format, locale or current_locale(), timezone or current_timezone())
+
+
+def select_locale(request, supported_locales, default=DEFAULT_LOCALE):
+  '''
+  Returns the best supported locale for the request's Accept-Language
+  header.
+  '''
+  return request.accept_languages.best_match(supported_locales) or default
+
+
+def select_timezone(request, default=DEFAULT_TIMEZONE):
+  '''
+  Returns the time zone named by the request's 'tz' cookie or query
+  argument, or the default if it is missing or unknown.
+  '''
+  name = request.args.get('tz') or request.cookies.get('tz')
+  if not name:
+    return default
+  try:
+    _timezone(name)
+  except LookupError:
+    return default
+  return name
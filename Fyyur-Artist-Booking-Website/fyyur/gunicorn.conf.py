@@ -0,0 +1,25 @@
+#----------------------------------------------------------------------------#
+# Gunicorn.
+#
+#   gunicorn 'app:create_app()'
+#
+# The app is built once in the master and the workers are forked from it,
+# sharing its memory pages. Objects are moved out of the collector's reach
+# before forking, so collections in a worker do not touch (and copy) them.
+# create_app() opens no database connection, the workers open their own.
+#----------------------------------------------------------------------------#
+
+import gc
+import os
+
+# each worker writes its own log file
+os.environ.setdefault('LOG_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fyyur-{pid}.log'))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+preload_app = True
+
+
+def pre_fork(server, worker):
+  gc.freeze()
+
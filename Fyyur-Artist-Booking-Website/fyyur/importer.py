@@ -0,0 +1,323 @@
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams venues, artists or shows from a CSV or JSON-lines file into the
+# database. Rows are validated with the same WTForms forms used by the
+# create pages, collected into fixed size batches and written with
+# multi-row INSERT statements of INSERT_ROWS rows, one commit per batch.
+# Only the current batch is held in memory, so files of any size can be
+# loaded. Rejected rows are written to a CSV report with their line number,
+# validation errors and the row as read from the file.
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import time
+from sqlalchemy import or_, text
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, venue_genres, artist_genres, get_genres, \
+  show_end_time, MAX_SHOW_DURATION
+from bookings import IntervalIndex
+from counters import update_counts
+
+BATCH_SIZE = 5000
+
+# rows per INSERT statement, within the bound parameter limits of Postgres
+# (65535) and SQLite (32766)
+INSERT_ROWS = 1000
+
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'on')
+
+
+def read_rows(path, format=None):
+  '''
+  Yields (line number, row) pairs from a CSV file with a header row or from
+  a JSON-lines file. The format is taken from the file extension unless
+  given. Lines that are not valid JSON are yielded as a ValueError.
+  '''
+  format = format or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+  with open(path, newline='', encoding='utf-8') as f:
+    if format == 'csv':
+      reader = csv.DictReader(f)
+      for row in reader:
+        yield reader.line_num, row
+    else:
+      for number, line in enumerate(f, 1):
+        if not line.strip():
+          continue
+        try:
+          yield number, json.loads(line)
+        except ValueError as error:
+          yield number, error
+
+
+def _form_data(row):
+  # turn a csv/json row into the form data a browser would have posted
+  data = MultiDict()
+  for key, value in row.items():
+    if value is None:
+      continue
+    if key == 'genres':
+      names = value if isinstance(value, list) else str(value).split(',')
+      for name in names:
+        if str(name).strip():
+          data.add('genres', str(name).strip())
+    elif key.startswith('seeking_') and key != 'seeking_description':
+      if isinstance(value, bool) and value or str(value).strip().lower() in TRUE_VALUES:
+        data.add(key, 'y')
+    else:
+      data.add(key, str(value))
+  return data
+
+
+def _insert(table, rows):
+  # multi-row INSERTs of the mappings, INSERT_ROWS at a time
+  connection = db.session.connection()
+  for start in range(0, len(rows), INSERT_ROWS):
+    connection.execute(table.insert().values(rows[start:start + INSERT_ROWS]))
+
+
+def _insert_with_ids(table, rows):
+  '''
+  Inserts the mappings like _insert and returns the ids given to them, in
+  order.
+  '''
+  connection = db.session.connection()
+  if connection.dialect.name == 'postgresql':
+    # ids are taken from the table's sequence first, rather than relying on
+    # the order of the rows of INSERT ... RETURNING
+    ids = [id for id, in connection.execute(
+      text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+      table=table.name, count=len(rows))]
+    _insert(table, [dict(row, id=id) for row, id in zip(rows, ids)])
+    return ids
+  # SQLite numbers the rows of one INSERT consecutively, the statement
+  # holding the database's write lock
+  ids = []
+  for start in range(0, len(rows), INSERT_ROWS):
+    chunk = rows[start:start + INSERT_ROWS]
+    last = connection.execute(table.insert().values(chunk)).lastrowid
+    ids.extend(range(last - len(chunk) + 1, last + 1))
+  return ids
+
+
+def _validate(form_class, row):
+  '''
+  Returns (form, errors) for the row; errors is empty if the row is valid.
+  '''
+  if not isinstance(row, dict):
+    return None, {'row': [str(row)]}
+  if None in row:
+    # csv.DictReader puts the fields beyond the header under None
+    return None, {'row': ['More fields than the header.']}
+  form = form_class(formdata=_form_data(row), meta={'csrf': False})
+  form.validate()
+  return form, form.errors
+
+
+class VenueImport(object):
+  form_class = VenueForm
+  model = Venue
+  genres_table = venue_genres
+  owner_column = 'venue_id'
+  fields = ('name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+            'website', 'seeking_talent', 'seeking_description')
+
+  def __init__(self):
+    self.genre_ids = {}
+
+  def check(self, form):
+    # rules beyond the form validators, none for venues and artists
+    return {}
+
+  def mapping(self, form):
+    return {name: form[name].data for name in self.fields}, form.genres.data
+
+  def _genre_ids(self, names):
+    missing = [name for name in names if name not in self.genre_ids]
+    if missing:
+      genres = get_genres(missing)
+      db.session.flush()
+      self.genre_ids.update((genre.name, genre.id) for genre in genres)
+    return [self.genre_ids[name] for name in names]
+
+  def write(self, rows):
+    '''
+    Inserts the accepted rows and returns the ones rejected at write time.
+    '''
+    # the new ids are needed for the genre links
+    ids = _insert_with_ids(self.model.__table__, [mapping for _, mapping, _ in rows])
+    links = []
+    for (_, _, names), id in zip(rows, ids):
+      for genre_id in self._genre_ids(names):
+        links.append({self.owner_column: id, 'genre_id': genre_id})
+    if links:
+      _insert(self.genres_table, links)
+    return []
+
+
+class ArtistImport(VenueImport):
+  form_class = ArtistForm
+  model = Artist
+  genres_table = artist_genres
+  owner_column = 'artist_id'
+  fields = ('name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website',
+            'seeking_venues', 'seeking_description')
+
+
+class ShowImport(object):
+  form_class = ShowForm
+
+  def mapping(self, form):
+    mapping = {
+      'venue_id': int(form.venue_id.data),
+      'artist_id': int(form.artist_id.data),
+      'start_time': form.start_time.data,
+      'end_time': show_end_time(form.start_time.data, form.duration.data)
+    }
+    return mapping, None
+
+  def _bookings(self, venue_ids, artist_ids, rows):
+    # the shows already booked for the batch's venues and artists during
+    # the time the batch covers, read with one query
+    start = min(mapping['start_time'] for _, mapping, _ in rows)
+    end = max(mapping['end_time'] for _, mapping, _ in rows)
+    bookings = IntervalIndex()
+    shows = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+      .filter(or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids))) \
+      .filter(Show.start_time > start - MAX_SHOW_DURATION) \
+      .filter(Show.start_time < end) \
+      .filter(Show.end_time > start)
+    for venue_id, artist_id, start_time, end_time in shows:
+      bookings.add(('venue', venue_id), start_time, end_time)
+      bookings.add(('artist', artist_id), start_time, end_time)
+    return bookings
+
+  def write(self, rows):
+    venue_ids = {mapping['venue_id'] for _, mapping, _ in rows}
+    artist_ids = {mapping['artist_id'] for _, mapping, _ in rows}
+    # one lookup per batch instead of one per row
+    venues = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    artists = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    bookings = self._bookings(venue_ids, artist_ids, rows)
+
+    accepted = []
+    rejected = []
+    for line, mapping, _ in rows:
+      errors = {}
+      venue = ('venue', mapping['venue_id'])
+      artist = ('artist', mapping['artist_id'])
+      if mapping['venue_id'] not in venues:
+        errors['venue_id'] = ['Unknown venue.']
+      elif bookings.overlaps(venue, mapping['start_time'], mapping['end_time']):
+        errors['venue_id'] = ['Venue already booked at that time.']
+      if mapping['artist_id'] not in artists:
+        errors['artist_id'] = ['Unknown artist.']
+      elif bookings.overlaps(artist, mapping['start_time'], mapping['end_time']):
+        errors['artist_id'] = ['Artist already booked at that time.']
+      if errors:
+        rejected.append((line, mapping, errors))
+      else:
+        # later rows of the batch are checked against this one too
+        bookings.add(venue, mapping['start_time'], mapping['end_time'])
+        bookings.add(artist, mapping['start_time'], mapping['end_time'])
+        accepted.append(mapping)
+    if accepted:
+      _insert(Show.__table__, accepted)
+      update_counts(db.session.connection(), added=[
+        (mapping['venue_id'], mapping['artist_id'], mapping['start_time']) for mapping in accepted])
+    return rejected
+
+  def check(self, form):
+    # the form takes ids as free text, they must at least be numbers
+    errors = {}
+    for name in ('venue_id', 'artist_id'):
+      try:
+        int(form[name].data)
+      except (TypeError, ValueError):
+        errors[name] = ['Must be a numeric id.']
+    return errors
+
+
+IMPORTS = {
+  'venues': VenueImport,
+  'artists': ArtistImport,
+  'shows': ShowImport,
+}
+
+
+class _RejectReport(object):
+
+  def __init__(self, path):
+    self.path = path
+    self.file = None
+    self.writer = None
+    self.count = 0
+
+  def add(self, line, row, errors):
+    if self.writer is None:
+      self.file = open(self.path, 'w', newline='', encoding='utf-8')
+      self.writer = csv.writer(self.file)
+      self.writer.writerow(['line', 'errors', 'row'])
+    self.writer.writerow([line, json.dumps(errors, default=str), json.dumps(row, default=str)])
+    self.count += 1
+
+  def close(self):
+    if self.file is not None:
+      self.file.close()
+
+
+def import_file(kind, path, format=None, batch_size=BATCH_SIZE, rejects_path=None):
+  '''
+  Imports every valid row of the file as a venue, artist or show. Returns a
+  dict with the number of imported and rejected rows, the path of the
+  rejects report (None if nothing was rejected) and the elapsed seconds.
+  '''
+  importer = IMPORTS[kind]()
+  report = _RejectReport(rejects_path or path + '.rejects.csv')
+  started = time.time()
+  imported = 0
+  batch = []
+
+  # the rows of the batch as read, by line, for the rejects report
+  sources = {}
+
+  def flush():
+    rejected = importer.write(batch)
+    db.session.commit()
+    for line, _, errors in rejected:
+      report.add(line, sources[line], errors)
+    del batch[:]
+    sources.clear()
+    return len(rejected)
+
+  try:
+    for line, row in read_rows(path, format):
+      form, errors = _validate(importer.form_class, row)
+      if not errors:
+        errors = importer.check(form)
+      if errors:
+        report.add(line, row, errors)
+        continue
+
+      mapping, genres = importer.mapping(form)
+      batch.append((line, mapping, genres))
+      sources[line] = row
+      imported += 1
+      if len(batch) >= batch_size:
+        imported -= flush()
+    if batch:
+      imported -= flush()
+  except Exception:
+    db.session.rollback()
+    raise
+  finally:
+    report.close()
+
+  return {
+    'imported': imported,
+    'rejected': report.count,
+    'rejects_path': report.path if report.count else None,
+    'seconds': time.time() - started
+  }
@@ -0,0 +1,196 @@
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# Outside debug mode the app logger hands its records to a queue and
+# returns; a listener thread writes them to LOG_FILE as JSON lines and
+# rotates the file at LOG_MAX_BYTES. A request thread never waits for the
+# disk: when LOG_QUEUE_SIZE records are already waiting, new ones are
+# dropped and counted instead.
+#
+# Every request gets an id, taken from a well formed X-Request-ID header or
+# generated, and sent back in X-Request-ID. Records logged during a request
+# carry its id, method, route (the URL rule, e.g. /venues/<int:venue_id>)
+# and path, and one record per request adds the status and the latency in
+# milliseconds, from which per-route percentiles can be computed:
+#
+#   jq -r 'select(.latency_ms) | [.route, .latency_ms] | @tsv' fyyur.log
+#
+# Threads do not survive fork: a worker forked from a preloaded app starts
+# its own queue and listener. Several processes must not rotate one file,
+# so "{pid}" in LOG_FILE is replaced by the process id.
+#----------------------------------------------------------------------------#
+
+import atexit
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from copy import copy
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Queue, Full
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+# request ids accepted from the X-Request-ID header
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+REQUEST_FIELDS = ('request_id', 'method', 'route', 'path', 'status', 'latency_ms')
+
+
+class JSONFormatter(logging.Formatter):
+  '''
+  Formats a record as one line of JSON with its request fields and
+  traceback, if any.
+  '''
+
+  def format(self, record):
+    entry = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    for name in REQUEST_FIELDS:
+      value = getattr(record, name, None)
+      if value is not None:
+        entry[name] = value
+    if record.exc_info and not record.exc_text:
+      record.exc_text = self.formatException(record.exc_info)
+    if record.exc_text:
+      entry['exception'] = record.exc_text
+    return json.dumps(entry, default=str)
+
+
+class RequestFilter(logging.Filter):
+  '''
+  Adds the fields of the current request to records. It runs in the
+  thread that logs, where the request is known.
+  '''
+
+  def filter(self, record):
+    if has_request_context():
+      record.request_id = g.get('request_id')
+      record.method = request.method
+      record.route = request.url_rule.rule if request.url_rule is not None else None
+      record.path = request.path
+    return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+  '''
+  Queues records for the listener thread without ever waiting: records
+  that find the queue full are dropped and counted in dropped.
+  '''
+
+  def __init__(self, records):
+    super(NonBlockingQueueHandler, self).__init__(records)
+    self.dropped = 0
+
+  def prepare(self, record):
+    # the message is rendered here, while its arguments are as logged; the
+    # request fields and the traceback are kept apart for the formatter
+    record = copy(record)
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    return record
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except Full:
+      self.dropped += 1
+
+
+class LogWriter(object):
+  '''
+  The queue handler of an app and the listener thread writing its records
+  to a rotating file.
+  '''
+
+  def __init__(self, path, max_bytes, backup_count, queue_size):
+    self.path = path
+    self.max_bytes = max_bytes
+    self.backup_count = backup_count
+    self.queue_size = queue_size
+    self.handler = NonBlockingQueueHandler(Queue(queue_size))
+    self.handler.addFilter(RequestFilter())
+    self.listener = None
+    self.start()
+    os.register_at_fork(after_in_child=self.start)
+    atexit.register(self.stop)
+
+  def start(self):
+    # also run in a forked child, where the parent's listener thread does
+    # not exist and its queue may hold records written by the parent
+    self.handler.queue = Queue(self.queue_size)
+    file_handler = RotatingFileHandler(
+      self.path.replace('{pid}', str(os.getpid())),
+      maxBytes=self.max_bytes, backupCount=self.backup_count, delay=True)
+    file_handler.setFormatter(JSONFormatter())
+    self.listener = QueueListener(self.handler.queue, file_handler)
+    self.listener.start()
+
+  def stop(self):
+    # writes the records still queued, then closes the file
+    listener, self.listener = self.listener, None
+    if listener is None:
+      return
+    try:
+      listener.stop()
+    except Full:
+      # no room for the stop sentinel, the thread is a daemon
+      return
+    for handler in listener.handlers:
+      handler.close()
+
+
+def _request_id():
+  value = request.headers.get('X-Request-ID', '')
+  return value if _REQUEST_ID.match(value) else uuid.uuid4().hex
+
+
+def init_logging(app):
+  '''
+  Gives every request of the app an id, and outside debug mode sends the
+  app logger's records through a LogWriter with one record per request.
+  Returns the LogWriter, or None in debug mode.
+  '''
+
+  @app.before_request
+  def start_request_log():
+    g.request_id = _request_id()
+    g.request_started = time.perf_counter()
+
+  @app.after_request
+  def set_request_id(response):
+    if 'request_id' in g:
+      response.headers['X-Request-ID'] = g.request_id
+    return response
+
+  if app.debug:
+    return None
+
+  config = app.config
+  writer = LogWriter(config['LOG_FILE'], config['LOG_MAX_BYTES'], config['LOG_BACKUP_COUNT'],
+                     config['LOG_QUEUE_SIZE'])
+  # Flask's handler writes to stderr in the request thread
+  app.logger.removeHandler(default_handler)
+  app.logger.addHandler(writer.handler)
+  app.logger.setLevel(logging.INFO)
+
+  @app.after_request
+  def log_request(response):
+    if 'request_started' not in g:
+      return response
+    latency = (time.perf_counter() - g.request_started) * 1000
+    app.logger.info('%s %s %s', request.method, request.path, response.status_code,
+                    extra={'status': response.status_code, 'latency_ms': round(latency, 2)})
+    return response
+
+  return writer
@@ -0,0 +1,33 @@
+"""add image link checks and thumbnails
+
+Revision ID: 1c7f3e5a9d62
+Revises: 6d2b8e4a1f07
+Create Date: 2020-10-16 10:27:44.118306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c7f3e5a9d62'
+down_revision = '6d2b8e4a1f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_links',
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('thumbnail', sa.String(length=80), nullable=True),
+        sa.Column('error', sa.String(length=250), nullable=True),
+        sa.Column('checked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('url')
+    )
+    op.create_index('ix_image_links_checked_at', 'image_links', ['checked_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_image_links_checked_at', table_name='image_links')
+    op.drop_table('image_links')
@@ -0,0 +1,95 @@
+"""add show end times and forbid double bookings
+
+Revision ID: 2f8d6b4c0e17
+Revises: 7c4e2a9b1d30
+Create Date: 2020-10-05 18:12:40.915327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f8d6b4c0e17'
+down_revision = '7c4e2a9b1d30'
+branch_labels = None
+depends_on = None
+
+# existing shows get the default two hour duration of models.py
+DEFAULT_DURATION = {
+    'postgresql': "start_time + interval '2 hours'",
+    'sqlite': "datetime(start_time, '+2 hours')",
+}
+
+# conflicting pairs of shows listed when the constraints cannot be added
+MAX_REPORTED_OVERLAPS = 20
+
+
+def _overlapping_shows(bind, column):
+    # pairs of shows of the same venue or artist whose times overlap, which
+    # the exclusion constraint on column would reject
+    return bind.execute(
+        'SELECT a.{column}, a.id, a.start_time, b.id, b.start_time '
+        'FROM "Show" a JOIN "Show" b ON b.{column} = a.{column} AND b.id > a.id '
+        'AND b.start_time < a.end_time AND a.start_time < b.end_time '
+        'ORDER BY a.{column}, a.start_time, b.start_time LIMIT {limit}'.format(
+            column=column, limit=MAX_REPORTED_OVERLAPS + 1)
+    ).fetchall()
+
+
+def _check_bookings(bind):
+    # fail with the double bookings found rather than with the first
+    # conflict Postgres meets while building the constraints
+    lines = []
+    for column, kind in (('venue_id', 'venue'), ('artist_id', 'artist')):
+        rows = _overlapping_shows(bind, column)
+        for owner, first, first_start, second, second_start in rows[:MAX_REPORTED_OVERLAPS]:
+            lines.append('  {} {}: show {} at {} and show {} at {}'.format(
+                kind, owner, first, first_start, second, second_start))
+        if len(rows) > MAX_REPORTED_OVERLAPS:
+            lines.append('  and more overlapping {} shows'.format(kind))
+    if lines:
+        raise RuntimeError(
+            'Shows of the same venue or artist overlap, counting two hours for '
+            'each show; move or delete one show of each pair and upgrade '
+            'again:\n{}'.format('\n'.join(lines)))
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('UPDATE "Show" SET end_time = {}'.format(DEFAULT_DURATION[bind.dialect.name]))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_after_start', 'end_time > start_time')
+
+    if bind.dialect.name == 'postgresql':
+        _check_bookings(bind)
+        # the columns are timestamps without time zone, hence tsrange; the
+        # half open ranges let a show start when the previous one ends. The
+        # names are quoted, as in 6d2b8e4a1f07._booking_constraints
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_booking" '
+            'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)'
+        )
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_artist_booking" '
+            'EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)'
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # databases upgraded before the names were quoted have them in
+        # lower case
+        for kind in ('artist', 'venue'):
+            for name in ('"ex_Show_{}_booking"', 'ex_show_{}_booking'):
+                op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS ' + name.format(kind))
+    with op.batch_alter_table('Show') as batch_op:
+        # SQLite does not reflect check constraints, the table is rebuilt
+        # without it
+        if dialect != 'sqlite':
+            batch_op.drop_constraint('ck_Show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
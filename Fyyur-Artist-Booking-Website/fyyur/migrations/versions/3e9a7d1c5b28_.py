@@ -0,0 +1,62 @@
+"""delete shows, genre links and show counts with their venue or artist
+
+Revision ID: 3e9a7d1c5b28
+Revises: 8b2d4f6a0c53
+Create Date: 2020-10-12 09:41:18.203954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9a7d1c5b28'
+down_revision = '8b2d4f6a0c53'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) of every foreign key made ON DELETE CASCADE
+FOREIGN_KEYS = (
+    ('Show', 'venue_id', 'Venue'),
+    ('Show', 'artist_id', 'Artist'),
+    ('venue_genres', 'venue_id', 'Venue'),
+    ('venue_genres', 'genre_id', 'Genre'),
+    ('artist_genres', 'artist_id', 'Artist'),
+    ('artist_genres', 'genre_id', 'Genre'),
+    ('venue_show_counts', 'venue_id', 'Venue'),
+    ('artist_show_counts', 'artist_id', 'Artist'),
+)
+
+# the foreign keys were created unnamed, PostgreSQL named them like this;
+# batch operations give SQLite's reflected ones the same names
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# SQLite does not reflect check constraints, tables rebuilt by batch
+# operations get them back from here
+TABLE_ARGS = {
+    'Show': (sa.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),),
+}
+
+
+def _replace_foreign_keys(ondelete):
+    tables = []
+    for table, _, _ in FOREIGN_KEYS:
+        if table not in tables:
+            tables.append(table)
+    for table in tables:
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION,
+                                  table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            for fk_table, column, referent in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                name = '{}_{}_fkey'.format(table, column)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referent, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
@@ -0,0 +1,60 @@
+"""add materialized show counts per venue and artist
+
+Revision ID: 5a7e3c9f1b64
+Revises: 2f8d6b4c0e17
+Create Date: 2020-10-08 11:47:02.381954
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7e3c9f1b64'
+down_revision = '2f8d6b4c0e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('venue_show_counts',
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('past_shows', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        sa.PrimaryKeyConstraint('venue_id')
+    )
+    op.create_table('artist_show_counts',
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('past_shows', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.PrimaryKeyConstraint('artist_id')
+    )
+    op.create_table('show_counts_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_over_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # count the existing shows, as counters.rebuild() does
+    bind = op.get_bind()
+    now = datetime.now()
+    for table, column in (('venue_show_counts', 'venue_id'), ('artist_show_counts', 'artist_id')):
+        bind.execute(sa.text(
+            'INSERT INTO {table} ({column}, past_shows, upcoming_shows) '
+            'SELECT {column}, '
+            'sum(CASE WHEN start_time <= :now THEN 1 ELSE 0 END), '
+            'sum(CASE WHEN start_time > :now THEN 1 ELSE 0 END) '
+            'FROM "Show" GROUP BY {column}'.format(table=table, column=column)
+        ), now=now)
+    bind.execute(sa.text(
+        'INSERT INTO show_counts_state (id, rolled_over_at) VALUES (1, :now)'
+    ), now=now)
+
+
+def downgrade():
+    op.drop_table('show_counts_state')
+    op.drop_table('artist_show_counts')
+    op.drop_table('venue_show_counts')
@@ -0,0 +1,46 @@
+"""add suggested artists and venues
+
+Revision ID: 5f8a2c6e9b14
+Revises: 1c7f3e5a9d62
+Create Date: 2020-10-17 11:42:08.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f8a2c6e9b14'
+down_revision = '1c7f3e5a9d62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('suggested_artists',
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('venue_id', 'rank')
+    )
+    op.create_index('ix_suggested_artists_artist_id', 'suggested_artists', ['artist_id'], unique=False)
+    op.create_table('suggested_venues',
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('artist_id', 'rank')
+    )
+    op.create_index('ix_suggested_venues_venue_id', 'suggested_venues', ['venue_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_suggested_venues_venue_id', table_name='suggested_venues')
+    op.drop_table('suggested_venues')
+    op.drop_index('ix_suggested_artists_artist_id', table_name='suggested_artists')
+    op.drop_table('suggested_artists')
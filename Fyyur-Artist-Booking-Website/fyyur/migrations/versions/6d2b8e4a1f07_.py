@@ -0,0 +1,170 @@
+"""add the show archive, optionally partition shows by month
+
+Revision ID: 6d2b8e4a1f07
+Revises: 3e9a7d1c5b28
+Create Date: 2020-10-14 16:05:52.740318
+
+"""
+from datetime import datetime
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2b8e4a1f07'
+down_revision = '3e9a7d1c5b28'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, artist_id, venue_id, start_time, end_time, updated_at'
+
+# partitioned tables need the partition key in their primary key
+SHOW_TABLE = '''
+CREATE TABLE "{name}" (
+    id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+    artist_id integer NOT NULL,
+    venue_id integer NOT NULL,
+    start_time timestamp without time zone NOT NULL,
+    end_time timestamp without time zone NOT NULL,
+    updated_at timestamp without time zone NOT NULL
+){partitioning}
+'''
+
+SHOW_CONSTRAINTS = '''
+ALTER TABLE "Show"
+    ADD CONSTRAINT "Show_pkey" PRIMARY KEY ({primary_key}),
+    ADD CONSTRAINT "ck_Show_end_after_start" CHECK (end_time > start_time),
+    ADD CONSTRAINT "Show_venue_id_fkey" FOREIGN KEY (venue_id) REFERENCES "Venue" (id) ON DELETE CASCADE,
+    ADD CONSTRAINT "Show_artist_id_fkey" FOREIGN KEY (artist_id) REFERENCES "Artist" (id) ON DELETE CASCADE
+'''
+
+SHOW_INDEXES = (
+    ('ix_Show_venue_id_start_time', 'venue_id, start_time'),
+    ('ix_Show_artist_id_start_time', 'artist_id, start_time'),
+    ('ix_Show_start_time_id', 'start_time, id'),
+    ('ix_Show_updated_at', 'updated_at'),
+)
+
+
+def _month(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 \
+        else month.replace(month=month.month + 1)
+
+
+def _booking_constraints(table):
+    # the constraints of migration 2f8d6b4c0e17, on one table or partition
+    for column, kind in (('venue_id', 'venue'), ('artist_id', 'artist')):
+        op.execute(
+            'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" '
+            'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)'.format(
+                table=table, column=column,
+                name='ex_Show_{}_booking'.format(kind) if table == 'Show' else '{}_{}_booking'.format(table, kind)))
+
+
+def _partition(parent, table, month):
+    # the monthly partition of table, attached to parent
+    name = '{}_y{:04d}m{:02d}'.format(table, month.year, month.month)
+    op.execute(
+        'CREATE TABLE "{name}" PARTITION OF "{parent}" '
+        "FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')".format(
+            name=name, parent=parent, start=month, end=_next_month(month)))
+    return name
+
+
+def _partition_shows(bind):
+    # copy the shows into a partitioned table with one partition per month
+    # from the first show to SHOW_PARTITIONS_AHEAD months from now, then
+    # swap the tables; the id sequence is kept
+    first, last = bind.execute('SELECT min(start_time), max(start_time) FROM "Show"').first()
+    now = datetime.now()
+    month = _month(min(first or now, now))
+    last_month = _month(max(last or now, now))
+    for _ in range(current_app.config.get('SHOW_PARTITIONS_AHEAD', 12)):
+        last_month = _next_month(last_month)
+
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(SHOW_TABLE.format(name='Show_partitioned', partitioning=' PARTITION BY RANGE (start_time)'))
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show_partitioned" DEFAULT')
+    partitions = ['Show_default']
+    while month <= last_month:
+        partitions.append(_partition('Show_partitioned', 'Show', month))
+        month = _next_month(month)
+    op.execute('INSERT INTO "Show_partitioned" ({0}) SELECT {0} FROM "Show"'.format(COLUMNS))
+    op.drop_table('Show')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME TO "Show"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    op.execute(SHOW_CONSTRAINTS.format(primary_key='id, start_time'))
+    for name, columns in SHOW_INDEXES:
+        op.execute('CREATE INDEX "{}" ON "Show" ({})'.format(name, columns))
+    for name in partitions:
+        _booking_constraints(name)
+
+
+def _unpartition_shows(bind):
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(SHOW_TABLE.format(name='Show_unpartitioned', partitioning=''))
+    op.execute('INSERT INTO "Show_unpartitioned" ({0}) SELECT {0} FROM "Show"'.format(COLUMNS))
+    op.execute('DROP TABLE "Show" CASCADE')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME TO "Show"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute(SHOW_CONSTRAINTS.format(primary_key='id'))
+    for name, columns in SHOW_INDEXES:
+        op.execute('CREATE INDEX "{}" ON "Show" ({})'.format(name, columns))
+    _booking_constraints('Show')
+
+
+def _shows_partitioned(bind):
+    return bind.execute(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('\"Show\"')"
+    ).scalar() == 'p'
+
+
+def upgrade():
+    bind = op.get_bind()
+    partitioning = bind.dialect.name == 'postgresql' and current_app.config.get('SHOW_PARTITIONING')
+
+    op.create_table('Show_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'start_time'),
+        postgresql_partition_by='RANGE (start_time)' if partitioning else None
+    )
+    op.create_index('ix_Show_archive_start_time', 'Show_archive', ['start_time'], unique=False)
+
+    if partitioning:
+        # archive_shows() attaches Show's monthly partitions here, older
+        # rows outside them go to the default partition
+        op.execute('CREATE TABLE "Show_archive_default" PARTITION OF "Show_archive" DEFAULT')
+        _partition_shows(bind)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql' and _shows_partitioned(bind):
+        _unpartition_shows(bind)
+    # archived shows of the remaining venues and artists go back to Show and
+    # into the show counts again
+    op.execute(
+        'INSERT INTO "Show" ({0}) SELECT {0} FROM "Show_archive" '
+        'WHERE venue_id IN (SELECT id FROM "Venue") AND artist_id IN (SELECT id FROM "Artist")'.format(COLUMNS))
+    for table, column in (('venue_show_counts', 'venue_id'), ('artist_show_counts', 'artist_id')):
+        op.execute('DELETE FROM {}'.format(table))
+        op.execute(
+            'INSERT INTO {table} ({column}, past_shows, upcoming_shows) '
+            'SELECT {column}, '
+            'sum(CASE WHEN start_time <= state.rolled_over_at THEN 1 ELSE 0 END), '
+            'sum(CASE WHEN start_time > state.rolled_over_at THEN 1 ELSE 0 END) '
+            'FROM "Show", show_counts_state state WHERE state.id = 1 '
+            'GROUP BY {column}'.format(table=table, column=column))
+    op.drop_index('ix_Show_archive_start_time', table_name='Show_archive')
+    op.drop_table('Show_archive')
@@ -0,0 +1,139 @@
+"""normalize venue and artist genres into a Genre table
+
+Revision ID: 7c4e2a9b1d30
+Revises: e61b7d2f0a85
+Create Date: 2020-10-02 09:31:17.648203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a9b1d30'
+down_revision = 'e61b7d2f0a85'
+branch_labels = None
+depends_on = None
+
+# search documents indexed by search.py before and after this revision
+OLD_SEARCH_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+    "coalesce(state, '') || ' ' || coalesce(genres, ''))"
+)
+SEARCH_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+    "coalesce(state, ''))"
+)
+
+genre = sa.Table('Genre', sa.MetaData(),
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('name', sa.String)
+)
+
+
+def parse_genres(value):
+    # genres were stored either as a postgres array literal
+    # ('{Jazz,"Rock n Roll"}') or as a comma separated string
+    names = []
+    for name in (value or '').strip('{}[]').split(','):
+        name = name.strip().strip('"\'').strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genres_genre_id', 'venue_genres', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genres_genre_id', 'artist_genres', ['genre_id', 'artist_id'], unique=False)
+
+    # backfill the association tables from the old genres strings
+    genre_ids = {}
+    for table, link_table, owner in (('Venue', 'venue_genres', 'venue_id'),
+                                     ('Artist', 'artist_genres', 'artist_id')):
+        source = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link = sa.table(link_table, sa.column(owner, sa.Integer), sa.column('genre_id', sa.Integer))
+        rows = []
+        for id, genres in bind.execute(sa.select([source.c.id, source.c.genres])).fetchall():
+            for name in parse_genres(genres):
+                if name not in genre_ids:
+                    genre_ids[name] = bind.execute(genre.insert().values(name=name)).inserted_primary_key[0]
+                rows.append({owner: id, 'genre_id': genre_ids[name]})
+        if rows:
+            op.bulk_insert(link, rows)
+
+    if postgresql:
+        op.execute('DROP INDEX IF EXISTS "ix_Venue_search_trgm"')
+        op.execute('DROP INDEX IF EXISTS "ix_Artist_search_trgm"')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('genres')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('genres')
+    if postgresql:
+        op.execute('CREATE INDEX "ix_Venue_search_trgm" ON "Venue" USING gin ({} gin_trgm_ops)'.format(SEARCH_DOCUMENT))
+        op.execute('CREATE INDEX "ix_Artist_search_trgm" ON "Artist" USING gin ({} gin_trgm_ops)'.format(SEARCH_DOCUMENT))
+
+
+def downgrade():
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+
+    if postgresql:
+        op.execute('DROP INDEX IF EXISTS "ix_Venue_search_trgm"')
+        op.execute('DROP INDEX IF EXISTS "ix_Artist_search_trgm"')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(), nullable=True))
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+    # write the genres back as comma separated strings
+    for table, link_table, owner in (('Venue', 'venue_genres', 'venue_id'),
+                                     ('Artist', 'artist_genres', 'artist_id')):
+        target = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link = sa.table(link_table, sa.column(owner, sa.Integer), sa.column('genre_id', sa.Integer))
+        genres = {}
+        rows = bind.execute(
+            sa.select([link.c[owner], genre.c.name])
+            .select_from(link.join(genre, genre.c.id == link.c.genre_id))
+            .order_by(link.c[owner], genre.c.name)).fetchall()
+        for id, name in rows:
+            genres.setdefault(id, []).append(name)
+        for id, names in genres.items():
+            bind.execute(target.update().where(target.c.id == id).values(genres=','.join(names)))
+        bind.execute(target.update().where(target.c.genres == None).values(genres=''))
+
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.alter_column('genres', existing_type=sa.String(), nullable=False)
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.alter_column('genres', existing_type=sa.String(length=120), nullable=False)
+    if postgresql:
+        op.execute('CREATE INDEX "ix_Venue_search_trgm" ON "Venue" USING gin ({} gin_trgm_ops)'.format(OLD_SEARCH_DOCUMENT))
+        op.execute('CREATE INDEX "ix_Artist_search_trgm" ON "Artist" USING gin ({} gin_trgm_ops)'.format(OLD_SEARCH_DOCUMENT))
+
+    op.drop_index('ix_artist_genres_genre_id', table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index('ix_venue_genres_genre_id', table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
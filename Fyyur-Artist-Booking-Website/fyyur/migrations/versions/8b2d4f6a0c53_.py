@@ -0,0 +1,48 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: 8b2d4f6a0c53
+Revises: 5a7e3c9f1b64
+Create Date: 2020-10-10 14:22:36.507418
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4f6a0c53'
+down_revision = '5a7e3c9f1b64'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+# SQLite does not reflect check constraints, tables rebuilt by batch
+# operations get them back from here
+TABLE_ARGS = {
+    'Show': (sa.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),),
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if table == 'Show':
+            bind.execute(sa.text('UPDATE "Show" SET updated_at = :now'), now=now)
+        else:
+            bind.execute(sa.text(
+                'UPDATE "{}" SET updated_at = coalesce(creation_date, :now)'.format(table)
+            ), now=now)
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        with op.batch_alter_table(table, table_args=TABLE_ARGS.get(table, ())) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,39 @@
+"""trigram search indexes for venues and artists
+
+Revision ID: 9d3a5c1e7f42
+Revises: 4b1f0e7a9c21
+Create Date: 2020-09-24 11:47:33.581920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3a5c1e7f42'
+down_revision = '4b1f0e7a9c21'
+branch_labels = None
+depends_on = None
+
+# must match search._search_document()
+SEARCH_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+    "coalesce(state, '') || ' ' || coalesce(genres, ''))"
+)
+
+
+def upgrade():
+    # trigram indexes are PostgreSQL only, other databases use the
+    # in-memory index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX "ix_Venue_search_trgm" ON "Venue" USING gin ({} gin_trgm_ops)'.format(SEARCH_DOCUMENT))
+    op.execute('CREATE INDEX "ix_Artist_search_trgm" ON "Artist" USING gin ({} gin_trgm_ops)'.format(SEARCH_DOCUMENT))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS "ix_Artist_search_trgm"')
+    op.execute('DROP INDEX IF EXISTS "ix_Venue_search_trgm"')
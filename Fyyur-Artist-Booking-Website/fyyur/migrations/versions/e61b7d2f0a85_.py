@@ -0,0 +1,24 @@
+"""index shows by start time for keyset pagination
+
+Revision ID: e61b7d2f0a85
+Revises: 9d3a5c1e7f42
+Create Date: 2020-09-27 16:05:48.220193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b7d2f0a85'
+down_revision = '9d3a5c1e7f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# how long a show books its venue and artist when no duration is given, and
+# the longest booking accepted
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+# association tables between venues/artists and their genres, the second
+# index serves "all venues/artists of a genre" lookups
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id')
+)
+
+# past and upcoming show counts per venue and artist, maintained by
+# counters.py. A show counts as past when it started at or before
+# show_counts_state.rolled_over_at.
+venue_show_counts = db.Table('venue_show_counts',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('past_shows', db.Integer, nullable=False, default=0),
+    db.Column('upcoming_shows', db.Integer, nullable=False, default=0)
+)
+
+artist_show_counts = db.Table('artist_show_counts',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('past_shows', db.Integer, nullable=False, default=0),
+    db.Column('upcoming_shows', db.Integer, nullable=False, default=0)
+)
+
+show_counts_state = db.Table('show_counts_state',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('rolled_over_at', db.DateTime, nullable=False)
+)
+
+# the background check of every image link and its thumbnail file, see
+# thumbnails.py
+image_links = db.Table('image_links',
+    db.Column('url', db.String(500), primary_key=True),
+    db.Column('status', db.String(10), nullable=False),
+    db.Column('thumbnail', db.String(80)),
+    db.Column('error', db.String(250)),
+    db.Column('checked_at', db.DateTime, nullable=False),
+    db.Index('ix_image_links_checked_at', 'checked_at')
+)
+
+# the best matches of each venue seeking talent among the artists seeking
+# venues and the other way round, by rank, written by suggestions.py
+suggested_artists = db.Table('suggested_artists',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('rank', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False),
+    db.Column('score', db.Float, nullable=False),
+    db.Index('ix_suggested_artists_artist_id', 'artist_id')
+)
+
+suggested_venues = db.Table('suggested_venues',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('rank', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False),
+    db.Column('score', db.Float, nullable=False),
+    db.Index('ix_suggested_venues_venue_id', 'venue_id')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+      return f'<Genre : {self.id} {self.name}>'
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name', lazy='selectin')
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, default=True)
+    seeking_description = db.Column(db.String(250))
+    creation_date = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # the database deletes the shows of a deleted venue (ON DELETE CASCADE),
+    # they are not loaded for it
+    shows = db.relationship('Show', backref='venue', cascade="all,delete", passive_deletes=True, lazy=True)
+
+    def __repr__(self):
+      return f'<Venue : {self.id} {self.name}>'
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name', lazy='selectin')
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_venues = db.Column(db.Boolean, default=True)
+    seeking_description = db.Column(db.String(250))
+    creation_date = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    shows = db.relationship('Show', backref='artist', cascade="all,delete", passive_deletes=True, lazy=True)
+
+    def __repr__(self):
+      return f'<Artist : {self.id} {self.name}>'
+
+def show_end_time(start_time, minutes=None):
+  '''
+  Returns the end of a show starting at start_time and lasting the given
+  number of minutes, or the default duration.
+  '''
+  if minutes is None:
+    return start_time + DEFAULT_SHOW_DURATION
+  return start_time + timedelta(minutes=minutes)
+
+def default_end_time(context):
+  return show_end_time(context.get_current_parameters()['start_time'])
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer , db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer , db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime , nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+
+    @property
+    def duration(self):
+      return self.end_time - self.start_time
+
+    def __repr__(self):
+      return f'<Show : {self.id}>'
+
+# old shows moved out of Show by partitions.archive_shows, without their
+# foreign keys so venues and artists can be deleted independently. On a
+# partitioned database it is partitioned by month like Show, and archiving
+# moves whole partitions.
+show_archive = db.Table('Show_archive',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('artist_id', db.Integer, nullable=False),
+    db.Column('venue_id', db.Integer, nullable=False),
+    db.Column('start_time', db.DateTime, primary_key=True),
+    db.Column('end_time', db.DateTime, nullable=False),
+    db.Column('updated_at', db.DateTime, nullable=False),
+    db.Index('ix_Show_archive_start_time', 'start_time')
+)
+
+def get_genres(names):
+  '''
+  Returns the Genre rows for the given names, creating the missing ones.
+  '''
+  names = sorted({name.strip() for name in names if name and name.strip()})
+  if not names:
+    return []
+  genres = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))}
+  for name in names:
+    if name not in genres:
+      genres[name] = Genre(name=name)
+      db.session.add(genres[name])
+  return [genres[name] for name in names]
+
+def _touch(mapper, connection, target):
+  # before_update also runs for rows whose only change is a relationship,
+  # such as their genres, so updated_at follows every edit
+  target.updated_at = datetime.utcnow()
+
+event.listen(Venue, 'before_update', _touch)
+event.listen(Artist, 'before_update', _touch)
@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Show partitions.
+#
+# On PostgreSQL with SHOW_PARTITIONING, migration 6d2b8e4a1f07 range
+# partitions the Show table by month of start_time: one partition per month,
+# named Show_yYYYYmMM, and Show_default for shows outside them. Queries that
+# filter on start_time (listings, the calendar, counters and booking checks
+# all do) only scan the partitions of the months they cover, so upcoming
+# shows are read from the few newest partitions however many past shows
+# there are. create_show_partitions() keeps partitions ready ahead of time.
+#
+# Exclusion constraints cannot span partitions: the double booking
+# constraints of migration 2f8d6b4c0e17 are created on every partition
+# instead, and bookings.py still checks shows across month ends.
+#
+# archive_shows() moves old shows to Show_archive. Partitioned, whole months
+# move by detaching their partition from Show and attaching it to the
+# archive, which copies no rows; otherwise, and for the rest, rows are
+# copied and deleted in a range scan of the start_time index.
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import datetime
+from sqlalchemy import select, text
+from models import db, Show, show_archive
+from cache import page_cache
+from counters import shows_removed
+
+_MONTH = re.compile(r'_y(\d{4})m(\d{2})$')
+
+ARCHIVE_COLUMNS = ('id', 'artist_id', 'venue_id', 'start_time', 'end_time', 'updated_at')
+
+
+def month_start(value):
+  return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, months):
+  month_index = month.year * 12 + month.month - 1 + months
+  return month.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_name(table, month):
+  return '{}_y{:04d}m{:02d}'.format(table, month.year, month.month)
+
+
+def is_partitioned(connection):
+  '''
+  Whether the Show table is partitioned (PostgreSQL with SHOW_PARTITIONING).
+  '''
+  if connection.dialect.name != 'postgresql':
+    return False
+  return connection.execute(text(
+    "SELECT relkind FROM pg_class WHERE oid = to_regclass('\"Show\"')"
+  )).scalar() == 'p'
+
+
+def _partitions(connection, table):
+  # {month: partition name} of the monthly partitions attached to table
+  rows = connection.execute(text(
+    'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+    'WHERE i.inhparent = to_regclass(:table)'
+  ), table='"{}"'.format(table))
+  partitions = {}
+  for (name,) in rows:
+    match = _MONTH.search(name)
+    if match:
+      partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+  return partitions
+
+
+def _bounds(month):
+  return "FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(month, add_months(month, 1))
+
+
+def _add_booking_constraints(connection, name):
+  for column, kind in (('venue_id', 'venue'), ('artist_id', 'artist')):
+    connection.execute(text(
+      'ALTER TABLE "{name}" ADD CONSTRAINT "{name}_{kind}_booking" '
+      'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)'
+      .format(name=name, kind=kind, column=column)))
+
+
+def _create_partition(connection, month):
+  # the shows of that month booked before the partition existed are in the
+  # default partition, they are moved first so the partition can attach
+  name = partition_name('Show', month)
+  connection.execute(text('CREATE TABLE "{}" (LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name)))
+  connection.execute(text(
+    'WITH moved AS (DELETE FROM "Show_default" WHERE start_time >= :start AND start_time < :end '
+    'RETURNING {columns}) INSERT INTO "{name}" ({columns}) SELECT {columns} FROM moved'
+    .format(name=name, columns=', '.join(ARCHIVE_COLUMNS))
+  ), start=month, end=add_months(month, 1))
+  connection.execute(text('ALTER TABLE "Show" ATTACH PARTITION "{}" {}'.format(name, _bounds(month))))
+  _add_booking_constraints(connection, name)
+  return name
+
+
+def create_show_partitions(months_ahead, now=None):
+  '''
+  Creates the missing monthly partitions of Show from the current month to
+  months_ahead months later, and commits. Returns the names of the new
+  partitions; nothing to do unless Show is partitioned.
+  '''
+  connection = db.session.connection()
+  if not is_partitioned(connection):
+    return []
+  first = month_start(now or datetime.now())
+  existing = _partitions(connection, 'Show')
+  created = []
+  for i in range(months_ahead + 1):
+    month = add_months(first, i)
+    if month not in existing:
+      created.append(_create_partition(connection, month))
+  db.session.commit()
+  return created
+
+
+def _archive_partition(connection, month, name):
+  # the partition keeps copies of Show's foreign keys once detached, the
+  # archive has none
+  connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "{}"'.format(name)))
+  foreign_keys = connection.execute(text(
+    "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:name) AND contype = 'f'"
+  ), name='"{}"'.format(name))
+  for (constraint,) in list(foreign_keys):
+    connection.execute(text('ALTER TABLE "{}" DROP CONSTRAINT "{}"'.format(name, constraint)))
+  archived = partition_name('Show_archive', month)
+  connection.execute(text('ALTER TABLE "{}" RENAME TO "{}"'.format(name, archived)))
+  connection.execute(text('ALTER TABLE "Show_archive" ATTACH PARTITION "{}" {}'.format(archived, _bounds(month))))
+
+
+def archive_shows(before, now=None):
+  '''
+  Moves the shows that started before the given time to Show_archive,
+  takes them off the show counts, and commits. Upcoming shows cannot be
+  archived. Returns the number of shows archived.
+  '''
+  if before > (now or datetime.now()):
+    raise ValueError('Only past shows can be archived.')
+  connection = db.session.connection()
+  old = Show.start_time < before
+  archived = connection.execute(select([db.func.count(Show.id)]).where(old)).scalar()
+  if not archived:
+    db.session.commit()
+    return 0
+  shows_removed(connection, old)
+
+  if is_partitioned(connection):
+    for month, name in sorted(_partitions(connection, 'Show').items()):
+      if add_months(month, 1) <= before:
+        _archive_partition(connection, month, name)
+
+  # what is left: everything unpartitioned, or the shows of the default
+  # partition and of the month before is in
+  columns = [Show.__table__.c[name] for name in ARCHIVE_COLUMNS]
+  connection.execute(show_archive.insert().from_select(list(ARCHIVE_COLUMNS), select(columns).where(old)))
+  connection.execute(Show.__table__.delete().where(old))
+  db.session.commit()
+
+  # bulk statements fire no mapper events
+  page_cache.invalidate()
+  return archived
@@ -0,0 +1,275 @@
+#----------------------------------------------------------------------------#
+# Queries.
+#
+# Data-access helpers used by the controllers in app.py. Every helper issues
+# a fixed number of statements, no matter how many shows a venue or artist
+# has accumulated; show counts come from the counters in counters.py.
+#----------------------------------------------------------------------------#
+
+import base64
+import binascii
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import contains_eager
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres, suggested_artists, \
+  suggested_venues
+from counters import get_show_counts
+
+SHOWS_PER_PAGE = 30
+
+# days shown by the calendar when no end date is given
+CALENDAR_DAYS = 7
+
+
+def get_venue_with_shows(venue_id, now=None, limit=SHOWS_PER_PAGE):
+  '''
+  Returns (venue, past_shows, upcoming_shows) for the venue page, or None
+  if the venue does not exist: the next upcoming shows and the most recent
+  past shows, at most limit of each, with their artists eagerly loaded.
+  The full lists are paginated on /shows.
+  '''
+  now = now or datetime.now()
+
+  venue = Venue.query.get(venue_id)
+  if venue is None:
+    return None
+
+  query = Show.query \
+    .join(Show.artist) \
+    .options(contains_eager(Show.artist)) \
+    .filter(Show.venue_id == venue_id)
+  upcoming_shows = query.filter(Show.start_time > now).order_by(Show.start_time).limit(limit).all()
+  past_shows = query.filter(Show.start_time <= now).order_by(Show.start_time.desc()).limit(limit).all()
+  return venue, past_shows, upcoming_shows
+
+
+def get_artist_with_shows(artist_id, now=None, limit=SHOWS_PER_PAGE):
+  '''
+  Returns (artist, past_shows, upcoming_shows) for the artist page, or None
+  if the artist does not exist: the next upcoming shows and the most recent
+  past shows, at most limit of each, with their venues eagerly loaded.
+  The full lists are paginated on /shows.
+  '''
+  now = now or datetime.now()
+
+  artist = Artist.query.get(artist_id)
+  if artist is None:
+    return None
+
+  query = Show.query \
+    .join(Show.venue) \
+    .options(contains_eager(Show.venue)) \
+    .filter(Show.artist_id == artist_id)
+  upcoming_shows = query.filter(Show.start_time > now).order_by(Show.start_time).limit(limit).all()
+  past_shows = query.filter(Show.start_time <= now).order_by(Show.start_time.desc()).limit(limit).all()
+  return artist, past_shows, upcoming_shows
+
+
+def get_venue_areas(now=None, genre=None):
+  '''
+  Returns the venues grouped by city and state, each with its number of
+  upcoming shows read from the show counters. The rows arrive sorted by
+  area and are grouped in one pass. If a genre name is given only venues of
+  that genre are listed.
+  '''
+  query = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name)
+  if genre:
+    query = query.join(venue_genres, venue_genres.c.venue_id == Venue.id) \
+      .join(Genre, Genre.id == venue_genres.c.genre_id) \
+      .filter(Genre.name == genre)
+
+  rows = query.order_by(Venue.state, Venue.city, Venue.name, Venue.id).all()
+  counts = get_show_counts('venue', now=now)
+
+  areas = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": counts.get(venue.id, (0, 0))[1]
+      } for venue in venues]
+    })
+  return areas
+
+
+def count_upcoming_shows(kind, ids, now=None):
+  '''
+  Returns a dict mapping each of the given venue or artist ids (kind
+  'venue' or 'artist') to its number of upcoming shows.
+  '''
+  counts = get_show_counts(kind, ids, now=now)
+  return {id: upcoming for id, (past, upcoming) in counts.items()}
+
+
+def encode_cursor(start_time, id):
+  # opaque, url safe token for the (start_time, id) position of a show
+  token = '{}|{}'.format(start_time.isoformat(), id)
+  return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+  '''
+  Returns the (start_time, id) encoded in a cursor, raises ValueError if the
+  cursor is malformed.
+  '''
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    start_time, id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(start_time), int(id)
+  except (TypeError, UnicodeDecodeError, binascii.Error) as error:
+    raise ValueError('invalid cursor') from error
+
+
+def get_shows_page(cursor=None, when=None, venue_id=None, artist_id=None,
+                   limit=SHOWS_PER_PAGE, now=None):
+  '''
+  Returns (shows, next_cursor) for one page of the show listing.
+
+  Pages are keyset paginated on (start_time, id): the cursor holds the
+  position of the last show of the previous page, so every page is a single
+  indexed range scan of at most limit + 1 rows. Upcoming shows and the full
+  listing run in ascending start time; past shows run most recent first.
+  next_cursor is None on the last page.
+  '''
+  now = now or datetime.now()
+  descending = when == 'past'
+
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+
+  if when == 'upcoming':
+    query = query.filter(Show.start_time > now)
+  elif when == 'past':
+    query = query.filter(Show.start_time <= now)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+
+  if cursor is not None:
+    start_time, id = decode_cursor(cursor)
+    if descending:
+      query = query.filter(or_(Show.start_time < start_time,
+                               and_(Show.start_time == start_time, Show.id < id)))
+    else:
+      query = query.filter(or_(Show.start_time > start_time,
+                               and_(Show.start_time == start_time, Show.id > id)))
+
+  if descending:
+    query = query.order_by(Show.start_time.desc(), Show.id.desc())
+  else:
+    query = query.order_by(Show.start_time, Show.id)
+
+  shows = query.limit(limit + 1).all()
+  next_cursor = None
+  if len(shows) > limit:
+    shows = shows[:limit]
+    next_cursor = encode_cursor(shows[-1].start_time, shows[-1].id)
+  return shows, next_cursor
+
+
+def calendar_range(first=None, last=None, max_days=31):
+  '''
+  Returns the (start, end) datetimes covering the days first to last, both
+  'YYYY-MM-DD' and included; from today and for CALENDAR_DAYS days by
+  default. Raises ValueError for a malformed date, for last before first
+  and for more than max_days days.
+  '''
+  if first:
+    start = datetime.strptime(first, '%Y-%m-%d')
+  else:
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+  if last:
+    end = datetime.strptime(last, '%Y-%m-%d') + timedelta(days=1)
+  else:
+    end = start + timedelta(days=min(CALENDAR_DAYS, max_days))
+  if end <= start:
+    raise ValueError('The calendar ends before it starts.')
+  if end - start > timedelta(days=max_days):
+    raise ValueError('The calendar covers at most {} days.'.format(max_days))
+  return start, end
+
+
+def get_calendar(start, end, venue_id=None, artist_id=None):
+  '''
+  Returns [(date, shows)] for the days between start and end that have
+  shows, each day's shows in start time order. One range scan of the
+  start_time index; when Show is partitioned by month, only the partitions
+  of the months in the range are read.
+  '''
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.end_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Show.start_time >= start, Show.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+
+  shows = query.order_by(Show.start_time, Show.id).all()
+  return [(day, list(day_shows)) for day, day_shows in groupby(shows, key=lambda show: show.start_time.date())]
+
+
+def get_artists(genre=None):
+  '''
+  Returns (id, name) rows for the artist listing, optionally only the
+  artists of the given genre name.
+  '''
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = query.join(artist_genres, artist_genres.c.artist_id == Artist.id) \
+      .join(Genre, Genre.id == artist_genres.c.genre_id) \
+      .filter(Genre.name == genre)
+  return query.order_by(Artist.name, Artist.id).all()
+
+
+def get_genre_names():
+  return [name for name, in db.session.query(Genre.name).order_by(Genre.name)]
+
+
+def get_suggested_artists(venue_id):
+  '''
+  Returns (id, name, image_link, city, state) rows of the artists suggested
+  for a venue by the last "flask compute-suggestions", best first, leaving
+  out those no longer seeking venues.
+  '''
+  return db.session.query(Artist.id, Artist.name, Artist.image_link, Artist.city, Artist.state) \
+    .join(suggested_artists, suggested_artists.c.artist_id == Artist.id) \
+    .filter(suggested_artists.c.venue_id == venue_id, Artist.seeking_venues.is_(True)) \
+    .order_by(suggested_artists.c.rank) \
+    .all()
+
+
+def get_suggested_venues(artist_id):
+  '''
+  Returns (id, name, image_link, city, state) rows of the venues suggested
+  for an artist by the last "flask compute-suggestions", best first,
+  leaving out those no longer seeking talent.
+  '''
+  return db.session.query(Venue.id, Venue.name, Venue.image_link, Venue.city, Venue.state) \
+    .join(suggested_venues, suggested_venues.c.venue_id == Venue.id) \
+    .filter(suggested_venues.c.artist_id == artist_id, Venue.seeking_talent.is_(True)) \
+    .order_by(suggested_venues.c.rank) \
+    .all()
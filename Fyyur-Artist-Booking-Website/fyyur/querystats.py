@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Query statistics.
+#
+# Counts the SQL statements each request runs and the time spent in them,
+# from the before/after_cursor_execute events of every engine. Statements
+# are grouped by shape (their parameterized text, with expanded IN lists
+# collapsed) so a query issued once per row, the N+1 pattern, shows up as
+# one shape repeated many times. The totals are sent in a Server-Timing
+# header, repeated shapes above QUERY_REPEAT_THRESHOLD are logged as
+# warnings, and in debug mode a small toolbar listing the statements is
+# added to HTML pages.
+#----------------------------------------------------------------------------#
+
+import re
+import time
+from collections import Counter
+from flask import g, request, has_request_context
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# "IN (?, ?, ?)" and "IN (%(id_1)s, %(id_2)s)" have the same shape
+_IN_LIST = re.compile(r'IN \((?:[^()]*?,\s*)+[^()]*?\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+  return _IN_LIST.sub('IN (...)', _SPACES.sub(' ', statement).strip())
+
+
+class QueryStats(object):
+
+  def __init__(self):
+    self.count = 0
+    self.seconds = 0.0
+    self.shapes = Counter()
+    self.shape_seconds = Counter()
+    self.started = time.perf_counter()
+
+  def add(self, statement, seconds):
+    shape = statement_shape(statement)
+    self.count += 1
+    self.seconds += seconds
+    self.shapes[shape] += 1
+    self.shape_seconds[shape] += seconds
+
+  def repeated(self, threshold):
+    '''
+    Returns (shape, count) pairs of the statements run more than threshold
+    times, most frequent first.
+    '''
+    return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+def _current_stats():
+  if has_request_context():
+    return g.get('query_stats')
+  return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  if _current_stats() is not None:
+    conn.info.setdefault('query_stats_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  stats = _current_stats()
+  started = conn.info.get('query_stats_started')
+  if stats is not None and started:
+    stats.add(statement, time.perf_counter() - started.pop())
+
+
+def _toolbar(stats):
+  rows = ''.join(
+    '<tr><td>{}</td><td>{:.1f}</td><td><code>{}</code></td></tr>'.format(
+      count, stats.shape_seconds[shape] * 1000, escape(shape))
+    for shape, count in stats.shapes.most_common())
+  return (
+    '<div id="query-stats" style="position:fixed;bottom:0;right:0;max-width:60%;max-height:40%;'
+    'overflow:auto;z-index:9999;background:#fff;border:1px solid #ccc;font-size:11px;padding:4px">'
+    '<strong>{} queries, {:.1f} ms</strong>'
+    '<table class="table table-condensed"><tr><th>#</th><th>ms</th><th>statement</th></tr>{}</table>'
+    '</div>'
+  ).format(stats.count, stats.seconds * 1000, rows)
+
+
+def init_query_stats(app):
+  '''
+  Collects query statistics for every request of the app when
+  QUERY_STATS_ENABLED is set. QUERY_REPEAT_THRESHOLD is the number of runs
+  of one statement shape above which a warning is logged, QUERY_TOOLBAR
+  adds the toolbar to HTML pages.
+  '''
+  if not app.config.get('QUERY_STATS_ENABLED', True):
+    return
+
+  @app.before_request
+  def start_query_stats():
+    g.query_stats = QueryStats()
+
+  @app.after_request
+  def report_query_stats(response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+      return response
+
+    total = time.perf_counter() - stats.started
+    response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(
+      stats.seconds * 1000, stats.count))
+    response.headers.add('Server-Timing', 'app;dur={:.1f}'.format(total * 1000))
+
+    threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 10)
+    for shape, count in stats.repeated(threshold):
+      app.logger.warning('%s %s ran the same statement %d times, possible N+1 query: %s',
+                         request.method, request.path, count, shape)
+
+    if app.config.get('QUERY_TOOLBAR') and response.mimetype == 'text/html' \
+        and not response.direct_passthrough:
+      page = response.get_data(as_text=True)
+      if '</body>' in page:
+        response.set_data(page.replace('</body>', _toolbar(stats) + '</body>', 1))
+    return response
@@ -0,0 +1,108 @@
+#----------------------------------------------------------------------------#
+# Database routing.
+#
+# Sends the queries of read-only views to a replica and everything else to
+# the primary. Views opt in with the @replica_reads decorator; flushes and
+# every query outside those views use the primary. A request that commits
+# pins its client to the primary for REPLICA_STICKY_SECONDS, so the pages a
+# user is redirected to after a form POST show their own changes even when
+# the replica lags behind. The page cache (cache.py) is skipped for pinned
+# clients and does not store pages read from the replica while it may lag.
+#
+# The replica is the 'replica' entry of SQLALCHEMY_BINDS; without it every
+# query goes to SQLALCHEMY_DATABASE_URI. Any two URIs work, for example two
+# SQLite files standing in for a primary and a replica.
+#----------------------------------------------------------------------------#
+
+import time
+from functools import wraps
+from flask import g, session, current_app, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+REPLICA_BIND = 'replica'
+STICKY_KEY = '_primary_until'
+
+# engine options that only apply to pooled connections
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+
+def _reading_from_replica():
+  return has_request_context() and g.get('read_replica', False)
+
+
+class RoutingSession(SignallingSession):
+
+  def __init__(self, db, **options):
+    self.db = db
+    super(RoutingSession, self).__init__(db, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    if _reading_from_replica() and not self._flushing \
+        and REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+      return self.db.get_engine(self.app, bind=REPLICA_BIND)
+    return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _wrote(session):
+  if has_request_context():
+    g.wrote_to_primary = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  '''
+  Flask-SQLAlchemy with the routing session. SQLite engines (development
+  and tests) ignore the connection pool settings, which they do not
+  support.
+  '''
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def create_engine(self, sa_url, engine_opts):
+    if sa_url.drivername.startswith('sqlite'):
+      engine_opts = {name: value for name, value in engine_opts.items() if name not in POOL_OPTIONS}
+    return super(RoutingSQLAlchemy, self).create_engine(sa_url, engine_opts)
+
+
+def pinned_to_primary():
+  '''
+  Whether the client of the request wrote to the primary in the last
+  REPLICA_STICKY_SECONDS.
+  '''
+  return session.get(STICKY_KEY, 0) >= time.time()
+
+
+def reading_from_replica():
+  '''
+  Whether the queries of the current view run on a replica.
+  '''
+  return _reading_from_replica() and REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def replica_reads(view):
+  '''
+  Runs the view's queries on the replica, unless the client wrote to the
+  primary in the last REPLICA_STICKY_SECONDS.
+  '''
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    g.read_replica = not pinned_to_primary()
+    try:
+      return view(*args, **kwargs)
+    finally:
+      g.read_replica = False
+  return wrapper
+
+
+def init_routing(app):
+  '''
+  Makes clients that committed a change read from the primary for the
+  next REPLICA_STICKY_SECONDS.
+  '''
+  @app.after_request
+  def stick_to_primary(response):
+    if g.pop('wrote_to_primary', False):
+      session[STICKY_KEY] = time.time() + app.config.get('REPLICA_STICKY_SECONDS', 10)
+    return response
@@ -0,0 +1,305 @@
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Venue and artist search. On PostgreSQL matching runs in the database and
+# is served by the pg_trgm GIN indexes created in migration 9d3a5c1e7f42
+# (rebuilt without the genres column in 7c4e2a9b1d30) and by the genre
+# association indexes.
+# Other databases (SQLite in development) fall back to an in-memory
+# trigram index that is built once per process and kept up to date by
+# SQLAlchemy mapper events. The rows a session writes are collected on the
+# session and indexed once it commits; a rollback discards them.
+#----------------------------------------------------------------------------#
+
+import threading
+from collections import defaultdict
+from sqlalchemy import event, func, case, literal, literal_column
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import instance_state
+from models import db, Venue, Artist, Genre, venue_genres, artist_genres
+from routing import RoutingSession
+from queries import count_upcoming_shows
+
+SEARCH_RESULTS_LIMIT = 50
+
+# fields that are searched, with the weight a match in each field adds to
+# the rank of a result
+SEARCH_FIELDS = (
+  ('name', 4),
+  ('genres', 2),
+  ('city', 1),
+  ('state', 1),
+)
+
+
+def _normalize(value):
+  return ' '.join(str(value or '').lower().split())
+
+
+def _trigrams(text):
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NGramIndex(object):
+  '''
+  Trigram index over the searchable fields of one model.
+
+  Every indexed row is stored as a dict of normalized fields. A term matches
+  a row when it is a substring of any field; candidate rows are found by
+  intersecting the posting sets of the term's trigrams, so only rows that
+  contain every trigram of the term are checked.
+  '''
+
+  def __init__(self, model, genre_owner):
+    self.model = model
+    # the venue_id/artist_id column of the model's genre association table
+    self.genre_owner = genre_owner
+    self.documents = {}
+    self.postings = defaultdict(set)
+    self.loaded = False
+    self.lock = threading.RLock()
+
+  def load(self):
+    model = self.model
+    genres = defaultdict(list)
+    for id, name in db.session.query(self.genre_owner, Genre.name) \
+        .join(Genre, Genre.id == self.genre_owner.table.c.genre_id):
+      genres[id].append(name)
+
+    with self.lock:
+      self.documents.clear()
+      self.postings.clear()
+      for id, name, city, state in db.session.query(model.id, model.name, model.city, model.state):
+        self._add(id, {'name': name, 'city': city, 'state': state, 'genres': ' '.join(genres[id])})
+      self.loaded = True
+
+  def reset(self):
+    with self.lock:
+      self.documents.clear()
+      self.postings.clear()
+      self.loaded = False
+
+  def _add(self, id, fields):
+    document = {name: _normalize(fields.get(name)) for name, _ in SEARCH_FIELDS}
+    self.documents[id] = document
+    for value in document.values():
+      for trigram in _trigrams(value):
+        self.postings[trigram].add(id)
+
+  def _remove(self, id):
+    document = self.documents.pop(id, None)
+    if document is None:
+      return None
+    for value in document.values():
+      for trigram in _trigrams(value):
+        ids = self.postings.get(trigram)
+        if ids is not None:
+          ids.discard(id)
+          if not ids:
+            del self.postings[trigram]
+    return document
+
+  @staticmethod
+  def fields(target):
+    '''
+    Returns the searchable fields of a row being flushed. Genres that are not
+    loaded are None, and update() keeps the indexed ones rather than
+    loading them during the flush.
+    '''
+    fields = {'name': target.name, 'city': target.city, 'state': target.state, 'genres': None}
+    if 'genres' not in instance_state(target).unloaded:
+      fields['genres'] = ' '.join(genre.name for genre in target.genres)
+    return fields
+
+  def update(self, id, fields):
+    with self.lock:
+      if not self.loaded:
+        return
+      previous = self._remove(id) or {}
+      if fields['genres'] is None:
+        fields = dict(fields, genres=previous.get('genres'))
+      self._add(id, fields)
+
+  def remove(self, id):
+    with self.lock:
+      if self.loaded:
+        self._remove(id)
+
+  def discard(self, ids):
+    with self.lock:
+      if self.loaded:
+        for id in ids:
+          self._remove(id)
+
+  def search(self, term):
+    '''
+    Returns the ids of matching rows, best match first.
+    '''
+    term = _normalize(term)
+    with self.lock:
+      if not self.loaded:
+        self.load()
+
+      if len(term) < 3:
+        # too short to have a trigram of its own, check every row
+        candidates = self.documents.keys()
+      else:
+        postings = sorted((self.postings.get(t, set()) for t in _trigrams(term)), key=len)
+        candidates = set.intersection(*postings)
+
+      ranked = []
+      for id in candidates:
+        document = self.documents[id]
+        rank = 0
+        for name, weight in SEARCH_FIELDS:
+          if term in document[name]:
+            rank += weight
+        if rank:
+          if document['name'].startswith(term):
+            rank += 1
+          ranked.append((-rank, document['name'], id))
+
+    ranked.sort()
+    return [id for _, _, id in ranked]
+
+
+_indexes = {
+  Venue: NGramIndex(Venue, venue_genres.c.venue_id),
+  Artist: NGramIndex(Artist, artist_genres.c.artist_id),
+}
+
+
+def _changes(target):
+  # the rows written in the session, as {(model, id): fields or None if
+  # deleted}, the last write of a row winning
+  return object_session(target).info.setdefault('search_changes', {})
+
+
+def _index_updated(mapper, connection, target):
+  _changes(target)[(mapper.class_, target.id)] = NGramIndex.fields(target)
+
+
+def _index_deleted(mapper, connection, target):
+  _changes(target)[(mapper.class_, target.id)] = None
+
+
+def _committed(session):
+  changes = session.info.pop('search_changes', None)
+  for (model, id), fields in (changes or {}).items():
+    if fields is None:
+      _indexes[model].remove(id)
+    else:
+      _indexes[model].update(id, fields)
+
+
+def _rolled_back(session, previous_transaction):
+  session.info.pop('search_changes', None)
+
+
+for _model in _indexes:
+  event.listen(_model, 'after_insert', _index_updated)
+  event.listen(_model, 'after_update', _index_updated)
+  event.listen(_model, 'after_delete', _index_deleted)
+event.listen(RoutingSession, 'after_commit', _committed)
+event.listen(RoutingSession, 'after_soft_rollback', _rolled_back)
+
+
+def reset_search_indexes():
+  '''
+  Drops the in-memory indexes so they are rebuilt on the next search.
+  Needed after bulk statements, which do not fire mapper events.
+  '''
+  for index in _indexes.values():
+    index.reset()
+
+
+def forget(model, ids):
+  '''
+  Drops rows removed by a bulk delete from the in-memory index of the model.
+  '''
+  _indexes[model].discard(ids)
+
+
+def _search_document(model):
+  # must match the indexed expression in migration 7c4e2a9b1d30
+  # literal columns keep the constants inline so the planner can match the
+  # expression against the index
+  document = func.coalesce(model.name, literal_column("''"))
+  for name in ('city', 'state'):
+    document = document.op('||')(literal_column("' '")) \
+      .op('||')(func.coalesce(getattr(model, name), literal_column("''")))
+  return document
+
+
+def _escape_like(term):
+  return term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def _search_postgresql(model, genre_owner, term):
+  pattern = '%' + _escape_like(term) + '%'
+  document = _search_document(model)
+  # a union lets each branch use its own index: the trigram index on the
+  # document, and the genre name -> association index for genre matches
+  matches = db.session.query(model).filter(document.ilike(pattern, escape='!')).union(
+    db.session.query(model)
+      .join(genre_owner.table, genre_owner == model.id)
+      .join(Genre, Genre.id == genre_owner.table.c.genre_id)
+      .filter(Genre.name.ilike(pattern, escape='!'))
+  )
+
+  count = matches.order_by(None).count()
+  results = matches.order_by(
+      case([(model.name.ilike(_escape_like(term) + '%', escape='!'), 1)], else_=0).desc(),
+      func.word_similarity(literal(term), document).desc(),
+      model.name
+    ) \
+    .limit(SEARCH_RESULTS_LIMIT) \
+    .all()
+  return count, results
+
+
+def _search_in_memory(model, term):
+  ids = _indexes[model].search(term)
+  page = ids[:SEARCH_RESULTS_LIMIT]
+  rows = {row.id: row for row in model.query.filter(model.id.in_(page))} if page else {}
+  # rows deleted by another process since the index was built are skipped
+  return len(ids), [rows[id] for id in page if id in rows]
+
+
+def _search(model, kind, term):
+  term = ' '.join(term.split())
+
+  if db.engine.dialect.name == 'postgresql':
+    count, results = _search_postgresql(model, _indexes[model].genre_owner, term)
+  else:
+    count, results = _search_in_memory(model, term)
+
+  upcoming = count_upcoming_shows(kind, [result.id for result in results])
+  return {
+    "count": count,
+    "data": [{
+      "id": result.id,
+      "name": result.name,
+      "city": result.city,
+      "state": result.state,
+      "num_upcoming_shows": upcoming.get(result.id, 0)
+    } for result in results]
+  }
+
+
+def search_venues(term):
+  '''
+  Searches venue names, cities, states and genres for the given term.
+  Returns a dict with the total number of matches and the best ranked
+  venues.
+  '''
+  return _search(Venue, 'venue', term)
+
+
+def search_artists(term):
+  '''
+  Searches artist names, cities, states and genres for the given term.
+  Returns a dict with the total number of matches and the best ranked
+  artists.
+  '''
+  return _search(Artist, 'artist', term)
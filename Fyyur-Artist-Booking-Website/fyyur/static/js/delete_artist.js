@@ -2,7 +2,7 @@ const button_delete = document.querySelectorAll('[id=delete-artist]')[0];
 button_delete.onclick = function(e)
 	{
 		const artistItem = e.target.dataset['id'];
-		fetch('/artists/' + artistItem + '/Delete', {
+		fetch('/artists/' + artistItem, {
 				method:'DELETE'
 				,
 				cache: "reload",
@@ -2,7 +2,7 @@ const button_delete = document.querySelectorAll('[id=delete-venue]')[0];
 button_delete.onclick = function(e)
 	{
 		const venueItem = e.target.dataset['id'];
-		fetch('/venues/' + venueItem + '/Delete', {
+		fetch('/venues/' + venueItem, {
 				method:'DELETE'
 				,
 				cache: "reload",
@@ -0,0 +1,210 @@
+#----------------------------------------------------------------------------#
+# Suggestions.
+#
+# Matches the venues seeking talent with the artists seeking venues. A
+# venue and an artist score, between 0 and 1,
+#
+#   SUGGESTION_WEIGHTS['genres']    cosine of their genre vectors
+#   SUGGESTION_WEIGHTS['location']  1 in the same city, 1/2 in the same state
+#   SUGGESTION_WEIGHTS['history']   their show history
+#
+# where the show history is half the shows they played together (archived
+# ones included) and half the past shows of each, all log-scaled to 0..1.
+#
+# compute_suggestions(), run periodically by the "compute-suggestions"
+# command, scores all pairs with NumPy, a chunk of venues (or artists)
+# against every artist (or venue) at a time, as many as the matrices of
+# SCORE_BYTES per pair fit in SUGGESTION_MEMORY: the genre vectors are built
+# from the genre links in one scatter and the cosines of a chunk are one
+# matrix product. The best SUGGESTIONS_PER_PAGE matches of each venue and
+# artist are stored in suggested_artists and suggested_venues, which the
+# venue and artist pages read with one indexed query.
+#----------------------------------------------------------------------------#
+
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, func, union_all
+from models import db, Venue, Artist, Show, Genre, show_archive, venue_genres, artist_genres, \
+  venue_show_counts, artist_show_counts, suggested_artists, suggested_venues
+from cache import page_cache
+
+# bytes per pair of a chunk: the float32 scores and the temporaries of the
+# same size, the largest being the int64 positions of argpartition
+SCORE_BYTES = 24
+
+INSERT_BATCH = 5000
+
+# the venues or artists of one side, by position: their ids (sorted), unit
+# genre vectors, city and state codes (-1 when unknown) and log-scaled
+# past shows
+Side = namedtuple('Side', 'ids genres cities states experience')
+
+
+def _positions(ids, values):
+  # positions of values in the sorted ids, -1 for values not in ids
+  if not len(ids):
+    return np.full(len(values), -1, dtype=np.int64)
+  positions = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+  return np.where(ids[positions] == values, positions, -1)
+
+
+def _log_scale(counts):
+  counts = np.log1p(np.asarray(counts, dtype=np.float32))
+  top = counts.max() if len(counts) else 0
+  return counts / top if top > 0 else counts
+
+
+def _key(value):
+  return (value or '').strip().lower()
+
+
+def _side(model, seeking, links, counts, genre_ids, places):
+  rows = db.session.execute(
+    select([model.id, model.city, model.state]).where(seeking.is_(True)).order_by(model.id)).fetchall()
+  ids = np.array([row.id for row in rows], dtype=np.int64)
+
+  # places maps (state, city) and state to codes shared by both sides
+  def code(*key):
+    return places.setdefault(key, len(places)) if all(key) else -1
+  cities = np.array([code(_key(row.state), _key(row.city)) for row in rows], dtype=np.int64)
+  states = np.array([code(_key(row.state)) for row in rows], dtype=np.int64)
+
+  owner_column, genre_column = links
+  pairs = np.array(db.session.execute(select([owner_column, genre_column])).fetchall(),
+                   dtype=np.int64).reshape(-1, 2)
+  owners = _positions(ids, pairs[:, 0])
+  keep = owners >= 0
+  genres = np.zeros((len(ids), len(genre_ids)), dtype=np.float32)
+  genres[owners[keep], _positions(genre_ids, pairs[keep, 1])] = 1
+  norms = np.sqrt(genres.sum(axis=1, keepdims=True))
+  genres /= np.where(norms > 0, norms, 1)
+
+  table, owner = counts
+  past = np.zeros(len(ids), dtype=np.float32)
+  pairs = np.array(db.session.execute(select([owner, table.c.past_shows])).fetchall(),
+                   dtype=np.int64).reshape(-1, 2)
+  owners = _positions(ids, pairs[:, 0])
+  keep = owners >= 0
+  past[owners[keep]] = pairs[keep, 1]
+  return Side(ids, genres, cities, states, _log_scale(past))
+
+
+def _shows_together(venues, artists, now):
+  # (venue positions, artist positions, log-scaled shows) of the pairs that
+  # played together, sorted by venue
+  history = union_all(
+    select([Show.venue_id, Show.artist_id]).where(Show.start_time <= now),
+    select([show_archive.c.venue_id, show_archive.c.artist_id])
+  ).alias('history')
+  rows = db.session.execute(
+    select([history.c.venue_id, history.c.artist_id, func.count()])
+    .group_by(history.c.venue_id, history.c.artist_id)
+  ).fetchall()
+  rows = np.array(rows, dtype=np.int64).reshape(-1, 3)
+  venue_positions = _positions(venues.ids, rows[:, 0])
+  artist_positions = _positions(artists.ids, rows[:, 1])
+  keep = (venue_positions >= 0) & (artist_positions >= 0)
+  return _sorted_pairs(venue_positions[keep], artist_positions[keep], _log_scale(rows[keep, 2]))
+
+
+def _sorted_pairs(rows, columns, values):
+  order = np.argsort(rows, kind='stable')
+  return rows[order], columns[order], values[order]
+
+
+def _scores(left, right, start, stop, together, weights):
+  # the score matrix of left[start:stop] against all of right
+  scores = weights['genres'] * (left.genres[start:stop] @ right.genres.T)
+
+  cities = left.cities[start:stop, None]
+  states = left.states[start:stop, None]
+  same_city = (cities == right.cities) & (cities >= 0)
+  same_state = (states == right.states) & (states >= 0)
+  scores += weights['location'] / 2 * (same_state.astype(np.float32) + same_city)
+
+  scores += weights['history'] / 4 * (left.experience[start:stop, None] + right.experience)
+  rows, columns, shows = together
+  first, last = np.searchsorted(rows, [start, stop])
+  # pairs are unique, no index repeats
+  scores[rows[first:last] - start, columns[first:last]] += weights['history'] / 2 * shows[first:last]
+  return scores
+
+
+def _chunk_size(right, memory):
+  # left rows scored at once against all of right within memory bytes
+  return max(1, memory // (len(right.ids) * SCORE_BYTES))
+
+
+def _top_matches(left, right, together, count, weights, memory):
+  # yields the (left id, rank, right id, score) of the best count matches
+  # with a positive score of each left row
+  count = min(count, len(right.ids))
+  if count == 0:
+    return
+  chunk = _chunk_size(right, memory)
+  for start in range(0, len(left.ids), chunk):
+    stop = min(start + chunk, len(left.ids))
+    scores = _scores(left, right, start, stop, together, weights)
+    best = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+    rows, ranks = np.nonzero(best_scores > 0)
+    yield from zip(left.ids[start + rows].tolist(), (ranks + 1).tolist(),
+                   right.ids[best[rows, ranks]].tolist(),
+                   best_scores[rows, ranks].astype(np.float64).round(4).tolist())
+
+
+def _store(connection, table, columns, matches):
+  connection.execute(table.delete())
+  written = 0
+  batch = []
+  for match in matches:
+    batch.append(dict(zip(columns, match)))
+    if len(batch) == INSERT_BATCH:
+      connection.execute(table.insert(), batch)
+      written += len(batch)
+      batch = []
+  if batch:
+    connection.execute(table.insert(), batch)
+    written += len(batch)
+  return written
+
+
+def compute_suggestions(count=None, now=None):
+  '''
+  Replaces the stored suggestions with the best count (by default
+  SUGGESTIONS_PER_PAGE) artists of each venue seeking talent and venues of
+  each artist seeking venues, and commits. Returns the number of suggested
+  artists and suggested venues written.
+  '''
+  config = current_app.config
+  count = count or config['SUGGESTIONS_PER_PAGE']
+  weights = config['SUGGESTION_WEIGHTS']
+  memory = config['SUGGESTION_MEMORY']
+  now = now or datetime.now()
+
+  genre_ids = np.array([id for id, in db.session.execute(select([Genre.id]).order_by(Genre.id))],
+                       dtype=np.int64)
+  places = {}
+  venues = _side(Venue, Venue.seeking_talent, (venue_genres.c.venue_id, venue_genres.c.genre_id),
+                 (venue_show_counts, venue_show_counts.c.venue_id), genre_ids, places)
+  artists = _side(Artist, Artist.seeking_venues, (artist_genres.c.artist_id, artist_genres.c.genre_id),
+                  (artist_show_counts, artist_show_counts.c.artist_id), genre_ids, places)
+  venue_rows, artist_rows, shows = _shows_together(venues, artists, now)
+
+  # written in one transaction, pages see the old or the new suggestions
+  connection = db.session.connection()
+  written = (
+    _store(connection, suggested_artists, ('venue_id', 'rank', 'artist_id', 'score'),
+           _top_matches(venues, artists, (venue_rows, artist_rows, shows), count, weights, memory)),
+    _store(connection, suggested_venues, ('artist_id', 'rank', 'venue_id', 'score'),
+           _top_matches(artists, venues, _sorted_pairs(artist_rows, venue_rows, shows), count, weights, memory)),
+  )
+  db.session.commit()
+  page_cache.invalidate()
+  return written
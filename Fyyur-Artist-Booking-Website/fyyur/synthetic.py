@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#
+# Generates venues, artists and shows for development and benchmarks.
+# Cities, genres and bookings follow Zipf-like distributions, so a few
+# cities, genres, venues and artists get most of the rows as in real data,
+# and no venue or artist is double booked. Rows are written with bulk
+# inserts; the show counters, page cache and search indexes are reset
+# afterwards since bulk inserts fire no model events.
+#----------------------------------------------------------------------------#
+
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+import search
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres, DEFAULT_SHOW_DURATION
+from cache import page_cache
+from counters import rebuild
+
+CITIES = [
+  ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+  ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+  ('Dallas', 'TX'), ('San Francisco', 'CA'), ('Austin', 'TX'), ('Seattle', 'WA'),
+  ('Denver', 'CO'), ('Boston', 'MA'), ('Nashville', 'TN'), ('Portland', 'OR'),
+  ('Las Vegas', 'NV'), ('Detroit', 'MI'), ('Memphis', 'TN'), ('New Orleans', 'LA'),
+  ('Atlanta', 'GA'), ('Miami', 'FL'), ('Minneapolis', 'MN'), ('Cleveland', 'OH'),
+]
+
+GENRES = [
+  'Rock n Roll', 'Pop', 'Hip-Hop', 'Jazz', 'Alternative', 'R&B', 'Country', 'Electronic',
+  'Blues', 'Folk', 'Soul', 'Funk', 'Reggae', 'Classical', 'Punk', 'Heavy Metal',
+  'Swing', 'Instrumental', 'Musical Theatre', 'Other',
+]
+
+NAME_WORDS = [
+  'Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Crimson', 'Wild',
+  'Lucky', 'Hollow', 'Neon', 'Iron', 'Echo', 'Atomic', 'Rusty', 'Paper', 'Lunar', 'Copper',
+]
+VENUE_WORDS = ['Hall', 'Lounge', 'Club', 'Room', 'Theatre', 'Tavern', 'Garden', 'Arena', 'Bar']
+ARTIST_WORDS = ['Band', 'Quartet', 'Collective', 'Orchestra', 'Trio', 'Project', 'Kids', 'Sound']
+
+# shows start on the hour between 10:00 and 22:00, every two hours, over a
+# year on either side of the reference time
+SLOT_HOURS = range(10, 23, 2)
+DAYS = 365
+
+
+class Zipf(object):
+  '''
+  Picks indexes 0..n-1 with probability proportional to 1 / (i + 1) ** s.
+  '''
+
+  def __init__(self, n, s=1.1):
+    self.totals = list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+  def pick(self, rng):
+    return bisect(self.totals, rng.random() * self.totals[-1])
+
+
+def _name(rng, words):
+  return '{} {} {}'.format(rng.choice(NAME_WORDS), rng.choice(NAME_WORDS), rng.choice(words))
+
+
+def _phone(rng):
+  return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(100, 999), rng.randint(0, 9999))
+
+
+def _owners(rng, model, count, words, genre_ids, extra):
+  cities = Zipf(len(CITIES))
+  genres = Zipf(len(GENRES))
+  mappings = []
+  for i in range(count):
+    city, state = CITIES[cities.pick(rng)]
+    mapping = {
+      'name': _name(rng, words),
+      'city': city,
+      'state': state,
+      'phone': _phone(rng),
+      'image_link': 'https://picsum.photos/seed/{}{}/300/300'.format(model.__tablename__, i),
+      'facebook_link': 'https://www.facebook.com/{}{}'.format(model.__tablename__.lower(), i),
+      'website': 'https://www.example.com/{}{}'.format(model.__tablename__.lower(), i),
+      'seeking_description': '',
+    }
+    mapping.update(extra(i))
+    mappings.append(mapping)
+  db.session.bulk_insert_mappings(model, mappings, return_defaults=True)
+
+  table = venue_genres if model is Venue else artist_genres
+  owner = 'venue_id' if model is Venue else 'artist_id'
+  links = []
+  for mapping in mappings:
+    names = {GENRES[genres.pick(rng)] for _ in range(rng.randint(1, 3))}
+    links.extend({owner: mapping['id'], 'genre_id': genre_ids[name]} for name in names)
+  if links:
+    db.session.execute(table.insert(), links)
+  return [mapping['id'] for mapping in mappings]
+
+
+def _shows(rng, count, venue_ids, artist_ids, now):
+  venues = Zipf(len(venue_ids), 0.8)
+  artists = Zipf(len(artist_ids), 0.8)
+  first_day = (now - timedelta(days=DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+  slots = 2 * DAYS * len(SLOT_HOURS)
+  booked = set()
+  mappings = []
+  attempts = 0
+  while len(mappings) < count and attempts < count * 20:
+    attempts += 1
+    # the skewed pick for most rows, a uniform one when popular venues and
+    # artists fill up
+    if attempts < count * 10:
+      venue_id, artist_id = venue_ids[venues.pick(rng)], artist_ids[artists.pick(rng)]
+    else:
+      venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+    slot = rng.randrange(slots)
+    if ('venue', venue_id, slot) in booked or ('artist', artist_id, slot) in booked:
+      continue
+    booked.add(('venue', venue_id, slot))
+    booked.add(('artist', artist_id, slot))
+    day, hour = divmod(slot, len(SLOT_HOURS))
+    start_time = first_day + timedelta(days=day, hours=SLOT_HOURS[hour])
+    mappings.append({
+      'venue_id': venue_id,
+      'artist_id': artist_id,
+      'start_time': start_time,
+      'end_time': start_time + DEFAULT_SHOW_DURATION,
+    })
+  for i in range(0, len(mappings), 10000):
+    db.session.bulk_insert_mappings(Show, mappings[i:i + 10000])
+  return len(mappings)
+
+
+def generate(venues, artists, shows, seed=0, now=None):
+  '''
+  Adds the given numbers of venues, artists and shows to the database and
+  returns the number of shows written, which can be lower than requested
+  when there are not enough free slots. Meant for an empty database: the
+  shows are not checked against the ones already booked.
+  '''
+  rng = random.Random(seed)
+  now = now or datetime.now()
+
+  existing = {genre.name: genre.id for genre in Genre.query.filter(Genre.name.in_(GENRES))}
+  missing = [{'name': name} for name in GENRES if name not in existing]
+  if missing:
+    db.session.bulk_insert_mappings(Genre, missing, return_defaults=True)
+    existing.update((genre['name'], genre['id']) for genre in missing)
+
+  venue_ids = _owners(rng, Venue, venues, VENUE_WORDS, existing, lambda i: {
+    'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(NAME_WORDS)),
+    'seeking_talent': rng.random() < 0.3,
+  })
+  artist_ids = _owners(rng, Artist, artists, ARTIST_WORDS, existing, lambda i: {
+    'seeking_venues': rng.random() < 0.3,
+  })
+  written = _shows(rng, shows, venue_ids, artist_ids, now) if venue_ids and artist_ids else 0
+  db.session.commit()
+
+  rebuild(now)
+  page_cache.invalidate()
+  search.reset_search_indexes()
+  return written
@@ -0,0 +1,424 @@
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#
+# Venues and artists link to images on other sites. Once a new image link
+# is committed, a background worker fetches it, checks that it is an image
+# of at most THUMBNAIL_MAX_BYTES, and writes a THUMBNAIL_SIZE thumbnail to
+# THUMBNAIL_DIR named by the SHA-256 of the image, so links to the same
+# image share one file and a file never changes. The outcome is kept in the
+# image_links table.
+#
+# The "thumbnail" template filter turns an image link into the URL to show:
+# the local thumbnail when it is ready, served by /thumbnails/<name> with a
+# one year immutable Cache-Control; the placeholder image for a link that
+# is not an image; the link itself until it has been checked.
+#
+# Links to hosts on private networks are refused: the host is resolved when
+# connecting and the connection is made to the address that was checked, so
+# a host cannot resolve to a public address for the check and to a private
+# one for the fetch. Proxies from the environment are not used, as the
+# connection would be made to the proxy.
+#
+# The worker is a thread pool in the web process, so form submissions only
+# enqueue the link. Bulk inserts fire no events; "flask refresh-thumbnails"
+# checks the links that have not been checked yet.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import ipaddress
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from functools import partial
+from http.client import HTTPConnection, HTTPSConnection
+from io import BytesIO
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, HTTPSHandler, HTTPRedirectHandler, ProxyHandler, Request, \
+  build_opener
+from flask import url_for
+from sqlalchemy import event, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import get_history
+from models import db, Venue, Artist, image_links
+from cache import page_cache
+from routing import RoutingSession
+
+READY = 'ready'
+INVALID = 'invalid'
+
+# thumbnail file names, the SHA-256 of the image and its extension
+THUMBNAIL_NAME = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+
+# images stored as fetched when Pillow is missing
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+class ImageError(Exception):
+  '''
+  An image link that cannot be used, with the reason.
+  '''
+
+
+def _check_scheme(url):
+  parts = urlsplit(url)
+  if parts.scheme not in ('http', 'https') or not parts.hostname:
+    raise ImageError('Not an http or https link.')
+
+
+def _checked_connection(private_addresses, address, timeout, source_address=None):
+  # replaces socket.create_connection: resolves the host, refuses it if any
+  # of its addresses is private, then connects to one of those addresses
+  host, port = address
+  try:
+    infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+  except (socket.gaierror, UnicodeError):
+    raise ImageError('Unknown host.')
+  if not private_addresses:
+    for info in infos:
+      if not ipaddress.ip_address(info[4][0].split('%')[0]).is_global:
+        raise ImageError('The host is on a private network.')
+  error = None
+  for family, type, proto, _, sockaddr in infos:
+    sock = socket.socket(family, type, proto)
+    try:
+      sock.settimeout(timeout)
+      if source_address:
+        sock.bind(source_address)
+      sock.connect(sockaddr)
+      return sock
+    except OSError as exception:
+      error = exception
+      sock.close()
+  raise error
+
+
+class _CheckedHTTPConnection(HTTPConnection):
+
+  def __init__(self, *args, private_addresses=False, **kwargs):
+    super(_CheckedHTTPConnection, self).__init__(*args, **kwargs)
+    self._create_connection = partial(_checked_connection, private_addresses)
+
+
+class _CheckedHTTPSConnection(HTTPSConnection):
+
+  def __init__(self, *args, private_addresses=False, **kwargs):
+    super(_CheckedHTTPSConnection, self).__init__(*args, **kwargs)
+    self._create_connection = partial(_checked_connection, private_addresses)
+
+
+class _CheckedHTTPHandler(HTTPHandler):
+
+  def __init__(self, private_addresses):
+    super(_CheckedHTTPHandler, self).__init__()
+    self.private_addresses = private_addresses
+
+  def http_open(self, req):
+    return self.do_open(partial(_CheckedHTTPConnection, private_addresses=self.private_addresses), req)
+
+
+class _CheckedHTTPSHandler(HTTPSHandler):
+
+  def __init__(self, private_addresses):
+    super(_CheckedHTTPSHandler, self).__init__()
+    self.private_addresses = private_addresses
+
+  def https_open(self, req):
+    return self.do_open(partial(_CheckedHTTPSConnection, private_addresses=self.private_addresses), req,
+                        context=self._context)
+
+
+class _CheckedRedirects(HTTPRedirectHandler):
+
+  def redirect_request(self, req, fp, code, msg, headers, newurl):
+    _check_scheme(newurl)
+    return super(_CheckedRedirects, self).redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch_image(url, max_bytes, timeout, private_addresses=False):
+  '''
+  Returns the (content, content type) of an image link. Raises ImageError
+  when the link is not an http(s) image of at most max_bytes.
+  '''
+  _check_scheme(url)
+  opener = build_opener(ProxyHandler({}), _CheckedHTTPHandler(private_addresses),
+                        _CheckedHTTPSHandler(private_addresses), _CheckedRedirects())
+  try:
+    with opener.open(Request(url, headers={'User-Agent': 'Fyyur thumbnailer'}), timeout=timeout) as response:
+      content_type = response.headers.get_content_type()
+      if not content_type.startswith('image/'):
+        raise ImageError('Not an image ({}).'.format(content_type))
+      content = response.read(max_bytes + 1)
+  except (URLError, OSError, ValueError) as error:
+    raise ImageError('Could not fetch the image: {}.'.format(getattr(error, 'reason', error)))
+  if len(content) > max_bytes:
+    raise ImageError('The image is larger than {} bytes.'.format(max_bytes))
+  return content, content_type
+
+
+def make_thumbnail(content, content_type, size):
+  '''
+  Returns (thumbnail bytes, extension): the image downscaled to fit in
+  size x size pixels as a JPEG, or as fetched when Pillow is missing.
+  '''
+  try:
+    from PIL import Image
+  except ImportError:
+    if content_type not in EXTENSIONS:
+      raise ImageError('Unsupported image type {}.'.format(content_type))
+    return content, EXTENSIONS[content_type]
+
+  try:
+    image = Image.open(BytesIO(content))
+    image.thumbnail((size, size))
+    if image.mode != 'RGB':
+      image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=85, optimize=True)
+  except (OSError, ValueError, Image.DecompressionBombError):
+    raise ImageError('Not a readable image.')
+  return output.getvalue(), 'jpg'
+
+
+def store_thumbnail(directory, content, thumbnail, extension):
+  '''
+  Writes the thumbnail of an image under the SHA-256 of the image, unless
+  it exists already, and returns the file name.
+  '''
+  name = '{}.{}'.format(hashlib.sha256(content).hexdigest(), extension)
+  path = os.path.join(directory, name)
+  if not os.path.exists(path):
+    os.makedirs(directory, exist_ok=True)
+    # written aside and renamed, so a file is never served half written
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as file:
+      file.write(thumbnail)
+    os.replace(temporary, path)
+  return name
+
+
+class _Batch(object):
+  '''
+  The checks of one enqueue() call. Once the last one has ended, the page
+  cache is invalidated if any of them changed how its link is shown.
+  '''
+
+  def __init__(self, size):
+    self.remaining = size
+    self.changed = False
+    self.lock = threading.Lock()
+
+  def done(self, changed):
+    with self.lock:
+      self.changed = self.changed or changed
+      self.remaining -= 1
+      last = self.remaining == 0
+    if last and self.changed:
+      # cached pages still show the remote links
+      page_cache.invalidate()
+
+
+class Thumbnailer(object):
+  '''
+  Checks image links on a thread pool and maps links to the URL to show.
+  The map is refreshed from image_links every THUMBNAIL_REFRESH_SECONDS,
+  picking up the links checked by other processes, and keeps the
+  THUMBNAIL_LINKS_SIZE links used last. Views read the other links of a
+  page with preload() before rendering it.
+  '''
+
+  def __init__(self):
+    self.app = None
+    self.executor = None
+    self.links = OrderedDict()
+    self.checked_until = None
+    self.refreshed = None
+    self.lock = threading.Lock()
+
+  def init_app(self, app):
+    self.app = app
+    workers = app.config.get('THUMBNAIL_WORKERS', 2)
+    self.executor = ThreadPoolExecutor(workers, thread_name_prefix='thumbnails') if workers else None
+    app.jinja_env.filters['thumbnail'] = self.image_url
+
+  def enqueue(self, urls):
+    '''
+    Checks the given image links in the background. Returns the futures of
+    the checks. The page cache is invalidated once, after the last check,
+    if any link is shown differently.
+    '''
+    batch = _Batch(len(urls))
+    futures = []
+    for url in urls:
+      if self.executor is None:
+        future = Future()
+        future.set_result(self._check_in_batch(url, batch))
+      else:
+        future = self.executor.submit(self._check_in_context, url, batch)
+      futures.append(future)
+    return futures
+
+  def _check_in_context(self, url, batch):
+    with self.app.app_context():
+      return self._check_in_batch(url, batch)
+
+  def _check_in_batch(self, url, batch):
+    status, changed = None, False
+    try:
+      status, changed = self._check(url)
+    finally:
+      batch.done(changed)
+    return status
+
+  def check(self, url):
+    '''
+    Fetches an image link, stores its thumbnail and records the outcome.
+    Returns the status. Links already ready are not fetched again.
+    '''
+    return self._check_in_batch(url, _Batch(1))
+
+  def _check(self, url):
+    # returns the status and whether the link is shown differently
+    config = self.app.config
+    directory = config['THUMBNAIL_DIR']
+    with db.engine.connect() as connection:
+      row = connection.execute(select([image_links.c.status, image_links.c.thumbnail])
+        .where(image_links.c.url == url)).first()
+    if row is not None and row.status == READY and os.path.exists(os.path.join(directory, row.thumbnail)):
+      return READY, False
+
+    values = {'status': READY, 'thumbnail': None, 'error': None, 'checked_at': datetime.utcnow()}
+    try:
+      content, content_type = fetch_image(url, config['THUMBNAIL_MAX_BYTES'], config['THUMBNAIL_TIMEOUT'],
+                                          config.get('THUMBNAIL_PRIVATE_ADDRESSES', False))
+      thumbnail, extension = make_thumbnail(content, content_type, config['THUMBNAIL_SIZE'])
+      values['thumbnail'] = store_thumbnail(directory, content, thumbnail, extension)
+    except ImageError as error:
+      values.update(status=INVALID, error=str(error)[:250])
+
+    with db.engine.begin() as connection:
+      updated = connection.execute(image_links.update().where(image_links.c.url == url).values(values))
+      if updated.rowcount == 0:
+        try:
+          connection.execute(image_links.insert().values(url=url, **values))
+        except IntegrityError:
+          # checked by another worker in the meantime
+          pass
+    self._remember(url, values['status'], values['thumbnail'])
+    changed = row is None or (row.status, row.thumbnail) != (values['status'], values['thumbnail'])
+    return values['status'], changed
+
+  def _refresh(self):
+    now = time.monotonic()
+    with self.lock:
+      if self.refreshed is not None and now - self.refreshed < self.app.config.get('THUMBNAIL_REFRESH_SECONDS', 30):
+        return
+      self.refreshed = now
+      since = self.checked_until
+    query = select([image_links.c.url, image_links.c.status, image_links.c.thumbnail, image_links.c.checked_at])
+    if since is not None:
+      query = query.where(image_links.c.checked_at >= since)
+    rows = db.session.execute(query).fetchall()
+    for url, status, thumbnail, checked_at in rows:
+      self._remember(url, status, thumbnail)
+    with self.lock:
+      for row in rows:
+        if self.checked_until is None or row.checked_at > self.checked_until:
+          self.checked_until = row.checked_at
+
+  def _remember(self, url, status, thumbnail):
+    with self.lock:
+      self.links[url] = (status, thumbnail)
+      self.links.move_to_end(url)
+      while len(self.links) > self.app.config.get('THUMBNAIL_LINKS_SIZE', 10000):
+        self.links.popitem(last=False)
+
+  def preload(self, links):
+    '''
+    Reads the outcome of the given image links that are not in the map
+    with one query, before a page showing them is rendered.
+    '''
+    self._refresh()
+    links = {link for link in links if link}
+    with self.lock:
+      missing = [link for link in links if link not in self.links]
+    if not missing:
+      return
+    # links not checked yet are remembered as such: a link checked later
+    # is updated by the next refresh
+    rows = {url: (status, thumbnail) for url, status, thumbnail in db.session.execute(
+      select([image_links.c.url, image_links.c.status, image_links.c.thumbnail])
+      .where(image_links.c.url.in_(missing)))}
+    for link in missing:
+      self._remember(link, *rows.get(link, (None, None)))
+
+  def _lookup(self, link):
+    with self.lock:
+      if link in self.links:
+        self.links.move_to_end(link)
+        return self.links[link]
+    return None, None
+
+  def image_url(self, link):
+    '''
+    Template filter: the URL to show for an image link, the link itself
+    when it was neither preloaded nor checked by this process.
+    '''
+    if not link:
+      return url_for('static', filename='img/not_found.png')
+    self._refresh()
+    status, thumbnail = self._lookup(link)
+    if status == READY:
+      return url_for('views.thumbnail', name=thumbnail)
+    if status == INVALID:
+      return url_for('static', filename='img/not_found.png')
+    return link
+
+  def unchecked_links(self):
+    '''
+    Returns the image links of venues and artists that were never checked.
+    '''
+    links = union(
+      select([Venue.image_link.label('url')]).where(Venue.image_link != ''),
+      select([Artist.image_link.label('url')]).where(Artist.image_link != '')
+    ).alias('links')
+    query = select([links.c.url]) \
+      .where(links.c.url.isnot(None)) \
+      .where(~links.c.url.in_(select([image_links.c.url])))
+    return [url for url, in db.session.execute(query)]
+
+
+thumbnailer = Thumbnailer()
+
+
+def _link_changed(mapper, connection, target):
+  # remembered on the session and enqueued once it commits
+  if target.image_link and get_history(target, 'image_link').has_changes():
+    session = object_session(target)
+    session.info.setdefault('image_links', set()).add(target.image_link)
+
+
+def _committed(session):
+  urls = session.info.pop('image_links', None)
+  if urls and thumbnailer.app is not None:
+    thumbnailer.enqueue(sorted(urls))
+
+
+def _rolled_back(session, previous_transaction):
+  session.info.pop('image_links', None)
+
+
+for _model in (Venue, Artist):
+  event.listen(_model, 'after_insert', _link_changed)
+  event.listen(_model, 'after_update', _link_changed)
+event.listen(RoutingSession, 'after_commit', _committed)
+event.listen(RoutingSession, 'after_soft_rollback', _rolled_back)
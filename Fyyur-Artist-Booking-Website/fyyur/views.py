@@ -0,0 +1,583 @@
+#----------------------------------------------------------------------------#
+# Views.
+#
+# The HTML pages of the site, registered on the app by create_app() in
+# app.py.
+#----------------------------------------------------------------------------#
+
+from datetime import timedelta
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort, g, \
+  send_from_directory, current_app
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, get_genres, show_end_time
+import search
+from cache import page_cache, cached_page
+from routing import replica_reads
+from counters import get_show_counts
+from deletion import delete_venues, delete_artists
+from thumbnails import thumbnailer, THUMBNAIL_NAME, ONE_YEAR
+from bookings import find_conflicts, month_range, get_venue_availability
+from formatting import format_datetime, select_locale, select_timezone
+from queries import get_venue_areas, get_venue_with_shows, get_artist_with_shows, get_shows_page, \
+  get_artists, get_genre_names, get_calendar, calendar_range, get_suggested_artists, get_suggested_venues
+
+views = Blueprint('views', __name__)
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+def format_phone(phone):
+  phone=phone.replace('-','')
+  if(len(phone)==10):
+    phone = phone[:3] +'-' +phone[3:6]+'-'+phone[6:]
+  return phone
+
+views.add_app_template_filter(format_datetime, 'datetime')
+
+@views.before_app_request
+def set_formatting_context():
+  # locale and time zone used by the datetime filter for this request
+  g.locale = select_locale(request, current_app.config['SUPPORTED_LOCALES'], current_app.config['DEFAULT_LOCALE'])
+  g.timezone = select_timezone(request, current_app.config['DEFAULT_TIMEZONE'])
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+@views.route('/')
+@replica_reads
+@cached_page
+def index():
+  # recently added artists and venues
+  artists = Artist.query.order_by(db.desc(Artist.creation_date)).limit(3)
+  venues = Venue.query.order_by(db.desc(Venue.creation_date)).limit(3)
+  return render_template('pages/home.html', venues=venues, artists=artists)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@views.route('/venues')
+@replica_reads
+@cached_page
+def venues():
+  genre = request.args.get('genre')
+  data = get_venue_areas(genre=genre)
+  return render_template('pages/venues.html', areas=data, genres=get_genre_names(), current_genre=genre)
+
+@views.route('/venues/search', methods=['POST'])
+@replica_reads
+def search_venues():
+  search_term = request.form.get('search_term', '')
+  response = search.search_venues(search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+@views.route('/venues/<int:venue_id>')
+@replica_reads
+@cached_page
+def show_venue(venue_id):
+  result = get_venue_with_shows(venue_id)
+  if result is None:
+    abort(404)
+  venue, past_shows, upcoming_shows = result
+  past_shows_count, upcoming_shows_count = get_show_counts('venue', [venue_id]).get(venue_id, (0, 0))
+
+  num_past_shows = [{
+    "artist_id": show.artist_id,
+    "artist_name": show.artist.name,
+    "artist_image_link": show.artist.image_link,
+    "start_time": show.start_time
+  } for show in past_shows]
+
+  num_upcoming_shows = [{
+    "artist_id": show.artist_id,
+    "artist_name": show.artist.name,
+    "artist_image_link": show.artist.image_link,
+    "start_time": show.start_time
+  } for show in upcoming_shows]
+
+  data = {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": [genre.name for genre in venue.genres],
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": format_phone(venue.phone),
+    "website": venue.website,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "past_shows": num_past_shows,
+    "upcoming_shows": num_upcoming_shows,
+    "past_shows_count": past_shows_count,
+    "upcoming_shows_count": upcoming_shows_count,
+    "suggested_artists": get_suggested_artists(venue_id) if venue.seeking_talent else []
+  }
+  # the image links of the page, read at once
+  thumbnailer.preload([venue.image_link]
+    + [show['artist_image_link'] for show in num_past_shows + num_upcoming_shows]
+    + [suggestion.image_link for suggestion in data['suggested_artists']])
+
+  return render_template('pages/show_venue.html', venue=data)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@views.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@views.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  # insert form data as a new Venue record in the db, instead
+  # modify data to be the data object returned from db insertion
+
+  try:
+    seeking_talent = request.form.get('seeking_talent', None)
+    # Try to create a new Venue record and add to the db
+    venue = Venue(
+      name = request.form['name'],
+      address = request.form['address'],
+      city = request.form['city'],
+      state = request.form['state'],
+      phone = request.form['phone'],
+      genres = get_genres(request.form.getlist('genres')),
+      facebook_link = request.form['facebook_link'],
+      website = request.form['website'],
+      image_link = request.form['image_link'],
+      seeking_talent = True if seeking_talent != None else False,
+      seeking_description = request.form['seeking_description']
+    )
+    db.session.add(venue)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    # on unsuccessful db insert, flash an error instead
+    db.session.rollback()
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
+    current_app.logger.exception('Could not list venue %s', request.form['name'])
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
+
+@views.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # the venue's shows are deleted by the database, in the same statement
+  name = db.session.query(Venue.name).filter_by(id=venue_id).scalar()
+  if name is None:
+    abort(404)
+  try:
+    delete_venues([venue_id])
+    flash('Venue ' + name + ' was successfully deleted!')
+  except:
+    db.session.rollback()
+    current_app.logger.exception('Could not delete venue %s', venue_id)
+    flash('An error occurred. Venue ' + name + ' could not be deleted.')
+    return jsonify({'success': False}), 500
+  finally:
+    db.session.close()
+  return jsonify({'success': True})
+
+@views.route('/venues/delete', methods=['POST'])
+def delete_venues_submission():
+  return bulk_delete(delete_venues)
+
+def bulk_delete(delete):
+  # ids come as a JSON body {"ids": [...]} or as repeated "ids" form fields
+  data = request.get_json(silent=True)
+  values = data.get('ids') if isinstance(data, dict) else request.form.getlist('ids')
+  try:
+    ids = [int(value) for value in values or ()]
+  except (TypeError, ValueError):
+    abort(400)
+  if not ids:
+    abort(400)
+  try:
+    deleted = delete(ids)
+  except:
+    db.session.rollback()
+    current_app.logger.exception('%s failed for ids %s', delete.__name__, ids)
+    return jsonify({'success': False}), 500
+  finally:
+    db.session.close()
+  return jsonify({'success': True, 'deleted': deleted})
+
+#  Artists
+#  ----------------------------------------------------------------
+@views.route('/artists')
+@replica_reads
+@cached_page
+def artists():
+  genre = request.args.get('genre')
+  data = get_artists(genre=genre)
+  return render_template('pages/artists.html', artists=data, genres=get_genre_names(), current_genre=genre)
+
+@views.route('/artists/search', methods=['POST'])
+@replica_reads
+def search_artists():
+  search_term = request.form.get('search_term', '')
+  response = search.search_artists(search_term)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@views.route('/artists/<int:artist_id>')
+@replica_reads
+@cached_page
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  result = get_artist_with_shows(artist_id)
+  if result is None:
+    abort(404)
+  artist, past_shows, upcoming_shows = result
+  past_shows_count, upcoming_shows_count = get_show_counts('artist', [artist_id]).get(artist_id, (0, 0))
+
+  num_past_shows = [{
+    "artist_id": show.artist_id,
+    "venue_id" : show.venue_id,
+    "venue_name": show.venue.name,
+    "venue_image_link": show.venue.image_link,
+    "start_time": show.start_time
+  } for show in past_shows]
+
+  num_upcoming_shows = [{
+    "artist_id": show.artist_id,
+    "venue_id" : show.venue_id,
+    "venue_name": show.venue.name,
+    "venue_image_link": show.venue.image_link,
+    "start_time": show.start_time
+  } for show in upcoming_shows]
+
+  data = {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": [genre.name for genre in artist.genres],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": format_phone(artist.phone),
+    "website" : artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venues": artist.seeking_venues,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "past_shows": num_past_shows,
+    "upcoming_shows": num_upcoming_shows,
+    "past_shows_count": past_shows_count,
+    "upcoming_shows_count": upcoming_shows_count,
+    "suggested_venues": get_suggested_venues(artist_id) if artist.seeking_venues else []
+  }
+  # the image links of the page, read at once
+  thumbnailer.preload([artist.image_link]
+    + [show['venue_image_link'] for show in num_past_shows + num_upcoming_shows]
+    + [suggestion.image_link for suggestion in data['suggested_venues']])
+
+  return render_template('pages/show_artist.html', artist=data)
+
+#  Update
+#  ----------------------------------------------------------------
+@views.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artist = Artist.query.get(artist_id)
+
+  form.name.data = artist.name
+  form.genres.data = [genre.name for genre in artist.genres]
+  form.city.data = artist.city
+  form.state.data = artist.state
+  form.phone.data = artist.phone
+  form.website.data = artist.website
+  form.facebook_link.data = artist.facebook_link
+  form.seeking_venues.data = artist.seeking_venues
+  form.seeking_description.data = artist.seeking_description
+  form.image_link.data = artist.image_link
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@views.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  artist = Artist.query.get(artist_id)
+
+  try:
+    seeking_venues = request.form.get('seeking_venues', None)
+    artist.name = request.form['name']
+    artist.genres = get_genres(request.form.getlist('genres'))
+    artist.city = request.form['city']
+    artist.state = request.form['state']
+    artist.phone = request.form['phone']
+    artist.website = request.form['website']
+    artist.facebook_link = request.form['facebook_link']
+    artist.seeking_venues = True if seeking_venues != None else False
+    artist.seeking_description = request.form['seeking_description']
+    artist.image_link = request.form['image_link']
+    
+    db.session.add(artist)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Artist ' + request.form['name'] + ' was successfully updated!')
+  except:
+    # on unsuccessful db insert, flash an error instead.
+    db.session.rollback()
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.')
+    current_app.logger.exception('Could not update artist %s', artist_id)
+  finally:
+    db.session.close()
+  return redirect(url_for('.show_artist', artist_id=artist_id))
+
+@views.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venue = Venue.query.get(venue_id)
+
+  form.name.data = venue.name
+  form.city.data = venue.city
+  form.state.data = venue.state
+  form.address.data = venue.address
+  form.phone.data = venue.phone
+  form.genres.data = [genre.name for genre in venue.genres]
+  form.seeking_talent.data = venue.seeking_talent
+  form.seeking_description.data = venue.seeking_description
+  form.website.data = venue.website
+  form.image_link.data = venue.image_link
+  form.facebook_link.data = venue.facebook_link
+
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@views.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  # take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+
+  venue = Venue.query.get(venue_id)
+
+  try:
+    seeking_talent = request.form.get('seeking_talent', None)
+    venue.name = request.form['name']
+    venue.genres = get_genres(request.form.getlist('genres'))
+    venue.address = request.form['address']
+    venue.city = request.form['city']
+    venue.state = request.form['state']
+    venue.phone = request.form['phone']
+    venue.website = request.form['website']
+    venue.facebook_link = request.form['facebook_link']
+    venue.seeking_talent = True if seeking_talent != None else False
+    venue.seeking_description = request.form['seeking_description']
+    venue.image_link = request.form['image_link']
+    db.session.add(venue)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    # on unsuccessful db insert, flash an error instead.
+    db.session.rollback()
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.')
+    current_app.logger.exception('Could not update venue %s', venue_id)
+  finally:
+    db.session.close()
+
+  return redirect(url_for('.show_venue', venue_id=venue_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@views.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@views.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  try:
+    seeking_venues = request.form.get('seeking_venues', None)
+    # Try to create a new Artist record and add to the db
+    artist = Artist(  
+      name = request.form['name'],
+      genres = get_genres(request.form.getlist('genres')),
+      city = request.form['city'],
+      state = request.form['state'],
+      phone = request.form['phone'],
+      website = request.form['website'],
+      facebook_link = request.form['facebook_link'],
+      seeking_venues = True if seeking_venues != None else False,
+      seeking_description = request.form['seeking_description'],
+      image_link = request.form['image_link']
+    )
+    db.session.add(artist)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  except:
+    # on unsuccessful db insert, flash an error instead
+    db.session.rollback()
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+    current_app.logger.exception('Could not list artist %s', request.form['name'])
+  finally:
+    db.session.close()
+
+  return render_template('pages/home.html')
+
+
+@views.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  name = db.session.query(Artist.name).filter_by(id=artist_id).scalar()
+  if name is None:
+    abort(404)
+  try:
+    delete_artists([artist_id])
+    flash('Artist ' + name + ' was successfully deleted!')
+  except:
+    db.session.rollback()
+    current_app.logger.exception('Could not delete artist %s', artist_id)
+    flash('An error occurred. Artist ' + name + ' could not be deleted.')
+    return jsonify({'success': False}), 500
+  finally:
+    db.session.close()
+  return jsonify({'success': True})
+
+@views.route('/artists/delete', methods=['POST'])
+def delete_artists_submission():
+  return bulk_delete(delete_artists)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@views.route('/shows')
+@replica_reads
+def shows():
+  # displays one page of shows at /shows, filtered by time, venue or artist
+  when = request.args.get('when')
+  if when not in (None, 'upcoming', 'past'):
+    abort(400)
+  filters = {
+    "when": when,
+    "venue_id": request.args.get('venue_id', type=int),
+    "artist_id": request.args.get('artist_id', type=int)
+  }
+
+  try:
+    shows, next_cursor = get_shows_page(cursor=request.args.get('cursor'), **filters)
+  except ValueError:
+    abort(400)
+
+  data = [{
+    "venue_id" : show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_time
+  } for show in shows]
+  thumbnailer.preload(show['artist_image_link'] for show in data)
+
+  next_url = None
+  if next_cursor:
+    next_url = url_for('.shows', cursor=next_cursor, **{k: v for k, v in filters.items() if v is not None})
+  return render_template('pages/shows.html', shows=data, filters=filters, next_url=next_url)
+
+@views.route('/calendar')
+@replica_reads
+@cached_page
+def calendar():
+  # shows by day between ?from= and ?to= (YYYY-MM-DD, both included)
+  filters = {
+    "venue_id": request.args.get('venue_id', type=int),
+    "artist_id": request.args.get('artist_id', type=int)
+  }
+  try:
+    start, end = calendar_range(request.args.get('from'), request.args.get('to'),
+                                max_days=current_app.config['CALENDAR_MAX_DAYS'])
+  except ValueError:
+    abort(400)
+
+  days = get_calendar(start, end, **filters)
+  thumbnailer.preload(show.artist_image_link for _, shows in days for show in shows)
+  span = end - start
+  last = end - timedelta(days=1)
+  links = {k: v for k, v in filters.items() if v is not None}
+  previous_url = url_for('.calendar', **{'from': (start - span).strftime('%Y-%m-%d'),
+                                        'to': (start - timedelta(days=1)).strftime('%Y-%m-%d')}, **links)
+  next_url = url_for('.calendar', **{'from': end.strftime('%Y-%m-%d'),
+                                    'to': (last + span).strftime('%Y-%m-%d')}, **links)
+  return render_template('pages/calendar.html', days=days, start=start, last=last,
+                         previous_url=previous_url, next_url=next_url)
+
+@views.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@views.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db, upon submitting new show listing form
+  # insert form data as a new Show record in the db, instead
+  form = ShowForm(request.form, meta={'csrf': False})
+  try:
+    if not form.validate():
+      raise ValueError(form.errors)
+    show = Show(
+      venue_id = int(form.venue_id.data),
+      artist_id = int(form.artist_id.data),
+      start_time = form.start_time.data,
+      end_time = show_end_time(form.start_time.data, form.duration.data)
+    )
+    conflicts = find_conflicts(show.venue_id, show.artist_id, show.start_time, show.end_time)
+    if conflicts:
+      flash('The venue or the artist is already booked at that time, the show could not be listed.')
+      return render_template('pages/home.html')
+    db.session.add(show)
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Show was successfully listed!')
+  except:
+    # on unsuccessful db insert, flash an error instead
+    db.session.rollback()
+    flash('An error occurred, the show could not be listed.')
+    current_app.logger.exception('Could not list a show')
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
+
+@views.route('/venues/<int:venue_id>/availability')
+@replica_reads
+def venue_availability(venue_id):
+  # busy and free intervals of the venue during a month, ?month=YYYY-MM
+  if db.session.query(Venue.id).filter_by(id=venue_id).scalar() is None:
+    abort(404)
+  try:
+    start, end = month_range(request.args.get('month'))
+  except ValueError:
+    abort(400)
+  busy, free = get_venue_availability(venue_id, start, end)
+  return jsonify({
+    "venue_id": venue_id,
+    "from": start.isoformat(),
+    "to": end.isoformat(),
+    "busy": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in busy],
+    "free": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in free]
+  })
+
+@views.route('/thumbnails/<name>')
+def thumbnail(name):
+  # named by the hash of the image, so browsers can keep it for good
+  if not THUMBNAIL_NAME.match(name):
+    abort(404)
+  response = send_from_directory(current_app.config['THUMBNAIL_DIR'], name)
+  response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(ONE_YEAR)
+  return response
+
+@views.route('/cache/stats')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
+@views.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@views.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
@@ -0,0 +1,107 @@
+import json
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from models import db, Category
+
+'''
+Category registry
+
+Categories are read on most requests and hardly ever written, so each
+process keeps them in memory: the type of every category by id, and the
+body of the GET /categories response serialized once. They are loaded
+when the app is created and served without a query.
+
+Every write of a category bumps the registry's version when its session
+commits, which drops the loaded categories; the next request loads them
+again. A load started before a write is not kept, as its version is then
+out of date. Categories written by another process are only seen after a
+restart.
+'''
+
+
+'''
+CategoryRegistry
+    per-process categories, reloaded after categories are written
+
+'''
+class CategoryRegistry:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.version = 0
+    self.loaded = None
+
+  def invalidate(self):
+    with self.lock:
+      self.version += 1
+      self.loaded = None
+
+  '''
+  load()
+      reads the categories and returns them as (types, body), where types
+      maps their ids to their types and body is the JSON of GET /categories
+  '''
+  def load(self):
+    with self.lock:
+      version = self.version
+    types = {
+      id: type for id, type in db.session.query(Category.id, Category.type).order_by(Category.id)
+    }
+    body = json.dumps({
+      'success': True,
+      'categories': types,
+      'total_categories': len(types)
+    })
+    loaded = (types, body)
+    with self.lock:
+      if self.version == version:
+        self.loaded = loaded
+    return loaded
+
+  def _get(self):
+    loaded = self.loaded
+    return loaded if loaded is not None else self.load()
+
+  '''
+  types()
+      returns a dict of the category types by id, which must not be changed
+  '''
+  def types(self):
+    return self._get()[0]
+
+  '''
+  type(category_id)
+      returns the type of the category, or None if there is no such category
+  '''
+  def type(self, category_id):
+    return self.types().get(category_id)
+
+  '''
+  body()
+      returns the JSON body of the GET /categories response
+  '''
+  def body(self):
+    return self._get()[1]
+
+
+category_registry = CategoryRegistry()
+
+
+# a category written in a session invalidates the registry once the session
+# commits; a rollback discards the write
+def _category_written(mapper, connection, target):
+  object_session(target).info['categories_written'] = True
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+  event.listen(Category, _event, _category_written)
+
+@event.listens_for(db.session, 'after_commit')
+def _committed(session):
+  if session.info.pop('categories_written', False):
+    category_registry.invalidate()
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _rolled_back(session, previous_transaction):
+  session.info.pop('categories_written', None)
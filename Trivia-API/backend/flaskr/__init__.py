@@ -1,25 +1,88 @@
 import os
-import random
+import secrets
 from flask import Flask, request, abort, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 
-from models import setup_db, Question, Category
+from models import setup_db, database_path, Question
+from quiz import sampler, create_deck, MemoryStore
+from categories import category_registry
+from search import search_selection
 
 QUESTIONS_PER_PAGE = 10
 
-def paginate_questions(request, selection):
-  page = request.args.get('page', 1, type=int)
-  start = (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
-  questions = [question.format() for question in selection]
-  current_questions = questions[start:end]
-  return current_questions
+'''
+check_page(request, keyset=True)
+    aborts with 400 unless ?page=N, if given, is a page number and
+    ?after=ID is only given to selections ordered by id; routes that write
+    check it first, so that a bad page does not fail after the write
+'''
+def check_page(request, keyset=True):
+  after = request.args.get('after', type=int)
+  if after is not None and not keyset:
+    abort(400)
+  if after is None and request.args.get('page', 1, type=int) < 1:
+    abort(400)
+
+'''
+paginate_questions(request, selection, keyset=True)
+    returns the formatted questions of one page of selection, a Question
+    query ordered by id, reading only that page from the database.
+    ?page=N skips to the Nth page with LIMIT/OFFSET. ?after=ID, the id of
+    the last question of the previous page (next_cursor in the responses),
+    reads the next page from the id index instead, at the same cost
+    however deep the page. Selections in another order pass keyset=False
+    and only accept ?page=N.
+'''
+def paginate_questions(request, selection, keyset=True):
+  check_page(request, keyset)
+  after = request.args.get('after', type=int)
+  if after is not None:
+    selection = selection.filter(Question.id > after)
+  else:
+    page = request.args.get('page', 1, type=int)
+    selection = selection.offset((page - 1) * QUESTIONS_PER_PAGE)
+  return [question.format() for question in selection.limit(QUESTIONS_PER_PAGE)]
+
+'''
+count_questions(selection)
+    returns the number of questions of selection with one COUNT query
+'''
+def count_questions(selection):
+  return selection.order_by(None).with_entities(func.count(Question.id)).scalar()
+
+'''
+next_cursor(current_questions)
+    returns the ?after= value of the page following current_questions, or
+    None on the last page
+'''
+def next_cursor(current_questions):
+  if len(current_questions) < QUESTIONS_PER_PAGE:
+    return None
+  return current_questions[-1]['id']
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  # quiz sessions: at most QUIZ_DECK_SIZE questions each, forgotten after
+  # QUIZ_SESSION_TTL seconds without a question asked. QUIZ_SESSION_STORE
+  # can be set to another session store (see quiz.py).
+  app.config.from_mapping(
+    QUIZ_DECK_SIZE=100,
+    QUIZ_SESSION_TTL=3600,
+    QUIZ_SESSIONS_MAX=10000,
+    QUIZ_SESSION_STORE=None
+  )
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+  # test_config may point SQLALCHEMY_DATABASE_URI at another database
+  setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI') or database_path)
+  with app.app_context():
+    category_registry.load()
+  quiz_sessions = app.config['QUIZ_SESSION_STORE'] or \
+    MemoryStore(app.config['QUIZ_SESSIONS_MAX'], app.config['QUIZ_SESSION_TTL'])
   
   '''
   Set up CORS. Allow '*' for origins
@@ -44,15 +107,8 @@ def create_app(test_config=None):
   '''
   @app.route('/categories')
   def retrieve_categories():
-    categories = Category.query.all()
-
-    return jsonify({
-      'success': True,
-      'categories': {
-        category.format()['id']: category.format()['type'] for category in categories
-      },
-      'total_categories': len(categories)
-    })
+    # serialized when the categories were loaded
+    return app.response_class(category_registry.body(), mimetype='application/json')
 
 
   '''
@@ -65,9 +121,8 @@ def create_app(test_config=None):
   '''
   @app.route('/questions')
   def retrieve_questions():
-    questions = Question.query.order_by(Question.id).all()
-    current_questions = paginate_questions(request, questions)
-    categories = Category.query.order_by(Category.id).all()
+    selection = Question.query.order_by(Question.id)
+    current_questions = paginate_questions(request, selection)
 
     if len(current_questions) == 0:
       abort(404)
@@ -75,11 +130,10 @@ def create_app(test_config=None):
     return jsonify({
       'success': True,
       'questions': current_questions,
-      'total_questions': len(Question.query.all()),
+      'total_questions': count_questions(selection),
+      'next_cursor': next_cursor(current_questions),
       'current_category': None,
-      'categories': {
-        category.format()['id']: category.format()['type'] for category in categories
-      }
+      'categories': category_registry.types()
     })
 
 
@@ -91,20 +145,24 @@ def create_app(test_config=None):
   '''
   @app.route('/questions/<int:question_id>', methods=['DELETE'])
   def delete_question(question_id):
+    check_page(request)
     try:
       question = Question.query.filter(Question.id == question_id).one_or_none()
       if question is None:
-        abort(404)
+        # there is nothing to delete
+        abort(422)
       question.delete()
-      selection = Question.query.order_by(Question.id).all()
+      selection = Question.query.order_by(Question.id)
       current_questions = paginate_questions(request, selection)
 
       return jsonify({
         'success': True,
         'deleted': question_id,
         'questions': current_questions,
-        'total_questions': len(Question.query.all())
+        'total_questions': count_questions(selection)
       })
+    except HTTPException:
+      raise
     except:
       abort(422)
 
@@ -126,36 +184,41 @@ def create_app(test_config=None):
     category = body.get('category', None)
     difficulty_score = body.get('difficulty', None)
     search = body.get('search', None)
+    check_page(request, keyset=not search)
 
     try:
       if search:
-        selection = Question.query.order_by(Question.id).filter(Question.question.ilike('%{}%'.format(search)))
-        current_questions = paginate_questions(request, selection)
+        selection = search_selection(search)
+        current_questions = paginate_questions(request, selection, keyset=False)
 
         return jsonify({
           'success': True,
           'questions': current_questions,
-          'total_questions': len(selection.all())
+          'total_questions': count_questions(selection)
         })
       else:
         question = Question(question=question_text, answer=answer_text, category=category, difficulty=difficulty_score)
         question.insert()
-        selection = Question.query.order_by(Question.id).all()
+        selection = Question.query.order_by(Question.id)
         current_questions = paginate_questions(request, selection)
         
         return jsonify({
           'success': True,
           'created': question.id,
           'questions': current_questions,
-          'total_questions': len(Question.query.all())
+          'total_questions': count_questions(selection)
         })
+    except HTTPException:
+      # bad page or after parameters (400)
+      raise
     except:
       abort(422)
 
 
   '''
   Create a POST endpoint to get questions based on a search term. 
-  It should return any questions for whom the search term is a substring of the question. 
+  It should return the questions whose question or answer has every word
+  of the search term, the most relevant first (see search.py). 
 
   TEST: Search by any phrase. The questions list will update to include 
   only question that include that string within their question. 
@@ -170,13 +233,17 @@ def create_app(test_config=None):
       search_term = body.get('searchTerm')
 
       try:
-        match = Question.query.filter(Question.question.ilike('%{}%'.format(search_term))).order_by(Question.id).all()
+        selection = search_selection(search_term)
+        current_questions = paginate_questions(request, selection, keyset=False)
 
         return jsonify({
           'success': True,
-          'questions': [question.format() for question in match],
-          'total_questions': len(match)
+          'questions': current_questions,
+          'total_questions': count_questions(selection)
         })
+      except HTTPException:
+        # bad page or after parameters (400)
+        raise
       except:
         abort(422)
 
@@ -191,23 +258,27 @@ def create_app(test_config=None):
   @app.route('/categories/<int:category_id>/questions')
   def retrieve_questions_by_category(category_id):
     try:
-      category = Category.query.filter(Category.id == category_id).one_or_none()
+      category_type = category_registry.type(category_id)
       
-      if category is None:
+      if category_type is None:
         abort(404)
       
-      questions = Question.query.filter(Question.category == category_id).order_by(Question.id).all()
-      current_questions = paginate_questions(request, questions)
+      selection = Question.query.filter(Question.category == category_id).order_by(Question.id)
+      current_questions = paginate_questions(request, selection)
       
       if len(current_questions) == 0:
         abort(404)
       
       return jsonify({
         'success': True,
-        'questions': [question.format() for question in questions],
-        'total_questions': len(questions),
-        'current_category': category.type
+        'questions': current_questions,
+        'total_questions': count_questions(selection),
+        'next_cursor': next_cursor(current_questions),
+        'current_category': category_type
       })
+    except HTTPException:
+      # bad page or after parameters (400), unknown category or page (404)
+      raise
     except:
       abort(422)
 
@@ -231,32 +302,82 @@ def create_app(test_config=None):
 
     try:
       # if 'ALL' selected, the category ID is 0
-      if quiz_category > 0:
-        category = Category.query.filter(Category.id == quiz_category).one_or_none()
-        if not category:
-          abort(404)
-        questions = Question.query.filter(Question.category == quiz_category, ~Question.id.in_(previous_questions)).all()
-      else:
-        questions = Question.query.filter(~Question.id.in_(previous_questions)).all()
-
-      random.shuffle(questions)
-
-      # if there are no questions remaining ('questions' empty)
-      # the value of 'question' is None
-      question = None
+      if quiz_category > 0 and category_registry.type(quiz_category) is None:
+        abort(404)
 
-      if len(questions) > 0:
-        # set question to the first on the list of remaining questions
-        question = questions[0].format()
+      # a random question not asked yet, drawn from the ids of the
+      # category without loading its questions
+      question = sampler.random_question(quiz_category, previous_questions)
 
+      # if there are no questions remaining the value of 'question' is None
       return jsonify({
         'success': True,
-        'question': question
+        'question': question.format() if question else None
       })
+    except HTTPException:
+      # unknown category (404)
+      raise
     except:
       abort(422)
 
 
+  '''
+  Quiz sessions: the deck of a quiz is drawn once when it starts and kept on
+  the server, so each question is a primary key fetch and the client sends
+  nothing but the session id.
+  '''
+  @app.route('/quizzes/sessions', methods=['POST'])
+  def create_quiz_session():
+    body = request.get_json() or {}
+
+    try:
+      quiz_category = int((body.get('quiz_category') or {}).get('id', 0))
+    except (AttributeError, TypeError, ValueError):
+      abort(400)
+
+    # if 'ALL' selected, the category ID is 0
+    if quiz_category > 0 and category_registry.type(quiz_category) is None:
+      abort(404)
+
+    deck = create_deck(quiz_category, app.config['QUIZ_DECK_SIZE'])
+    session_id = secrets.token_urlsafe(16)
+    quiz_sessions.create(session_id, deck)
+
+    return jsonify({
+      'success': True,
+      'session_id': session_id,
+      'total_questions': len(deck)
+    })
+
+  @app.route('/quizzes/sessions/<session_id>/next')
+  def next_quiz_question(session_id):
+    try:
+      # ids of questions deleted since the deck was drawn are skipped
+      question = None
+      while question is None:
+        question_id = quiz_sessions.pop(session_id)
+        if question_id is None:
+          break
+        question = Question.query.get(question_id)
+    except KeyError:
+      abort(404)
+
+    # once the deck is empty the value of 'question' is None
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None
+    })
+
+  @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+  def delete_quiz_session(session_id):
+    quiz_sessions.delete(session_id)
+
+    return jsonify({
+      'success': True,
+      'deleted': session_id
+    })
+
+
   '''
   Create error handlers for all expected errors including 404 and 422. 
   '''
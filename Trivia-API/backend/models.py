@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, DDL, create_engine, event
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -25,6 +25,10 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  # pages of a category's questions are read in id order from this index
+  __table_args__ = (
+    Index('ix_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
@@ -58,6 +62,14 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+# full text search of the question and answer texts on Postgres (see
+# search.py), created with the table; trivia.psql creates it too
+event.listen(Question.__table__, 'after_create', DDL(
+  "CREATE INDEX ix_questions_search ON %(table)s USING gin ("
+  "(setweight(to_tsvector('english', coalesce(question, '')), 'A') || "
+  "setweight(to_tsvector('english', coalesce(answer, '')), 'B')))"
+).execute_if(dialect='postgresql'))
+
 '''
 Category
 
@@ -0,0 +1,207 @@
+import json
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from sqlalchemy import func
+
+from models import db, Question
+
+'''
+Random quiz questions
+
+Each process keeps the ids of the questions of every category (and of all
+questions, under category 0) in arrays, loaded once with one indexed query.
+A quiz step draws random ids from the array until one is not in the
+previous questions, then loads that question by primary key, so its cost
+does not depend on the number of questions. While fewer than half the
+questions have been asked, more than MAX_DRAWS draws are needed less than
+once in a million steps; after that the remaining ids are listed instead.
+
+Questions added by any process raise max(id), which is checked at every
+step with one index lookup, and reload the arrays; a drawn question that
+no longer exists reloads them too.
+'''
+
+MAX_DRAWS = 20
+
+
+'''
+QuestionSampler
+    per-process arrays of question ids by category
+
+'''
+class QuestionSampler:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.ids = {}
+    self.max_id = None
+
+  def invalidate(self):
+    with self.lock:
+      self.ids = {}
+      self.max_id = None
+
+  '''
+  category_ids(category_id)
+      returns the array of the ids of the category's questions (of all
+      questions for 0), in id order
+  '''
+  def category_ids(self, category_id):
+    # the arrays are dropped whenever a question was added since they
+    # were loaded
+    max_id = db.session.query(func.max(Question.id)).scalar()
+    with self.lock:
+      if max_id != self.max_id:
+        self.ids = {}
+        self.max_id = max_id
+      ids = self.ids.get(category_id)
+    if ids is None:
+      query = db.session.query(Question.id)
+      if category_id:
+        query = query.filter(Question.category == category_id)
+      ids = array('l', (id for id, in query.order_by(Question.id)))
+      with self.lock:
+        if self.max_id == max_id:
+          self.ids[category_id] = ids
+    return ids
+
+  def _draw(self, ids, previous):
+    for _ in range(MAX_DRAWS):
+      id = random.choice(ids)
+      if id not in previous:
+        return id
+    remaining = [id for id in ids if id not in previous]
+    return random.choice(remaining) if remaining else None
+
+  '''
+  random_question(category_id, previous_questions)
+      returns a random Question of the category (any category for 0) whose
+      id is not in previous_questions, or None when there is none left
+  '''
+  def random_question(self, category_id, previous_questions):
+    previous = set(previous_questions)
+    for _ in range(2):
+      ids = self.category_ids(category_id)
+      if not ids:
+        return None
+      id = self._draw(ids, previous)
+      if id is None:
+        return None
+      question = Question.query.get(id)
+      if question is not None:
+        return question
+      # deleted since the ids were loaded
+      self.invalidate()
+    return None
+
+
+sampler = QuestionSampler()
+
+
+'''
+Quiz sessions
+
+A session is a deck of question ids drawn at random from a category when
+the quiz starts; each step pops the next id and fetches that question by
+primary key. Decks are kept in a session store with three methods:
+
+  create(session_id, deck)  stores a new deck
+  pop(session_id)           the next id, None once the deck is empty;
+                            raises KeyError for an unknown or expired session
+  delete(session_id)        ends the session
+
+MemoryStore keeps them in the process. A store shared by all processes,
+such as Redis (a list per session: RPUSH, LPOP and EXPIRE), is needed
+when requests of one quiz can reach several processes; SerializedStore is
+a local stand-in that stores decks as JSON like such a store would.
+'''
+
+'''
+MemoryStore
+    decks in an LRU of at most maxsize sessions, which expire ttl seconds
+    after their last use
+
+'''
+class MemoryStore:
+
+  def __init__(self, maxsize=10000, ttl=3600):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.sessions = OrderedDict()
+
+  def create(self, session_id, deck):
+    with self.lock:
+      self.sessions[session_id] = (time.monotonic() + self.ttl, deque(deck))
+      self.sessions.move_to_end(session_id)
+      while len(self.sessions) > self.maxsize:
+        self.sessions.popitem(last=False)
+
+  def pop(self, session_id):
+    now = time.monotonic()
+    with self.lock:
+      expires, deck = self.sessions[session_id]
+      if expires < now:
+        del self.sessions[session_id]
+        raise KeyError(session_id)
+      self.sessions[session_id] = (now + self.ttl, deck)
+      self.sessions.move_to_end(session_id)
+      return deck.popleft() if deck else None
+
+  def delete(self, session_id):
+    with self.lock:
+      self.sessions.pop(session_id, None)
+
+
+'''
+SerializedStore
+    stand-in for a shared key-value store: decks are stored as JSON
+    strings that expire ttl seconds after their last use, and each call
+    reads and writes the whole value as a networked store would
+
+'''
+class SerializedStore:
+
+  def __init__(self, ttl=3600):
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.values = {}
+    self.purged = time.time()
+
+  def create(self, session_id, deck):
+    now = time.time()
+    with self.lock:
+      # abandoned sessions are removed once a minute
+      if now - self.purged > 60:
+        self.values = {key: value for key, value in self.values.items() if value[0] >= now}
+        self.purged = now
+      self.values[session_id] = (now + self.ttl, json.dumps(list(deck)))
+
+  def pop(self, session_id):
+    now = time.time()
+    with self.lock:
+      expires, value = self.values[session_id]
+      if expires < now:
+        del self.values[session_id]
+        raise KeyError(session_id)
+      deck = json.loads(value)
+      id = deck.pop(0) if deck else None
+      self.values[session_id] = (now + self.ttl, json.dumps(deck))
+      return id
+
+  def delete(self, session_id):
+    with self.lock:
+      self.values.pop(session_id, None)
+
+
+'''
+create_deck(category_id, size)
+    returns at most size ids of the category's questions (of all questions
+    for 0) in random order
+'''
+def create_deck(category_id, size):
+  ids = sampler.category_ids(category_id)
+  return random.sample(ids, min(size, len(ids)))
@@ -0,0 +1,169 @@
+import re
+import threading
+from bisect import bisect_left
+from sqlalchemy import event, func, case, false, literal_column
+from sqlalchemy.orm import object_session
+
+from models import db, Question
+
+'''
+Question search
+
+A search term matches the questions whose question or answer text has
+every word of the term, each word matching the words that start with it.
+Matches are ordered by relevance, then by id, and a word found in the
+question counts more than one found in the answer.
+
+On Postgres the term is a tsquery matched against the tsvector of both
+texts, the question weighted A and the answer B, which the GIN index
+ix_questions_search (see models.py) serves without reading every row;
+ts_rank orders the matches. Other databases, such as SQLite in tests, use
+an inverted index of the words of every question kept by each process. It
+is dropped when a session that added, changed or deleted questions
+commits, and loaded again by the next search; questions written by another
+process are only seen after a restart.
+
+Either way search_selection returns a query that paginate_questions and
+count_questions run in SQL.
+'''
+
+# the text search configuration of ix_questions_search
+SEARCH_CONFIG = "'english'"
+
+# the weights given to A and B by ts_rank
+QUESTION_WEIGHT = 1.0
+ANSWER_WEIGHT = 0.4
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+'''
+search_words(text)
+    returns the lowercased words of text
+'''
+def search_words(text):
+  return _WORD.findall((text or '').lower())
+
+
+'''
+search_document()
+    returns the tsvector of the question and answer texts, the expression
+    of ix_questions_search: its constants are SQL literals, not bound
+    parameters, so that Postgres matches the query to the index
+'''
+def search_document():
+  config = literal_column(SEARCH_CONFIG)
+  empty = literal_column("''")
+  question = func.setweight(func.to_tsvector(config, func.coalesce(Question.question, empty)), literal_column("'A'"))
+  answer = func.setweight(func.to_tsvector(config, func.coalesce(Question.answer, empty)), literal_column("'B'"))
+  return question.op('||')(answer)
+
+
+'''
+InvertedIndex
+    per-process postings of the question and answer words of all questions
+
+'''
+class InvertedIndex:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.version = 0
+    self.loaded = None
+
+  def invalidate(self):
+    with self.lock:
+      self.version += 1
+      self.loaded = None
+
+  def _load(self):
+    # returns (postings, sorted words); a load started before a write is
+    # used but not kept
+    with self.lock:
+      version = self.version
+    postings = {}
+    rows = db.session.query(Question.id, Question.question, Question.answer)
+    for id, question, answer in rows:
+      for text, weight in ((question, QUESTION_WEIGHT), (answer, ANSWER_WEIGHT)):
+        for word in search_words(text):
+          scores = postings.setdefault(word, {})
+          scores[id] = scores.get(id, 0) + weight
+    loaded = (postings, sorted(postings))
+    with self.lock:
+      if self.version == version:
+        self.loaded = loaded
+    return loaded
+
+  def _scores(self, postings, words, word):
+    # the scores of the questions with a word starting with word
+    scores = {}
+    start = bisect_left(words, word)
+    for indexed in words[start:]:
+      if not indexed.startswith(word):
+        break
+      for id, score in postings[indexed].items():
+        scores[id] = scores.get(id, 0) + score
+    return scores
+
+  '''
+  ranked_ids(words)
+      returns the ids of the questions matching every word, the most
+      relevant first
+  '''
+  def ranked_ids(self, words):
+    loaded = self.loaded
+    postings, indexed = loaded if loaded is not None else self._load()
+    total = None
+    for word in words:
+      scores = self._scores(postings, indexed, word)
+      if total is None:
+        total = scores
+      else:
+        total = {id: score + scores[id] for id, score in total.items() if id in scores}
+      if not total:
+        return []
+    return sorted(total, key=lambda id: (-total[id], id))
+
+
+inverted_index = InvertedIndex()
+
+
+# a question written in a session invalidates the index once the session
+# commits; a rollback discards the write
+def _question_written(mapper, connection, target):
+  object_session(target).info['questions_written'] = True
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+  event.listen(Question, _event, _question_written)
+
+@event.listens_for(db.session, 'after_commit')
+def _committed(session):
+  if session.info.pop('questions_written', False):
+    inverted_index.invalidate()
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _rolled_back(session, previous_transaction):
+  session.info.pop('questions_written', None)
+
+
+'''
+search_selection(term)
+    returns a query of the questions matching term, most relevant first
+'''
+def search_selection(term):
+  words = search_words(term)
+  if not words:
+    return Question.query.filter(false())
+
+  if db.engine.dialect.name == 'postgresql':
+    # every word, as a prefix: 'tom:* & hank:*'
+    query = func.to_tsquery(literal_column(SEARCH_CONFIG), ' & '.join(word + ':*' for word in words))
+    document = search_document()
+    return Question.query.filter(document.op('@@')(query)) \
+      .order_by(func.ts_rank(document, query).desc(), Question.id)
+
+  ids = inverted_index.ranked_ids(words)
+  if not ids:
+    return Question.query.filter(false())
+  return Question.query.filter(Question.id.in_(ids)) \
+    .order_by(case({id: position for position, id in enumerate(ids)}, value=Question.id))
@@ -1,10 +1,14 @@
 import os
+import tempfile
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
+from quiz import SerializedStore
+from search import inverted_index
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -57,6 +61,25 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'resource not found')
 
+    def test_get_next_page_after_cursor(self):
+        first_page = json.loads(self.client().get('/questions').data)
+        response = self.client().get('/questions?after={}'.format(first_page['next_cursor']))
+        data = json.loads(response.data)
+        second_page = json.loads(self.client().get('/questions?page=2').data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'], second_page['questions'])
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+
+    def test_400_sent_requesting_page_zero(self):
+        response = self.client().get('/questions?page=0')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
     def test_get_question_with_results(self):
         response = self.client().get('/questions', json={'search': 'Hanks'})
         data = json.loads(response.data)
@@ -75,6 +98,34 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['total_questions'], 0)
         self.assertEqual(len(data['questions']), 0)
 
+    def test_search_questions_by_relevance(self):
+        response = self.client().post('/questions/search', json={'searchTerm': 'Tom'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 2)
+        # in the question of 2, in the answer of 4
+        self.assertEqual([question['id'] for question in data['questions']], [2, 4])
+
+    def test_search_questions_by_answer_and_word_prefix(self):
+        response = self.client().post('/questions/search', json={'searchTerm': 'uruguay'})
+        data = json.loads(response.data)
+        self.assertEqual([question['id'] for question in data['questions']], [11])
+
+        response = self.client().post('/questions/search', json={'searchTerm': 'Tom Hank'})
+        data = json.loads(response.data)
+        self.assertEqual([question['id'] for question in data['questions']], [2])
+
+    def test_search_new_question(self):
+        self.client().post('/questions', json=self.new_question)
+        response = self.client().post('/questions/search', json={'searchTerm': 'new question'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['total_questions'])
+        self.assertEqual(data['questions'][0]['question'], self.new_question['question'])
+
     def test_get_question_by_category(self):
         response = self.client().get('/categories/4/questions')
         data = json.loads(response.data)
@@ -84,6 +135,22 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(len(data['questions']))
 
+    def test_400_sent_requesting_category_page_zero(self):
+        response = self.client().get('/categories/4/questions?page=0')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
+    def test_404_sent_requesting_unknown_category(self):
+        response = self.client().get('/categories/1000/questions')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
     def test_get_categories(self):
         response = self.client().get('/categories')
         data = json.loads(response.data)
@@ -93,6 +160,41 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_categories'])
         self.assertTrue(len(data['categories']))
 
+    def test_get_categories_without_queries(self):
+        statements = []
+        def count(*args):
+            statements.append(args)
+
+        with self.app.app_context():
+            engine = db.get_engine()
+            event.listen(engine, 'before_cursor_execute', count)
+            try:
+                response = self.client().get('/categories')
+            finally:
+                event.remove(engine, 'before_cursor_execute', count)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['categories']['6'], 'Sports')
+        self.assertEqual(statements, [])
+
+    def test_get_categories_after_category_written(self):
+        with self.app.app_context():
+            category = Category('Music')
+            db.session.add(category)
+            db.session.commit()
+            category_id = category.id
+        try:
+            data = json.loads(self.client().get('/categories').data)
+            self.assertEqual(data['categories'][str(category_id)], 'Music')
+        finally:
+            with self.app.app_context():
+                db.session.delete(Category.query.get(category_id))
+                db.session.commit()
+
+        data = json.loads(self.client().get('/categories').data)
+        self.assertNotIn(str(category_id), data['categories'])
+
     def test_delete_question(self):
         response = self.client().delete('/questions/24')
         data = json.loads(response.data)
@@ -114,6 +216,30 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'unprocessable request')
 
+    def test_400_sent_deleting_question_with_page_zero(self):
+        with self.app.app_context():
+            question_id = Question.query.order_by(Question.id.desc()).first().id
+        response = self.client().delete('/questions/{}?page=0'.format(question_id))
+        data = json.loads(response.data)
+
+        with self.app.app_context():
+            question = Question.query.get(question_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertIsNotNone(question)
+
+    def test_400_sent_creating_question_with_page_zero(self):
+        with self.app.app_context():
+            total = Question.query.count()
+        response = self.client().post('/questions?page=0', json=self.new_question)
+        data = json.loads(response.data)
+
+        with self.app.app_context():
+            self.assertEqual(Question.query.count(), total)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     def test_create_new_question(self):
         response = self.client().post('/questions', json=self.new_question)
         data = json.loads(response.data)
@@ -123,6 +249,93 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['created'])
         self.assertTrue(len(data['questions']))
 
+    def test_play_quiz_skips_previous_questions(self):
+        response = self.client().post('/quizzes', json={
+            'previous_questions': [10],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question']['id'], 11)
+
+    def test_play_quiz_without_questions_left(self):
+        response = self.client().post('/quizzes', json={
+            'previous_questions': [10, 11],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question'], None)
+
+    def test_play_quiz_in_all_categories(self):
+        response = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'click', 'id': 0}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['question'])
+
+    def play_quiz_session(self, client):
+        response = client.post('/quizzes/sessions', json={
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 2)
+
+        url = '/quizzes/sessions/{}/next'.format(data['session_id'])
+        questions = [json.loads(client.get(url).data)['question'] for _ in range(3)]
+
+        self.assertEqual(sorted(question['id'] for question in questions[:2]), [10, 11])
+        self.assertEqual(questions[2], None)
+        return data['session_id']
+
+    def test_play_quiz_session(self):
+        self.play_quiz_session(self.client())
+
+    def test_play_quiz_session_in_serialized_store(self):
+        app = create_app({'QUIZ_SESSION_STORE': SerializedStore()})
+        setup_db(app, self.database_path)
+        self.play_quiz_session(app.test_client())
+
+    def test_404_sent_for_ended_quiz_session(self):
+        session_id = self.play_quiz_session(self.client())
+        self.client().delete('/quizzes/sessions/{}'.format(session_id))
+        response = self.client().get('/quizzes/sessions/{}/next'.format(session_id))
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_404_sent_creating_quiz_session_of_unknown_category(self):
+        response = self.client().post('/quizzes/sessions', json={
+            'quiz_category': {'type': 'Unknown', 'id': 1000}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_404_sent_playing_quiz_of_unknown_category(self):
+        response = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'Unknown', 'id': 1000}
+        })
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
     def test_405_if_question_creation_not_allowed(self):
         response = self.client().post('/questions/1000', json=self.new_question)
         data = json.loads(response.data)
@@ -131,6 +344,55 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'method not allowed')
 
+class SearchIndexTestCase(unittest.TestCase):
+    ''' The in-memory search index used on databases other than Postgres '''
+
+    def setUp(self):
+        descriptor, self.database_file = tempfile.mkstemp(suffix='.db')
+        os.close(descriptor)
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(self.database_file)})
+        self.client = self.app.test_client
+        inverted_index.invalidate()
+
+        with self.app.app_context():
+            for text, answer in (('Who painted the Mona Lisa?', 'Leonardo da Vinci'),
+                                 ('Which planet is known as the red planet?', 'Mars')):
+                db.session.add(Question(question=text, answer=answer, category='1', difficulty=1))
+            db.session.commit()
+
+    def tearDown(self):
+        inverted_index.invalidate()
+        os.remove(self.database_file)
+
+    def search(self, term):
+        response = self.client().post('/questions/search', json={'searchTerm': term})
+        return [question['id'] for question in json.loads(response.data)['questions']]
+
+    def test_search_edited_question(self):
+        self.assertEqual(self.search('Mona Lisa'), [1])
+
+        with self.app.app_context():
+            question = Question.query.get(1)
+            question.question = 'Who painted the Starry Night?'
+            question.update()
+
+        self.assertEqual(self.search('Mona Lisa'), [])
+        self.assertEqual(self.search('starry'), [1])
+
+    def test_search_question_replacing_deleted_id(self):
+        self.assertEqual(self.search('planet'), [2])
+
+        with self.app.app_context():
+            Question.query.get(2).delete()
+            question = Question(question='What is the largest ocean?', answer='Pacific', category='3', difficulty=1)
+            question.insert()
+            # SQLite gives the new question the deleted question's id
+            self.assertEqual(question.id, 2)
+
+        self.assertEqual(self.search('planet'), [])
+        self.assertEqual(self.search('pacific'), [2])
+
+
 # Make the tests conveniently executable
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -16,6 +16,9 @@ class QuestionView extends Component {
       totalQuestions: 0,
       categories: {},
       currentCategory: null,
+      // what the pages list: all questions, a category's or a search's
+      categoryId: null,
+      searchTerm: null,
     }
   }
 
@@ -24,6 +27,7 @@ class QuestionView extends Component {
   }
 
   getQuestions = () => {
+    this.setState({categoryId: null, searchTerm: null});
     $.ajax({
       url: `${Constants.SERVERPATH}/questions?page=${this.state.page}`, // update request URL
       type: "GET",
@@ -43,8 +47,19 @@ class QuestionView extends Component {
     })
   }
 
+  // reloads the current list at this.state.page
+  getPage = () => {
+    if (this.state.searchTerm !== null) {
+      this.submitSearch(this.state.searchTerm, this.state.page);
+    } else if (this.state.categoryId !== null) {
+      this.getByCategory(this.state.categoryId, this.state.page);
+    } else {
+      this.getQuestions();
+    }
+  }
+
   selectPage(num) {
-    this.setState({page: num}, () => this.getQuestions());
+    this.setState({page: num}, () => this.getPage());
   }
 
   createPagination(){
@@ -61,9 +76,10 @@ class QuestionView extends Component {
     return pageNumbers;
   }
 
-  getByCategory= (id) => {
+  getByCategory= (id, page = 1) => {
+    this.setState({page: page, categoryId: id, searchTerm: null});
     $.ajax({
-      url: `${Constants.SERVERPATH}/categories/${id}/questions`, // update request URL
+      url: `${Constants.SERVERPATH}/categories/${id}/questions?page=${page}`, // update request URL
       type: "GET",
       success: (result) => {
         this.setState({
@@ -79,9 +95,10 @@ class QuestionView extends Component {
     })
   }
 
-  submitSearch = (searchTerm) => {
+  submitSearch = (searchTerm, page = 1) => {
+    this.setState({page: page, categoryId: null, searchTerm: searchTerm});
     $.ajax({
-      url: `${Constants.SERVERPATH}/questions/search`, // update request URL
+      url: `${Constants.SERVERPATH}/questions/search?page=${page}`, // update request URL
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
@@ -111,7 +128,7 @@ class QuestionView extends Component {
           url: `${Constants.SERVERPATH}/questions/${id}`, // update request URL
           type: "DELETE",
           success: (result) => {
-            this.getQuestions();
+            this.getPage();
           },
           error: (error) => {
             alert('Unable to delete the question. Please try again.')
@@ -126,7 +143,7 @@ class QuestionView extends Component {
     return (
       <div className="question-view">
         <div className="categories-list">
-          <h2 onClick={() => {this.getQuestions()}}>Categories</h2>
+          <h2 onClick={() => {this.setState({page: 1}, () => this.getQuestions())}}>Categories</h2>
           <ul class="list-group">
             {Object.keys(this.state.categories).map((id, ) => (
               <li class="list-group-item" key={id} onClick={() => {this.getByCategory(id)}}>
@@ -11,6 +11,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        sessionId: null,
         previousQuestions: [], 
         showAnswer: false,
         categories: {},
@@ -38,7 +39,27 @@ class QuizView extends Component {
   }
 
   selectCategory = ({type, id=0}) => {
-    this.setState({quizCategory: {type, id}}, this.getNextQuestion)
+    $.ajax({
+      url: `${Constants.SERVERPATH}/quizzes/sessions`, // update request URL
+      type: "POST",
+      dataType: 'json',
+      contentType: 'application/json',
+      data: JSON.stringify({
+        quiz_category: {type, id}
+      }),
+      xhrFields: {
+        withCredentials: true
+      },
+      crossDomain: true,
+      success: (result) => {
+        this.setState({quizCategory: {type, id}, sessionId: result.session_id}, this.getNextQuestion)
+        return;
+      },
+      error: (error) => {
+        alert('Unable to start the quiz. Please try again.')
+        return;
+      }
+    })
   }
 
   handleChange = (event) => {
@@ -50,14 +71,8 @@ class QuizView extends Component {
     if(this.state.currentQuestion.id) { previousQuestions.push(this.state.currentQuestion.id) }
 
     $.ajax({
-      url: `${Constants.SERVERPATH}/quizzes`, // update request URL
-      type: "POST",
-      dataType: 'json',
-      contentType: 'application/json',
-      data: JSON.stringify({
-        previous_questions: previousQuestions,
-        quiz_category: this.state.quizCategory
-      }),
+      url: `${Constants.SERVERPATH}/quizzes/sessions/${this.state.sessionId}/next`, // update request URL
+      type: "GET",
       xhrFields: {
         withCredentials: true
       },
@@ -90,8 +105,15 @@ class QuizView extends Component {
   }
 
   restartGame = () => {
+    if(this.state.sessionId) {
+      $.ajax({
+        url: `${Constants.SERVERPATH}/quizzes/sessions/${this.state.sessionId}`, // update request URL
+        type: "DELETE"
+      })
+    }
     this.setState({
       quizCategory: null,
+      sessionId: null,
       previousQuestions: [], 
       showAnswer: false,
       numCorrect: 0,